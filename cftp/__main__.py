@@ -1,5 +1,4 @@
-import sys
-import cftp.s3
+import sys, argparse
 
 
 
@@ -8,26 +7,76 @@ import cftp.s3
 # Author:  Dude Revolucion (dudrevolucion@gmail.com)
 
 
-# This implements a console_script under setuptools.
+# This implements a console_script under setuptools.  The rest of
+# cftp (and boto3) is imported only when needed, so that forwarding
+# a script to a daemon starts quickly.
 
 
 def main(args=None) :
-    """Exposes ftp-like command line interface to Amazon S3."""
+    """Exposes ftp-like command line interface to Amazon S3.
+
+    With -f or -c, runs a script of commands and exits with the status
+    returned by BaseFtpClient.RunScript; with --connect, the script is
+    run by the daemon (see cftp.daemon) if one is listening.  With
+    --serve, runs the daemon.  Otherwise reads commands interactively.
+
+    """
 
     if args is None:
         args = sys.argv[1:]
-    
-    s3ftp = cftp.s3.S3FtpClient( isInteractive=True )
 
-    if len(args) == 0 :
-        s3ftp.CommandLine()
-        
-    elif len(args) == 1 :
-        s3ftp.open(args.pop())
+    parser = argparse.ArgumentParser( prog='s3ftp', description='ftp-like access to Amazon S3.' )
+    parser.add_argument( 'bucket', nargs='?', help='bucket to open' )
+    script = parser.add_mutually_exclusive_group()
+    script.add_argument( '-f', metavar='FILE', dest='file',
+                         help='run the commands in FILE (- for standard input) and exit' )
+    script.add_argument( '-c', metavar='COMMANDS', dest='commands',
+                         help='run COMMANDS, separated by semicolons, and exit' )
+    parser.add_argument( '-j', metavar='N', dest='jobs', type=int, default=1,
+                         help='run up to N consecutive transfer commands of a script at a time' )
+    parser.add_argument( '--serve', action='store_true',
+                         help='run a daemon keeping sessions open for --connect' )
+    parser.add_argument( '--connect', action='store_true',
+                         help='run the script in the daemon, if one is listening' )
+    parser.add_argument( '--socket', metavar='PATH', help='socket of the daemon' )
+    options = parser.parse_args( args )
+
+    if options.serve :
+        import cftp.daemon
+        cftp.daemon.Serve( options.socket )
+        return
+
+    if options.file is None and options.commands is None :
+        import cftp.s3
+        s3ftp = cftp.s3.S3FtpClient( isInteractive=True )
+        if options.bucket :
+            s3ftp.open( options.bucket )
         s3ftp.CommandLine()
+        return
+
+    if options.commands is not None :
+        commands = options.commands
+    elif options.file == '-' :
+        commands = sys.stdin.read()
     else :
-        print( "ERROR:  Incorrect number of arguments.")
-        sys.exit(1)
+        with open( options.file ) as fp :
+            commands = fp.read()
+
+    if options.connect :
+        import cftp.daemon
+        status = cftp.daemon.Forward( commands, options.bucket, options.jobs, options.socket )
+        if status is not None :
+            sys.exit( status )
+
+    import cftp.base, cftp.s3
+    s3ftp = cftp.s3.S3FtpClient()
+    if options.bucket :
+        try :
+            cftp.base.Unwrapped( s3ftp.open )( options.bucket )
+        except Exception as e :
+            cftp.base.PrintError( 'open ' + options.bucket, e )
+            sys.exit(1)
+    sys.exit( s3ftp.RunScript( commands, options.jobs ) )
     
     
 
@@ -0,0 +1,218 @@
+#!/usr/local/bin/python3
+import asyncio, functools, itertools, inspect
+from concurrent.futures import ThreadPoolExecutor
+from cftp.base import Unwrapped
+import cftp.s3
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# Default number of operations in progress at a time, for clients
+# without a connection pool (see AsyncBaseFtpClient)
+DEFAULT_CONCURRENCY = 64
+
+# Names fetched per step of the async iter_ls
+LS_BATCH_SIZE = 1000
+
+
+
+
+###################################################################
+# Asyncio front end to an ftp client
+###################################################################
+
+class AsyncBaseFtpClient :
+    """Runs the commands of a BaseFtpClient from asyncio code.
+
+    Each command is an async method that runs the corresponding
+    method of the wrapped client in a thread pool of maxConcurrency
+    threads, so the event loop is never blocked.  A semaphore admits
+    at most maxConcurrency commands at a time; any number of tasks
+    may await commands, and those beyond the limit wait their turn
+    without holding a thread.  The pool is shared by all commands of
+    the client and is sized to its connection pool rather than to the
+    number of tasks:  by default, maxConcurrency is the client's
+    maxPoolConnections attribute, or DEFAULT_CONCURRENCY for a client
+    without one.
+
+    The transfers themselves are not asynchronous.  The wrapped
+    client's requests block, so each command in progress holds one
+    thread of the pool until its request completes; concurrency is
+    therefore bounded by maxConcurrency threads, not by the event
+    loop, and raising it costs a thread (and a connection) per
+    command.
+
+    Unlike the wrapped client's commands, which print errors and
+    return None, these methods raise the errors (such as
+    FTPNoSuchFileError) in the awaiting task.  Batch commands return
+    their TransferReport, and run their own maxWorkers threads.
+
+    The remote and local working directories are those of the wrapped
+    client, and the local one is the process's working directory:  cd
+    and lcd affect every command issued after them, so tasks working
+    concurrently should use paths rather than change directories.
+
+    Attributes:
+        client (BaseFtpClient) :  the wrapped client
+        maxConcurrency (int)   :  commands run at a time
+
+    """
+
+    def __init__( self, client, maxConcurrency=None ) :
+        """ Wrap an ftp client."""
+
+        if maxConcurrency is None :
+            maxConcurrency = getattr( client, 'maxPoolConnections', DEFAULT_CONCURRENCY )
+        self.client = client
+        self.maxConcurrency = maxConcurrency
+        self.executor = ThreadPoolExecutor( max_workers=maxConcurrency )
+        self.semaphore = None
+
+
+    async def __aenter__( self ) :
+        return self
+
+
+    async def __aexit__( self, *excInfo ) :
+        self.shutdown()
+
+
+    def shutdown( self ) :
+        """ Release the thread pool once running commands finish."""
+
+        self.executor.shutdown( wait=False )
+
+
+    async def Call( self, method, *args, **kwargs ) :
+        """ Auxiliary method:  run a client method in the thread pool.
+
+        The method runs without its exception handling decorators, so
+        its errors are raised here.
+
+        Returns what the method returns.
+
+        """
+
+        if self.semaphore is None :
+            self.semaphore = asyncio.Semaphore( self.maxConcurrency )
+        if inspect.ismethod( method ) :
+            method = Unwrapped( method )
+        async with self.semaphore :
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial( method, *args, **kwargs ) )
+
+
+    ###################################################################
+    # Commands
+    ###################################################################
+
+    async def open( self, loc ) :
+        """ See BaseFtpClient.open."""
+        return await self.Call( self.client.open, loc )
+
+    async def close( self ) :
+        """ See BaseFtpClient.close."""
+        return await self.Call( self.client.close )
+
+    async def cd( self, dirName ) :
+        """ See BaseFtpClient.cd."""
+        return await self.Call( self.client.cd, dirName )
+
+    async def lcd( self, dirName ) :
+        """ See BaseFtpClient.lcd."""
+        return await self.Call( self.client.lcd, dirName )
+
+    async def pwd( self ) :
+        """ See BaseFtpClient.pwd."""
+        return await self.Call( self.client.pwd )
+
+    async def ls( self ) :
+        """ See BaseFtpClient.ls."""
+        return await self.Call( self.client.ls )
+
+    async def get( self, fileName, extraArgs=None ) :
+        """ See BaseFtpClient.get."""
+        return await self.Call( self.client.get, fileName, extraArgs )
+
+    async def put( self, fileName, extraArgs=None ) :
+        """ See BaseFtpClient.put."""
+        return await self.Call( self.client.put, fileName, extraArgs )
+
+    async def get_bytes( self, fileName, extraArgs=None ) :
+        """ See BaseFtpClient.get_bytes."""
+        return await self.Call( self.client.get_bytes, fileName, extraArgs )
+
+    async def get_range( self, fileName, offset, length=None, extraArgs=None ) :
+        """ See BaseFtpClient.get_range."""
+        return await self.Call( self.client.get_range, fileName, offset, length, extraArgs )
+
+    async def put_bytes( self, fileName, buffer, extraArgs=None ) :
+        """ See BaseFtpClient.put_bytes."""
+        return await self.Call( self.client.put_bytes, fileName, buffer, extraArgs )
+
+    async def delete( self, fileName ) :
+        """ See BaseFtpClient.delete."""
+        return await self.Call( self.client.delete, fileName )
+
+    async def mget( self, args, extraArgs=None, maxWorkers=None ) :
+        """ See BaseFtpClient.mget."""
+        return await self.Call( self.client.mget, args, extraArgs, maxWorkers )
+
+    async def mput( self, args, extraArgs=None, maxWorkers=None ) :
+        """ See BaseFtpClient.mput."""
+        return await self.Call( self.client.mput, args, extraArgs, maxWorkers )
+
+    async def mdelete( self, args, maxWorkers=None ) :
+        """ See BaseFtpClient.mdelete."""
+        return await self.Call( self.client.mdelete, args, maxWorkers )
+
+    async def mkdir( self, dirName ) :
+        """ See BaseFtpClient.mkdir."""
+        return await self.Call( self.client.mkdir, dirName )
+
+    async def rmdir( self, dirName ) :
+        """ See BaseFtpClient.rmdir."""
+        return await self.Call( self.client.rmdir, dirName )
+
+
+    async def iter_ls( self ) :
+        """ Generates contents of the remote working folder.
+
+        Names are fetched LS_BATCH_SIZE at a time from the client's
+        iter_ls, so a large folder costs one trip to the thread pool
+        per batch (in S3, per listing page) rather than per name.
+
+        """
+
+        names = self.client.iter_ls()
+        while True :
+            batch = await self.Call( list, itertools.islice( names, LS_BATCH_SIZE ) )
+            if not batch :
+                return
+            for name in batch :
+                yield name
+
+
+
+
+class AsyncS3FtpClient( AsyncBaseFtpClient ) :
+    """Asyncio front end to an S3FtpClient.
+
+    Takes the arguments of S3FtpClient, plus maxConcurrency (see
+    AsyncBaseFtpClient), which defaults to the size of the S3 client's
+    connection pool.  A larger maxConcurrency makes the pool at least
+    that many connections large, so that every command in progress
+    has a connection.
+
+    """
+
+    def __init__( self, maxConcurrency=None, **kwargs ) :
+        """ Create an S3 ftp client and wrap it."""
+
+        client = cftp.s3.S3FtpClient( **kwargs )
+        if maxConcurrency is not None :
+            client.maxPoolConnections = max( client.maxPoolConnections, maxConcurrency )
+        super().__init__( client, maxConcurrency )
@@ -1,9 +1,13 @@
 #!/usr/local/bin/python3
 import sys
-import os, glob, fnmatch
+import os, io, glob, fnmatch, hashlib, tempfile, time, types, inspect
 from functools import wraps
 from abc import ABCMeta, abstractmethod 
 import cftp.base_exceptions as bftp_ex
+from cftp.parallel import RunParallel, TransferReport, CpuPool, ParseSize
+from cftp.pack import PackIndex, Groups, Layout, ArchiveChunks, MemberPieces, PACK_INDEX, ARCHIVE_NAME, DEFAULT_PACK_SIZE
+from cftp.manifest import Manifest
+from cftp.journal import TransferJournal
 
 
 # This code is protected under the GNU General Public License, Version 3.
@@ -13,6 +17,33 @@ import cftp.base_exceptions as bftp_ex
 
 
 
+###################################################################
+# Object types returned by the ObjectType auxiliary method
+###################################################################
+
+OBJ_NONE = None         # no such object
+OBJ_FILE = 'file'
+OBJ_DIR  = 'dir'
+
+
+# Transfer commands RunScript may run concurrently, by direction
+# (sync goes in the direction given by its first argument)
+CONCURRENT_COMMANDS = { 'get':'get', 'mget':'get', 'put':'put', 'mput':'put',
+                        'unpack':'get', 'pack':'put' }
+
+# Default size of the segments fetched by GetSegments (see SegmentPlan),
+# and suffix of the file they are written to until all have arrived
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENTS_SUFFIX = '.cftp-segments'
+
+# Errors after which resume drops a journalled batch instead of keeping
+# it for another attempt:  running it again would fail the same way
+PERMANENT_RESUME_ERRORS = ( bftp_ex.FTPInvalidCommand, bftp_ex.FTPNoSuchDirError,
+                            bftp_ex.FTPObjectAlreadyExistsError, FileNotFoundError, NotADirectoryError )
+
+
+
+
 ###################################################################
 # Exception handling decorator
 ###################################################################
@@ -44,6 +75,8 @@ def ExceptionWrapper( func ) :
             same name already exists.
         FTPDirNotEmptyError:  Expecting an empty directory, but the
                 directory is not actually empty.
+        FTPBufferTooSmallError:  A cloud file does not fit in the
+                buffer it is to be read into.
         FTPError:  Gracefully handle unanticipated errors.
 
     """
@@ -87,6 +120,9 @@ def ExceptionWrapper( func ) :
         except bftp_ex.FTPDirNotEmptyError as e :
             e.errorLog()
 
+        except bftp_ex.FTPBufferTooSmallError as e :
+            e.errorLog()
+
         except bftp_ex.FTPError as e :
             e.errorLog()
 
@@ -116,18 +152,29 @@ class BaseFtpClient :
     Abstract helper methods encapsulate specific functionality associated with
     particular cloud implementations.
 
-    This class has four instance attributes.  The cloudStorageLocation specifies
+    This class has seven instance attributes.  The cloudStorageLocation specifies
     the Internet-accessible location of the root directory of the cloud storage
     location.  The remoteWorkingDir indicates the current working location beneath
     that root directory.  For example, in Amazon S3, the bucket name would be
     assigned to the cloudStorageLocation.  The isInteractive attribute indicates
     whether a client is running interactively via the CommandLine method.
+    The maxWorkers attribute sets how many files the batch commands (mget,
+    mput and mdelete) process concurrently.  The syncManifest attribute,
+    if not None, is a Manifest that spares sync from hashing and comparing
+    files that have not changed since the last run.  The transferJournal
+    attribute, if not None, is a TransferJournal in which batch commands
+    (and subclasses, for large transfers) record their progress, so
+    that the resume command can finish them after an interruption.
 
     Attributes:
         cloudStorageLocation (str):  remote storage location
         localWorkingDir (str):  on the local computer
         remoteWorkingDir (str):  on the remote storage
         isInteractive (Bool):  running interactively via CommandLine
+        maxWorkers (int):  worker threads used by batch commands
+        syncManifest (Manifest):  index of synchronized files, or None
+        transferJournal (TransferJournal):  record of unfinished transfers, or None
+        cpuPool (CpuPool):  worker processes for hashing, or None
 
     """
 
@@ -145,7 +192,12 @@ class BaseFtpClient :
         self.cloudStorageLocation = None      
         self.localWorkingDir = os.getcwd()
         self.remoteWorkingDir = None
-        self.isInteractive = False
+        self.isInteractive = isInteractive
+        self.maxWorkers = 1
+        self.syncManifest = None
+        self.transferJournal = None
+        self.cpuPool = None
+        self.resumingBatch = None
 
 
 
@@ -210,11 +262,26 @@ class BaseFtpClient :
 
         """
 
+        self.DeleteFile(fileName)
+
+
+    def DeleteFile( self,fileName ) :
+        """ Auxiliary method:  delete a file, without exception handling.
+
+        Does the work of the delete command.  Errors propagate to the
+        caller so that batch commands can record them per file.
+
+        Returns 0 (no bytes are transferred).
+
+        """
+
         remotePath = self.AbsolutePath(fileName) 
+        objType = self.ObjectType(remotePath)
 
-        if self.IsFile(remotePath) :
+        if objType == OBJ_FILE :
             self.AuxDeleteFromCloud(remotePath)
-        elif self.IsDir(remotePath) : 
+            return 0
+        elif objType == OBJ_DIR : 
             raise bftp_ex.FTPIsADirectoryError
         else :
             raise bftp_ex.FTPNoSuchObjectError
@@ -238,6 +305,26 @@ class BaseFtpClient :
         pass
 
 
+    def AuxDeleteManyFromCloud( self, remotePaths, maxWorkers, report ) :
+        """ Delete many files from the cloud
+
+        Subclasses should override this method if their cloud provider
+        can delete several objects in one request.  By default each
+        file is deleted with AuxDeleteFromCloud, by up to maxWorkers
+        threads.  Per-file outcomes are recorded in report.
+
+        Arguments:
+            remotePaths (iterable) : files to be deleted (absolute paths)
+            maxWorkers (int)       : number of concurrent deletions
+            report (TransferReport): records successes and failures
+
+        Returns the report.
+
+        """
+
+        return RunParallel( Unwrapped( self.AuxDeleteFromCloud ), remotePaths, maxWorkers, report=report )
+
+
     @ExceptionWrapper
     def get( self,fileName,extraArgs=None ) :
         """Downloads a file from remote cloud location.
@@ -264,212 +351,245 @@ class BaseFtpClient :
 
         """
 
+        self.GetFile(fileName,extraArgs)
+
+
+    def GetFile( self,fileName,extraArgs=None ) :
+        """ Auxiliary method:  download a file, without exception handling.
+
+        Does the work of the get command.  Errors propagate to the
+        caller so that batch commands can record them per file.
+
+        Returns the number of bytes downloaded.
+
+        """
+
         localFile = os.path.basename(fileName)
         localPath = self.localWorkingDir + '/' + localFile
         remotePath = self.AbsolutePath(fileName) 
+        objType = self.ObjectType(remotePath)
 
-        if self.IsFile( remotePath ) :
+        if objType == OBJ_FILE :
             self.AuxGetFromCloud(remotePath,localPath,extraArgs)
-        elif self.IsDir( remotePath ) :
+            return os.path.getsize(localPath)
+        elif objType == OBJ_DIR :
             raise bftp_ex.FTPIsADirectoryError
         else :
             raise bftp_ex.FTPNoSuchFileError
-            
 
-    @abstractmethod
-    def AuxGetFromCloud( self, remotePath, localPath, extraArgs ) :
-        """ Get a file from the cloud
 
-        This is an abstract auxiliary method that encapsulates
-        cloud-specific functionality.  Subclasses should override
-        this method.
+    @ExceptionWrapper
+    def GetRangeToFile( self,fileName,byteRange,extraArgs=None,maxWorkers=None ) :
+        """ Auxiliary method:  download part of a file (get --range).
 
-        Arguments:
-            remotePath (str) : file to be gotten
-            localPath (str)  : where to put it
-            extraArgs (dict) : possibly useful for subclasses
-        
-        No return value.
+        This is the get --range command, which takes the form
 
-        """
+            get --range RANGE fileName
 
-        pass
+        where RANGE is START-END (bytes START to END, inclusive, as in
+        an HTTP Range header), START- (from START to the end of the
+        file) or -COUNT (the last COUNT bytes, for example the tail of
+        a log).  Positions may be given as sizes such as 64MB.  The
+        part is written to a file of the same name in the local working
+        directory by AuxGetRangeToFile.  A range past the end of the
+        file gives an empty file.  To read part of a file into memory,
+        use get_range.  This method probably does not need to be
+        overridden by subclasses.
 
+        Arguments:
+            fileName (str):    file to be gotten
+            byteRange (str):   part of the file, as above
+            extraArgs (dict):  possibly used by subclasses
+            maxWorkers (int):  number of concurrent segments (default:
+                               see SegmentPlan)
 
-    @abstractmethod
-    def ls( self ) :
-        """Lists contents of current working folder in cloud folder.
+        No return value.
 
-        Returns a list.  Subclasses must override this with a cloud
-        provider-specific implementation.
+        Raises:
+            FTPInvalidCommand:  invalid range
+            FTPIsADirectoryError
+            FTPNoSuchFileError
 
         """
 
-        pass
-
-
-    @ExceptionWrapper
-    def mdelete( self,args ) :
-       """ Deletes multiple files from the cloud.
-
-       Repeatedly deletes files whose name match the pattern(s) specified
-       in the function arguments.  Note this function only operates
-       on files in the current remote working directory.  Subclasses
-       probably do not need to override this method.
-
-       No return value.
-
-       """
-
-       remoteFileList = self.ls()
-       for fpattern in args :
-           for f in fnmatch.filter( remoteFileList, fpattern ) :
-               self.delete(f)
+        try :
+            (offset,length) = ParseByteRange( byteRange )
+        except ValueError :
+            raise bftp_ex.FTPInvalidCommand
+        remotePath = self.AbsolutePath(fileName)
+        objType = self.ObjectType(remotePath)
+        if objType == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        elif objType != OBJ_FILE :
+            raise bftp_ex.FTPNoSuchFileError
+        localPath = self.localWorkingDir + '/' + os.path.basename(fileName)
+        self.AuxGetRangeToFile( remotePath, localPath, offset, length, extraArgs, maxWorkers )
 
 
-    @ExceptionWrapper
-    def mget( self,args,extraArgs=None ) :
-        """ Downloads multiple files from the cloud.
+    def AuxGetRangeToFile( self, remotePath, localPath, offset, length, extraArgs, maxWorkers=None ) :
+        """ Get part of a file from the cloud into a local file
 
-        Repeatedly gets files whose name match the pattern(s) specified
-        in the function arguments.  Note this function only operates
-        on files in the current remote working directory.  Matching
-        files are downloaded to the local working directory.  Subclasses
-        probably do not need to override this method.
+        Subclasses should override this method if their cloud provider
+        can tell when a file is replaced during the download, or stores
+        files in a form (such as compressed) whose parts are not parts
+        of the file.  By default the size is given by
+        AuxGetSizeFromCloud and the part is fetched with GetSegments,
+        so a large part is fetched over several connections.
 
         Arguments:
-            args (list):       list of files to be gotten
-            extraArgs(dict):   may be used by subclasses
+            remotePath (str) : file to be read
+            localPath (str)  : where to put the part
+            offset (int)     : position of the first byte wanted; if
+                               negative, counts from the end of the file
+            length (int)     : number of bytes wanted, or None for the
+                               rest of the file
+            extraArgs (dict) : possibly useful for subclasses
+            maxWorkers (int) : number of concurrent segments
 
         No return value.
 
         """
 
-        remoteFileList = self.ls()
-        for fpattern in args :
-            for f in fnmatch.filter( remoteFileList, fpattern ) :
-                self.get(f,extraArgs)
+        (start,end) = ClampRange( offset, length, self.AuxGetSizeFromCloud( remotePath ) )
+        self.GetSegments( remotePath, localPath, start, end-start, extraArgs, maxWorkers=maxWorkers )
 
 
-    @ExceptionWrapper
-    def mkdir( self,dirName ) :
-        """Make a directory in the cloud.
+    def GetSegments( self, remotePath, localPath, offset, length, extraArgs,
+                     segmentSize=None, maxWorkers=None ) :
+        """ Auxiliary method:  download part of a file in parallel segments.
 
-        Does nothing if folder or file of this name already exists in the
-        remote working directory.  This method probably does not need
-        to be overridden by subclasses.  However, the abstract auxiliary
-        method AuxMkDirInCloud encapsulates cloud provider-specific functionality
-        for making a directory and would need to be overridden.
+        The length bytes of remotePath starting at offset are split into
+        segments, which up to maxWorkers threads fetch with
+        AuxIterRangeFromCloud.  Each chunk is written as it arrives
+        straight to its place in a file preallocated to its final size,
+        with os.pwrite, so segments may arrive in any order, no thread
+        waits for another and no segment is held in memory whole.  The
+        file is written next to localPath and renamed to it once
+        complete, so an existing localPath is left alone if the download
+        fails.  After the first segment fails no more are started, and
+        those under way stop at their next chunk.  The segment size and
+        number of threads default to those given by SegmentPlan.  The
+        first error propagates to the caller.
 
         Arguments:
-           dirName (str):  directory specifier
+            remotePath (str)  : file to be gotten
+            localPath (str)   : where to put the part
+            offset (int)      : position of the first byte of the part
+            length (int)      : size of the part
+            extraArgs (dict)  : passed to AuxIterRangeFromCloud
+            segmentSize (int) : bytes per request
+            maxWorkers (int)  : number of concurrent requests
 
-        No return value.
+        Returns the number of bytes downloaded.
 
         Raises:
-            FTPObjectAlreadyExistsError
+            FTPError:  the file ended before the part did
 
         """
 
-        remotePath = self.AbsolutePath(dirName)
-        
-        if not self.IsDir(remotePath) and not self.IsFile(remotePath) :
-            self.AuxMkDirInCloud(remotePath)
-        else :
-            raise bftp_ex.FTPObjectAlreadyExistsError 
-
-
-    @abstractmethod
-    def AuxMkDirInCloud( self, remotePath ) :
-        """Make a directory in the cloud.
-
-        This is an abstract auxiliary method that encapsulates
-        cloud-specific functionality.  Subclasses should override
-        this method.
+        (planSize,planWorkers) = self.SegmentPlan( length )
+        segmentSize = segmentSize or planSize
+        maxWorkers = min( maxWorkers or planWorkers, max( 1, -(-length//segmentSize) ) )
+        partPath = localPath + SEGMENTS_SUFFIX
+        IterRange = Unwrapped( self.AuxIterRangeFromCloud )
+        report = TransferReport()
+
+        with open( partPath, 'wb' ) as fp :
+            fp.truncate( length )
+            fd = fp.fileno()
+            def GetSegment( start ) :
+                size = min( segmentSize, length-start )
+                position = start
+                for chunk in IterRange( remotePath, offset+start, size, extraArgs ) :
+                    if report.failures :
+                        return 0
+                    view = memoryview( chunk )
+                    nbytes = 0
+                    while nbytes < len(view) :
+                        nbytes += os.pwrite( fd, view[nbytes:], position+nbytes )
+                    position += nbytes
+                if position != start+size :
+                    raise bftp_ex.FTPError
+                return size
+            RunParallel( GetSegment, range(0,length,segmentSize), maxWorkers, report=report,
+                         stopOnFailure=True )
+
+        if report.failures :
+            os.remove( partPath )
+            raise report.failures[0][1]
+        os.replace( partPath, localPath )
+        return length
+
+
+    def SegmentPlan( self, length ) :
+        """ Auxiliary method:  segment size and thread count for GetSegments.
+
+        By default segments are DEFAULT_SEGMENT_SIZE bytes, fetched by
+        the maxWorkers attribute's number of threads (see the parallel
+        command).  Subclasses may override this to follow their own
+        transfer settings.
 
         Arguments:
-            remotePath (str) : path for directory to be created
-        
-        No return value.
-
-        """
-
-        pass
-
-
-    @ExceptionWrapper
-    def mput( self,args,extraArgs=None ) :
-        """ Uploads multiple files to dropbox.
-
-        Invokes python's iglob function on the file pattern(s) specified
-        and then repeatedly invokes the put method on the results.  This
-        method probably does not need to be overridden by subclasses.
-
-        Attributes:
-            args (list):       files to be transferred
-            extraArgs(dict):   may be used by subclasses
+            length (int):  number of bytes to be downloaded
 
-        No return value.
+        Returns a (segmentSize, maxWorkers) tuple.
 
         """
 
-        for fpattern in args :
-            for f in glob.iglob(fpattern) :
-                self.put(f,extraArgs)
-        
+        return ( DEFAULT_SEGMENT_SIZE, self.maxWorkers )
 
-    @abstractmethod
-    def open( self, loc ) :
-        """Opens a connection to dropbox, returning that connection.
 
-        This method does need to be overridden by subclasses.
+    def GetEntry( self,entry,extraArgs=None ) :
+        """ Auxiliary method:  download a file described by a listing entry.
 
-        Attributes:
-            loc (str):  cloud location to connect with
+        Used by batch commands, which already know from the listing
+        that the entry is a file and how large it is, so no further
+        existence check is made.  The file is downloaded to the local
+        working directory.  Errors propagate to the caller.
 
-        No return value.
+        Arguments:
+            entry (dict):      as generated by IterDir
+            extraArgs (dict):  possibly used by subclasses
+
+        Returns the number of bytes downloaded.
 
         """
 
-        pass
+        localPath = self.localWorkingDir + '/' + os.path.basename(entry['name'])
+        Unwrapped( self.AuxGetEntryFromCloud )( entry, localPath, extraArgs )
+        return entry['size']
 
 
-    @ExceptionWrapper
-    def put( self,fileName,extraArgs=None ) :
-        """Uploads a file to the cloud.
+    def AuxGetEntryFromCloud( self, entry, localPath, extraArgs ) :
+        """ Get a file described by a listing entry from the cloud
 
-        Overwrites an existing file of the same name in the cloud.
-        Note that parameter fileName may include folders.  If so, the file
-        is uploaded to the current cloud directory.  Probably does
-        not need to be overridden by subclasses.  Cloud provider-
-        specific functionality is encapsulated in abstract auxiliary
-        method AuxPutInCloud, which would need to be overridden.
+        Subclasses may override this method to make use of the
+        metadata in the entry (size, etag).  By default it calls
+        AuxGetFromCloud with the entry's key.
 
-        Attributes:
-            fileName (str):    file to be placed into the cloud
-            extraArgs (dict):  may be used by subclasses
+        Arguments:
+            entry (dict)     : as generated by IterDir
+            localPath (str)  : where to put it
+            extraArgs (dict) : possibly useful for subclasses
 
         No return value.
 
         """
 
-        localPath = self.localWorkingDir + '/' + fileName
-        (localDir,localFile) = os.path.split(localPath)
-        remotePath = self.AbsolutePath(localFile) 
-        self.AuxPutInCloud( localPath,remotePath,extraArgs )
-
+        Unwrapped( self.AuxGetFromCloud )( entry['key'], localPath, extraArgs )
+            
 
     @abstractmethod
-    def AuxPutInCloud( self, localPath, remotePath, extraArgs ) :
-        """Uploads a file to the cloud.
+    def AuxGetFromCloud( self, remotePath, localPath, extraArgs ) :
+        """ Get a file from the cloud
 
         This is an abstract auxiliary method that encapsulates
         cloud-specific functionality.  Subclasses should override
         this method.
 
         Arguments:
-            localPath (str)  : file to be transferred to cloud
-            remotePath (str) : where to put it
+            remotePath (str) : file to be gotten
+            localPath (str)  : where to put it
             extraArgs (dict) : possibly useful for subclasses
         
         No return value.
@@ -480,104 +600,1625 @@ class BaseFtpClient :
 
 
     @ExceptionWrapper
-    def rmdir( self,dirName ) :
-        """ Remove cloud folder.
-
-        Probably does not need to be overridden by subclasses.  Cloud
-        provider-specific functionality is encapsulated in abstract auxiliary
-        method AuxRmDirFromCloud, which would need to be overridden.
+    def getTree( self,dirName,extraArgs=None,maxWorkers=None ) :
+        """ Downloads a cloud folder and everything beneath it.
+
+        This is the get -r command.  The folder is copied into a local
+        folder of the same name in the local working directory (the
+        remote root is copied into the local working directory itself),
+        merging with and overwriting whatever is already there.  The
+        remote tree is read with a single IterTree listing, and its
+        files are downloaded as the listing arrives by up to maxWorkers
+        threads (default: the maxWorkers attribute).  Local folders are
+        created as needed.  A failure to get one file is recorded and
+        does not stop the others.  Probably does not need to be
+        overridden by subclasses.
 
-        Attributes:  
-            dirName (str):  specifies remote directory to be removed.
+        Arguments:
+            dirName (str):     remote folder to be gotten
+            extraArgs (dict):  possibly used by subclasses
+            maxWorkers (int):  number of concurrent downloads
 
-        No return value.
+        Returns a TransferReport.
 
         Raises:
-            FTPDirNotEmptyError
             FTPNoSuchDirError
 
         """
 
         remotePath = self.AbsolutePath(dirName)
-        if self.IsDir(remotePath) :
-            if self.DirEmpty(remotePath) :
-                self.AuxRmDirFromCloud( remotePath )
-                pass
-            else :
-                raise bftp_ex.FTPDirNotEmptyError
-        else :
+        if remotePath and self.ObjectType(remotePath) != OBJ_DIR :
             raise bftp_ex.FTPNoSuchDirError
+        localRoot = os.path.join( self.localWorkingDir, os.path.basename(remotePath) )
+        os.makedirs( localRoot, exist_ok=True )
 
+        def LocalPath( entry ) :
+            return LocalPathFor( localRoot, entry['name'] )
 
-    @abstractmethod
-    def AuxRmDirFromCloud( self, remotePath ) :
-        """ Remove cloud folder.
+        report = TransferReport('downloaded')
+        def Files() :
+            for entry in self.IterTree(remotePath) :
+                if entry['type'] != OBJ_DIR :
+                    yield entry
+                    continue
+                try :
+                    os.makedirs( LocalPath(entry), exist_ok=True )
+                except ( OSError, bftp_ex.FTPInvalidCloudLocation ) as e :
+                    report.AddFailure( entry['name'], e )
 
-        This is an abstract auxiliary method that encapsulates
-        cloud-specific functionality.  Subclasses should override
-        this method.
+        def GetOne( entry ) :
+            localPath = LocalPath(entry)
+            os.makedirs( os.path.dirname(localPath), exist_ok=True )
+            Unwrapped( self.AuxGetEntryFromCloud )( entry, localPath, extraArgs )
+            return entry['size']
 
-        Arguments:
-            remotePath (str) : directory to be removed
-        
-        No return value.
+        return self.RunBatch( 'getTree', [dirName,extraArgs], GetOne, Files(), maxWorkers,
+                              report, nameOf=lambda entry : entry['name'] )
 
-        """
 
-        pass
+    @ExceptionWrapper
+    def get_stream( self,fileName,stream,extraArgs=None ) :
+        """Downloads a file from the cloud into a binary stream.
 
+        Writes the content of the cloud file to stream, which may be
+        any object with a write method accepting bytes (for example,
+        sys.stdout.buffer or an open file).  This backs the get file -
+        command, which writes to standard output.  Cloud provider-
+        specific functionality is encapsulated in auxiliary method
+        AuxGetStreamFromCloud.
 
-    @abstractmethod
-    def IsDir(self,loc) :
-        """ Auxiliary method:  check if specified cloud location is directory.
+        Arguments:
+            fileName (str):    file to be gotten
+            stream (file):     where to write it
+            extraArgs (dict):  possibly used by subclasses
 
-        Subclasses must override and implement this method.
-        This method assumes loc is a valid cloud location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function below.
+        Returns the number of bytes written.
 
-        Returns a boolean.
+        Raises:
+            FTPIsADirectoryError
+            FTPNoSuchFileError
 
         """
 
-        pass 
+        remotePath = self.AbsolutePath(fileName)
+        objType = self.ObjectType(remotePath)
+        if objType == OBJ_FILE :
+            return self.AuxGetStreamFromCloud( remotePath, stream, extraArgs )
+        elif objType == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        else :
+            raise bftp_ex.FTPNoSuchFileError
 
 
-    @abstractmethod
-    def IsFile(self,loc) :
-        """ Auxiliary method:  check if specified location is a file
+    def AuxGetStreamFromCloud( self, remotePath, stream, extraArgs ) :
+        """ Get a file from the cloud into a binary stream
 
-        Subclasses must override and implement this method.
-        This method assumes loc is a valid cloud location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function.
+        Subclasses should override this method if their cloud provider
+        can stream the content of a file.  By default the file is
+        downloaded with AuxGetFromCloud to a temporary file, which is
+        then copied to the stream.
 
-        Returns a boolean.
+        Arguments:
+            remotePath (str) : file to be gotten
+            stream (file)    : where to write it
+            extraArgs (dict) : possibly useful for subclasses
+
+        Returns the number of bytes written.
 
         """
 
-        pass
+        with tempfile.TemporaryDirectory() as tmpDir :
+            localPath = os.path.join( tmpDir, 'stream' )
+            self.AuxGetFromCloud( remotePath, localPath, extraArgs )
+            with open( localPath, 'rb' ) as fp :
+                return CopyStream( fp, stream )
 
 
     @ExceptionWrapper
-    def DirEmpty(self,loc) :
-        """ Auxiliary method:  check if specified directory is empty.
+    def get_bytes( self,fileName,extraArgs=None ) :
+        """Downloads a file from the cloud into memory.
 
-        Subclasses must override and implement this method.        
-        This method assumes loc is a valid cloud location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function.
+        Cloud provider-specific functionality is encapsulated in
+        auxiliary method AuxGetBytesFromCloud.
 
-        Returns a boolean.
+        Arguments:
+            fileName (str):    file to be gotten
+            extraArgs (dict):  possibly used by subclasses
+
+        Returns a bytearray holding the content of the file.
+
+        Raises:
+            FTPIsADirectoryError
+            FTPNoSuchFileError
 
         """
 
-        pass
+        remotePath = self.AbsolutePath(fileName)
+        objType = self.ObjectType(remotePath)
+        if objType == OBJ_FILE :
+            return self.AuxGetBytesFromCloud( remotePath, extraArgs )
+        elif objType == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        else :
+            raise bftp_ex.FTPNoSuchFileError
 
 
-    @abstractmethod
-    def AbsolutePath(self,f) :
-        """ Auxiliary method:  transform relative cloud path to absolute path.
+    @ExceptionWrapper
+    def get_into( self,fileName,buffer,extraArgs=None ) :
+        """Downloads a file from the cloud into a preallocated buffer.
+
+        Fills the start of buffer, which may be any writable
+        bytes-like object (for example, a bytearray, an mmap or a
+        memoryview of either), with the content of the cloud file.
+        The content is read straight into the buffer where the cloud
+        provider allows it, so a buffer can be reused for many files
+        without allocating memory for each one.  Cloud provider-
+        specific functionality is encapsulated in auxiliary method
+        AuxGetIntoFromCloud.
+
+        Arguments:
+            fileName (str):    file to be gotten
+            buffer (buffer):   where to put it
+            extraArgs (dict):  possibly used by subclasses
+
+        Returns the number of bytes read.
+
+        Raises:
+            FTPIsADirectoryError
+            FTPNoSuchFileError
+            FTPBufferTooSmallError
+
+        """
+
+        remotePath = self.AbsolutePath(fileName)
+        objType = self.ObjectType(remotePath)
+        if objType == OBJ_FILE :
+            return self.AuxGetIntoFromCloud( remotePath, memoryview(buffer).cast('B'), extraArgs )
+        elif objType == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        else :
+            raise bftp_ex.FTPNoSuchFileError
+
+
+    @ExceptionWrapper
+    def get_range( self,fileName,offset,length=None,extraArgs=None ) :
+        """Downloads part of a file from the cloud into memory.
+
+        Only the part requested is transferred where the cloud provider
+        allows it.  Unlike get and get_bytes, the part is of the file
+        as stored, so for a compressed file (see the compress command
+        of S3FtpClient) it is part of the compressed content.  Cloud
+        provider-specific functionality is encapsulated in auxiliary
+        method AuxGetRangeFromCloud.
+
+        Arguments:
+            fileName (str):    file to be gotten
+            offset (int):      position of the first byte wanted; if
+                               negative, counts from the end of the file
+            length (int):      number of bytes wanted, or None for the
+                               rest of the file
+            extraArgs (dict):  possibly used by subclasses
+
+        Returns a bytearray, shorter than length if the file ends first.
+
+        Raises:
+            FTPIsADirectoryError
+            FTPNoSuchFileError
+
+        """
+
+        remotePath = self.AbsolutePath(fileName)
+        objType = self.ObjectType(remotePath)
+        if objType == OBJ_FILE :
+            return self.AuxGetRangeFromCloud( remotePath, offset, length, extraArgs )
+        elif objType == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        else :
+            raise bftp_ex.FTPNoSuchFileError
+
+
+    def AuxGetBytesFromCloud( self, remotePath, extraArgs ) :
+        """ Get a file from the cloud into memory
+
+        Subclasses should override this method if their cloud provider
+        tells the size of a file before its content, so that it can be
+        read into a buffer of the right size.  By default the file is
+        read with AuxGetStreamFromCloud.
+
+        Arguments:
+            remotePath (str) : file to be gotten
+            extraArgs (dict) : possibly useful for subclasses
+
+        Returns a bytearray.
+
+        """
+
+        out = io.BytesIO()
+        Unwrapped( self.AuxGetStreamFromCloud )( remotePath, out, extraArgs )
+        return bytearray( out.getbuffer() )
+
+
+    def AuxGetIntoFromCloud( self, remotePath, view, extraArgs ) :
+        """ Get a file from the cloud into a buffer
+
+        Subclasses should override this method if their cloud provider
+        can read content straight into a buffer.  By default the file
+        is written to the buffer by AuxGetStreamFromCloud.
+
+        Arguments:
+            remotePath (str)   : file to be gotten
+            view (memoryview)  : byte view of the buffer
+            extraArgs (dict)   : possibly useful for subclasses
+
+        Returns the number of bytes read.
+
+        Raises:
+            FTPBufferTooSmallError
+
+        """
+
+        return Unwrapped( self.AuxGetStreamFromCloud )( remotePath, BufferWriter(view), extraArgs )
+
+
+    def AuxGetRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """ Get part of a file from the cloud into memory
+
+        Subclasses should override this method if their cloud provider
+        can send part of a file.  By default the whole file is read
+        with AuxGetBytesFromCloud and the part is cut from it.
+
+        Arguments:
+            remotePath (str) : file to be read
+            offset (int)     : position of the first byte wanted; if
+                               negative, counts from the end of the file
+            length (int)     : number of bytes wanted, or None for the
+                               rest of the file
+            extraArgs (dict) : possibly useful for subclasses
+
+        Returns a bytearray, shorter than length only if the file ends
+        first.
+
+        """
+
+        data = Unwrapped( self.AuxGetBytesFromCloud )( remotePath, extraArgs )
+        start = max( 0, len(data)+offset ) if offset < 0 else offset
+        return data[ start : None if length is None else start+length ]
+
+
+    def AuxIterRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """ Get part of a file from the cloud as a series of chunks
+
+        Subclasses should override this method if their cloud provider
+        can stream part of a file, so that the part need not be held in
+        memory at once.  By default the part is read whole with
+        AuxGetRangeFromCloud.
+
+        Arguments:
+            remotePath (str) : file to be read
+            offset (int)     : position of the first byte wanted
+            length (int)     : number of bytes wanted
+            extraArgs (dict) : possibly useful for subclasses
+
+        Generates bytes-like chunks, in order, which add up to fewer
+        than length bytes only if the file ends first.
+
+        """
+
+        yield Unwrapped( self.AuxGetRangeFromCloud )( remotePath, offset, length, extraArgs )
+
+
+    def AuxGetSizeFromCloud( self, remotePath ) :
+        """ Get the size of a file in the cloud
+
+        Subclasses should override this method with a metadata request.
+        By default the whole file is read with AuxGetBytesFromCloud.
+
+        Arguments:
+            remotePath (str) : file to be measured
+
+        Returns the size in bytes.
+
+        """
+
+        return len( Unwrapped( self.AuxGetBytesFromCloud )( remotePath, None ) )
+
+
+    @abstractmethod
+    def ls( self ) :
+        """Lists contents of current working folder in cloud folder.
+
+        Returns a list.  Subclasses must override this with a cloud
+        provider-specific implementation.
+
+        """
+
+        pass
+
+
+    def iter_ls( self ) :
+        """Generates contents of current working folder in cloud folder.
+
+        Lets callers stream very large folders instead of holding the
+        whole listing in memory.  This default implementation simply
+        iterates over the result of ls.  Subclasses should override it
+        when their cloud provider returns listings page by page.
+
+        """
+
+        for name in self.ls() :
+            yield name
+
+
+    def IterDir( self,loc ) :
+        """ Auxiliary method:  generate the entries directly inside a cloud folder.
+
+        Each entry is a dictionary with keys name (relative to loc),
+        key (absolute path), type (OBJ_FILE or OBJ_DIR), size, etag and
+        mtime.  Batch commands use the entries so that they need not
+        look up each file again.  This default implementation lists
+        the current working folder with ls and classifies each name
+        with ObjectType, leaving etag and mtime set to None and size
+        to 0.  Subclasses should override it with a single listing that
+        returns this metadata.  Assumes loc is an absolute path, as
+        returned by the AbsolutePath auxiliary function.
+
+        """
+
+        (savedDir,self.remoteWorkingDir) = (self.remoteWorkingDir,loc)
+        try :
+            names = self.ls()
+        finally :
+            self.remoteWorkingDir = savedDir
+        for name in names :
+            key = loc + '/' + name if loc else name
+            yield { 'name':name, 'key':key, 'type':self.ObjectType(key),
+                    'size':0, 'etag':None, 'mtime':None }
+
+
+    def IterTree( self,loc ) :
+        """ Auxiliary method:  generate every entry beneath a cloud folder.
+
+        Like IterDir, but recursive:  yields the files and directories
+        at every depth below loc, each directory before its contents.
+        Entry names are relative to loc, with / separators.  This
+        default implementation calls IterDir once per directory.
+        Subclasses should override it when their cloud provider can
+        list a whole subtree at once.
+
+        """
+
+        stack = [ ('',loc) ]
+        while stack :
+            (relDir,absDir) = stack.pop()
+            for entry in self.IterDir(absDir) :
+                if relDir :
+                    entry['name'] = relDir + '/' + entry['name']
+                yield entry
+                if entry['type'] == OBJ_DIR :
+                    stack.append( (entry['name'],entry['key']) )
+
+
+    @ExceptionWrapper
+    def PrintLs( self ) :
+        """Prints contents of current working folder, one entry per line.
+
+        Entries are printed as they arrive from iter_ls.  This backs
+        the ls command of CommandLine.
+
+        No return value.
+
+        """
+
+        for name in self.iter_ls() :
+            print( name )
+
+
+    @ExceptionWrapper
+    def mdelete( self,args,maxWorkers=None ) :
+       """ Deletes multiple files from the cloud.
+
+       Repeatedly deletes files whose name match the pattern(s) specified
+       in the function arguments.  Note this function only operates
+       on files in the current remote working directory.  The folder
+       is listed once and the matching keys are handed in bulk to
+       AuxDeleteManyFromCloud, which uses up to maxWorkers threads
+       (default: the maxWorkers attribute).
+       A failure to delete one file is recorded and does not stop the
+       others.  Subclasses probably do not need to override this method.
+
+       Arguments:
+           args (list):       file name patterns
+           maxWorkers (int):  number of concurrent deletions
+
+       Returns a TransferReport.
+
+       """
+
+       remotePaths = ( entry['key'] for entry in self.MatchEntries(args) )
+       return self.AuxDeleteManyFromCloud( remotePaths, maxWorkers or self.maxWorkers,
+                                           TransferReport('deleted') )
+
+
+    @ExceptionWrapper
+    def mget( self,args,extraArgs=None,maxWorkers=None ) :
+        """ Downloads multiple files from the cloud.
+
+        Repeatedly gets files whose name match the pattern(s) specified
+        in the function arguments.  Note this function only operates
+        on files in the current remote working directory.  The folder
+        is listed once, and the metadata from that listing is handed
+        straight to the downloads, so there is no per-file lookup.
+        Matching files are downloaded to the local working directory
+        by up to maxWorkers threads (default: the maxWorkers attribute).
+        A failure to get one file is recorded and does not stop the
+        others.  Subclasses probably do not need to override this method.
+
+        Arguments:
+            args (list):       list of files to be gotten
+            extraArgs(dict):   may be used by subclasses
+            maxWorkers (int):  number of concurrent downloads
+
+        Returns a TransferReport.
+
+        """
+
+        entries = self.MatchEntries(args)
+        return self.RunBatch( 'mget', [args,extraArgs], lambda entry : self.GetEntry(entry,extraArgs),
+                              entries, maxWorkers, TransferReport('downloaded'),
+                              nameOf=lambda entry : entry['name'] )
+
+
+    def MatchEntries( self,patterns ) :
+        """ Auxiliary method:  generate files in the remote working directory matching patterns.
+
+        Lists the remote working directory once, with IterDir, and
+        yields each file entry whose name matches any of the patterns.
+
+        """
+
+        for entry in self.IterDir( self.remoteWorkingDir ) :
+            if entry['type'] == OBJ_FILE and \
+               any( fnmatch.fnmatch(entry['name'],fpattern) for fpattern in patterns ) :
+                yield entry
+
+
+    def RunBatch( self, command, args, func, items, maxWorkers, report, nameOf=str ) :
+        """ Auxiliary method:  run a batch command's work, recording progress in the journal.
+
+        Applies func to the items with RunParallel, using maxWorkers
+        threads (default:  the maxWorkers attribute).  If there is a
+        transfer journal, the command is recorded in it with its
+        arguments and the working directories, and so is each item
+        (named by nameOf) once func succeeds.  Items recorded by an
+        earlier run of the batch being resumed are skipped.  The batch
+        is forgotten once it completes without failures.
+
+        Arguments:
+            command (str)      :  name of the command method
+            args (list)        :  its positional arguments (JSON-serializable)
+            func (callable)    :  applied to each item; returns bytes moved
+            items (iterable)   :  work items
+            maxWorkers (int)   :  number of worker threads, or None
+            report (TransferReport) :  report to update
+            nameOf (callable)  :  names an item
+
+        Returns the report.
+
+        """
+
+        maxWorkers = maxWorkers or self.maxWorkers
+        journal = self.transferJournal
+        if journal is None :
+            return RunParallel( func, items, maxWorkers, report=report, nameOf=nameOf )
+
+        (batchId,self.resumingBatch) = (self.resumingBatch,None)
+        if batchId is None :
+            batchId = journal.StartBatch( self.cloudStorageLocation, command, args,
+                                          self.localWorkingDir, self.remoteWorkingDir )
+        done = journal.DoneItems( batchId )
+
+        def Todo() :
+            for item in items :
+                if nameOf(item) in done :
+                    report.AddSkipped()
+                else :
+                    yield item
+
+        def RunOne( item ) :
+            rVal = func( item )
+            journal.ItemDone( batchId, nameOf(item) )
+            return rVal
+
+        RunParallel( RunOne, Todo(), maxWorkers, report=report, nameOf=nameOf )
+        if not report.failures :
+            journal.EndBatch( batchId )
+        return report
+
+
+    @ExceptionWrapper
+    def mkdir( self,dirName ) :
+        """Make a directory in the cloud.
+
+        Does nothing if folder or file of this name already exists in the
+        remote working directory.  This method probably does not need
+        to be overridden by subclasses.  However, the abstract auxiliary
+        method AuxMkDirInCloud encapsulates cloud provider-specific functionality
+        for making a directory and would need to be overridden.
+
+        Arguments:
+           dirName (str):  directory specifier
+
+        No return value.
+
+        Raises:
+            FTPObjectAlreadyExistsError
+
+        """
+
+        remotePath = self.AbsolutePath(dirName)
+        
+        if self.ObjectType(remotePath) == OBJ_NONE :
+            self.AuxMkDirInCloud(remotePath)
+        else :
+            raise bftp_ex.FTPObjectAlreadyExistsError 
+
+
+    @abstractmethod
+    def AuxMkDirInCloud( self, remotePath ) :
+        """Make a directory in the cloud.
+
+        This is an abstract auxiliary method that encapsulates
+        cloud-specific functionality.  Subclasses should override
+        this method.
+
+        Arguments:
+            remotePath (str) : path for directory to be created
+        
+        No return value.
+
+        """
+
+        pass
+
+
+    @ExceptionWrapper
+    def mput( self,args,extraArgs=None,maxWorkers=None ) :
+        """ Uploads multiple files to dropbox.
+
+        Invokes python's iglob function on the file pattern(s) specified
+        and then uploads the results using up to maxWorkers threads
+        (default: the maxWorkers attribute).  A failure to put one file
+        is recorded and does not stop the others.  With a manifest, as
+        with sync put --cached, files it records as uploaded to the same
+        cloud file and unchanged since are skipped without hashing or
+        listing, and the files uploaded are recorded.  This method
+        probably does not need to be overridden by subclasses.
+
+        Attributes:
+            args (list):       files to be transferred
+            extraArgs(dict):   may be used by subclasses
+            maxWorkers (int):  number of concurrent uploads
+
+        Returns a TransferReport.
+
+        """
+
+        (manifest,location) = (self.syncManifest,self.cloudStorageLocation)
+        report = TransferReport('uploaded')
+        def Paths( f ) :
+            localPath = self.localWorkingDir + '/' + f
+            return ( localPath, self.AbsolutePath( os.path.basename(localPath) ) )
+
+        def Names() :
+            for f in ( f for fpattern in args for f in glob.iglob(fpattern) ) :
+                (localPath,remotePath) = Paths( f )
+                if manifest and os.path.isfile( localPath ) and \
+                   manifest.Lookup( location, remotePath, localPath, os.stat(localPath) ) is not None :
+                    report.AddSkipped()
+                else :
+                    yield f
+
+        def PutOne( f ) :
+            (localPath,remotePath) = Paths( f )
+            st = os.stat( localPath )
+            Unwrapped( self.AuxPutInCloud )( localPath, remotePath, extraArgs )
+            if manifest :
+                manifest.Synced( location, remotePath, None, localPath, st )
+            return st.st_size
+
+        self.RunBatch( 'mput', [args,extraArgs], PutOne, Names(), maxWorkers, report )
+        if manifest :
+            manifest.Flush()
+        return report
+        
+
+    @abstractmethod
+    def open( self, loc ) :
+        """Opens a connection to dropbox, returning that connection.
+
+        This method does need to be overridden by subclasses.
+
+        Attributes:
+            loc (str):  cloud location to connect with
+
+        No return value.
+
+        """
+
+        pass
+
+
+    @ExceptionWrapper
+    def put( self,fileName,extraArgs=None ) :
+        """Uploads a file to the cloud.
+
+        Overwrites an existing file of the same name in the cloud.
+        Note that parameter fileName may include folders.  If so, the file
+        is uploaded to the current cloud directory.  Probably does
+        not need to be overridden by subclasses.  Cloud provider-
+        specific functionality is encapsulated in abstract auxiliary
+        method AuxPutInCloud, which would need to be overridden.
+
+        Attributes:
+            fileName (str):    file to be placed into the cloud
+            extraArgs (dict):  may be used by subclasses
+
+        No return value.
+
+        """
+
+        self.PutFile(fileName,extraArgs)
+
+
+    def PutFile( self,fileName,extraArgs=None ) :
+        """ Auxiliary method:  upload a file, without exception handling.
+
+        Does the work of the put command.  Errors propagate to the
+        caller so that batch commands can record them per file.
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        localPath = self.localWorkingDir + '/' + fileName
+        (localDir,localFile) = os.path.split(localPath)
+        remotePath = self.AbsolutePath(localFile) 
+        self.AuxPutInCloud( localPath,remotePath,extraArgs )
+        return os.path.getsize(localPath)
+
+
+    @abstractmethod
+    def AuxPutInCloud( self, localPath, remotePath, extraArgs ) :
+        """Uploads a file to the cloud.
+
+        This is an abstract auxiliary method that encapsulates
+        cloud-specific functionality.  Subclasses should override
+        this method.
+
+        Arguments:
+            localPath (str)  : file to be transferred to cloud
+            remotePath (str) : where to put it
+            extraArgs (dict) : possibly useful for subclasses
+        
+        No return value.
+
+        """
+
+        pass
+
+
+    @ExceptionWrapper
+    def putTree( self,dirName,extraArgs=None,maxWorkers=None ) :
+        """ Uploads a local folder and everything beneath it.
+
+        This is the put -r command.  The local folder (relative to the
+        local working directory) is copied into a cloud folder of the
+        same name in the remote working directory, merging with and
+        overwriting whatever is already there.  The local tree is
+        walked with os.scandir, and its files are uploaded as they are
+        found by up to maxWorkers threads (default: the maxWorkers
+        attribute).  Cloud folders are created with AuxMkDirInCloud
+        only for empty local folders, since AuxPutInCloud creates
+        whatever a file needs.  Symbolic links to folders are not
+        followed.  A failure to put one file is recorded and does not
+        stop the others.  Probably does not need to be overridden by
+        subclasses.
+
+        Arguments:
+            dirName (str):     local folder to be transferred
+            extraArgs (dict):  may be used by subclasses
+            maxWorkers (int):  number of concurrent uploads
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPNoSuchDirError
+            FTPObjectAlreadyExistsError
+
+        """
+
+        localRoot = os.path.join( self.localWorkingDir, dirName )
+        if not os.path.isdir( localRoot ) :
+            raise bftp_ex.FTPNoSuchDirError
+        name = os.path.basename( os.path.abspath(localRoot) )
+        remoteRoot = self.AbsolutePath(name) if name else self.remoteWorkingDir
+        if self.ObjectType(remoteRoot) == OBJ_FILE :
+            raise bftp_ex.FTPObjectAlreadyExistsError
+
+        report = TransferReport('uploaded')
+        def NameOf( localPath ) :
+            return os.path.relpath( localPath, self.localWorkingDir )
+
+        def Files() :
+            stack = [ (localRoot,remoteRoot) ]
+            while stack :
+                (localDir,remoteDir) = stack.pop()
+                empty = True
+                with os.scandir( localDir ) as it :
+                    for e in it :
+                        empty = False
+                        if e.is_dir( follow_symlinks=False ) :
+                            stack.append( (e.path, remoteDir + '/' + e.name) )
+                        elif e.is_file() :
+                            yield (e.path, remoteDir + '/' + e.name)
+                if empty :
+                    try :
+                        Unwrapped( self.AuxMkDirInCloud )( remoteDir )
+                    except Exception as e :
+                        report.AddFailure( NameOf(localDir), e )
+
+        def PutOne( item ) :
+            (localPath,remotePath) = item
+            Unwrapped( self.AuxPutInCloud )( localPath, remotePath, extraArgs )
+            return os.path.getsize(localPath)
+
+        return self.RunBatch( 'putTree', [dirName,extraArgs], PutOne, Files(), maxWorkers,
+                              report, nameOf=lambda item : NameOf(item[0]) )
+
+
+    @ExceptionWrapper
+    def put_stream( self,stream,fileName,extraArgs=None ) :
+        """Uploads the content of a binary stream to the cloud.
+
+        Reads stream to its end, which may be any object with a read
+        method returning bytes (for example, sys.stdin.buffer or an
+        open file), and stores what was read as fileName (relative to
+        the remote working directory).  Overwrites an existing file of
+        the same name.  This backs the put - file command, which reads
+        standard input.  Cloud provider-specific functionality is
+        encapsulated in auxiliary method AuxPutStreamInCloud.
+
+        Arguments:
+            stream (file):     where to read the content
+            fileName (str):    file to be created in the cloud
+            extraArgs (dict):  may be used by subclasses
+
+        Returns the number of bytes uploaded.
+
+        Raises:
+            FTPIsADirectoryError
+
+        """
+
+        remotePath = self.AbsolutePath(fileName)
+        if self.ObjectType(remotePath) == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        return self.AuxPutStreamInCloud( stream, remotePath, extraArgs )
+
+
+    def AuxPutStreamInCloud( self, stream, remotePath, extraArgs ) :
+        """ Upload the content of a binary stream to the cloud
+
+        Subclasses should override this method if their cloud provider
+        can accept data of unknown length without staging it on disk.
+        By default the stream is copied to a temporary file, which is
+        uploaded with AuxPutInCloud.
+
+        Arguments:
+            stream (file)    : where to read the content
+            remotePath (str) : where to put it
+            extraArgs (dict) : possibly useful for subclasses
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        with tempfile.TemporaryDirectory() as tmpDir :
+            localPath = os.path.join( tmpDir, 'stream' )
+            with open( localPath, 'wb' ) as fp :
+                nbytes = CopyStream( stream, fp )
+            Unwrapped( self.AuxPutInCloud )( localPath, remotePath, extraArgs )
+            return nbytes
+
+
+    @ExceptionWrapper
+    def put_bytes( self,fileName,buffer,extraArgs=None ) :
+        """Uploads a bytes-like object to the cloud.
+
+        Stores the content of buffer, which may be any bytes-like
+        object (for example, bytes, a bytearray, an mmap or a
+        memoryview of any of them), as fileName (relative to the
+        remote working directory), without writing it to a local file.
+        Overwrites an existing file of the same name.  Object
+        parameters are merged with the defaults as for put.  Cloud
+        provider-specific functionality is encapsulated in auxiliary
+        method AuxPutBytesInCloud.
+
+        Arguments:
+            fileName (str):    file to be created in the cloud
+            buffer (buffer):   content of the file
+            extraArgs (dict):  may be used by subclasses
+
+        Returns the number of bytes uploaded.
+
+        Raises:
+            FTPIsADirectoryError
+
+        """
+
+        remotePath = self.AbsolutePath(fileName)
+        if self.ObjectType(remotePath) == OBJ_DIR :
+            raise bftp_ex.FTPIsADirectoryError
+        return self.AuxPutBytesInCloud( memoryview(buffer).cast('B'), remotePath, extraArgs )
+
+
+    def AuxPutBytesInCloud( self, view, remotePath, extraArgs ) :
+        """ Upload a buffer to the cloud
+
+        Subclasses should override this method if their cloud provider
+        can take the content of a file from memory without copying it.
+        By default the buffer is uploaded with AuxPutStreamInCloud.
+
+        Arguments:
+            view (memoryview) : byte view of the content
+            remotePath (str)  : where to put it
+            extraArgs (dict)  : possibly useful for subclasses
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        return Unwrapped( self.AuxPutStreamInCloud )( BufferReader(view), remotePath, extraArgs )
+
+
+    @ExceptionWrapper
+    def rmdir( self,dirName ) :
+        """ Remove cloud folder.
+
+        Probably does not need to be overridden by subclasses.  Cloud
+        provider-specific functionality is encapsulated in abstract auxiliary
+        method AuxRmDirFromCloud, which would need to be overridden.
+
+        Attributes:  
+            dirName (str):  specifies remote directory to be removed.
+
+        No return value.
+
+        Raises:
+            FTPDirNotEmptyError
+            FTPNoSuchDirError
+
+        """
+
+        remotePath = self.AbsolutePath(dirName)
+        if self.IsDir(remotePath) :
+            if self.DirEmpty(remotePath) :
+                self.AuxRmDirFromCloud( remotePath )
+                pass
+            else :
+                raise bftp_ex.FTPDirNotEmptyError
+        else :
+            raise bftp_ex.FTPNoSuchDirError
+
+
+    @ExceptionWrapper
+    def rmtree( self,dirName,maxWorkers=None ) :
+        """ Remove cloud folder and everything beneath it.
+
+        This is the rmdir -r command.  The files beneath the folder
+        are deleted in bulk, using up to maxWorkers threads (default:
+        the maxWorkers attribute).  Refuses to remove the root folder.
+        Probably does not need to be overridden by subclasses.  Cloud
+        provider-specific functionality is encapsulated in auxiliary
+        method AuxRmTreeFromCloud.
+
+        Attributes:  
+            dirName (str):     specifies remote directory to be removed.
+            maxWorkers (int):  number of concurrent deletions
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPInvalidCloudLocation
+            FTPNoSuchDirError
+
+        """
+
+        remotePath = self.AbsolutePath(dirName)
+        if remotePath == '' :
+            raise bftp_ex.FTPInvalidCloudLocation
+        elif self.IsDir(remotePath) :
+            return self.AuxRmTreeFromCloud( remotePath, maxWorkers or self.maxWorkers,
+                                            TransferReport('deleted') )
+        else :
+            raise bftp_ex.FTPNoSuchDirError
+
+
+    def AuxRmTreeFromCloud( self, remotePath, maxWorkers, report ) :
+        """ Remove cloud folder and everything beneath it.
+
+        Subclasses should override this method if their cloud provider
+        offers a cheaper way to do it.  By default the files found by
+        IterTree are deleted with AuxDeleteManyFromCloud, and then the
+        directories are removed deepest first with AuxRmDirFromCloud.
+
+        Arguments:
+            remotePath (str)       : directory to be removed
+            maxWorkers (int)       : number of concurrent deletions
+            report (TransferReport): records successes and failures
+
+        Returns the report.
+
+        """
+
+        dirs = [ remotePath ]
+        def Files() :
+            for entry in self.IterTree(remotePath) :
+                if entry['type'] == OBJ_DIR :
+                    dirs.append( entry['key'] )
+                else :
+                    yield entry['key']
+        Unwrapped( self.AuxDeleteManyFromCloud )( Files(), maxWorkers, report )
+        for d in reversed(dirs) :
+            try :
+                Unwrapped( self.AuxRmDirFromCloud )( d )
+            except Exception as e :
+                report.AddFailure( d, e )
+        return report.Finish()
+
+
+    @abstractmethod
+    def AuxRmDirFromCloud( self, remotePath ) :
+        """ Remove cloud folder.
+
+        This is an abstract auxiliary method that encapsulates
+        cloud-specific functionality.  Subclasses should override
+        this method.
+
+        Arguments:
+            remotePath (str) : directory to be removed
+        
+        No return value.
+
+        """
+
+        pass
+
+
+    @ExceptionWrapper
+    def sync( self,args ) :
+        """ Transfers only the new and changed files between two folders.
+
+        This is the sync command, which takes one of the forms
+
+            sync put [--delete] [--checksum] [--cached] localDir [remoteDir]
+            sync get [--delete] [--checksum] remoteDir [localDir]
+
+        See syncPut and syncGet.  The --cached option needs a manifest
+        (see the manifest command).
+
+        Arguments:
+            args (list):  as above
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        options = [ a for a in args if a.startswith('--') ]
+        names = [ a for a in args if not a.startswith('--') ]
+        if len(names) not in (2,3) or names[0] not in ('put','get') or \
+           not set(options) <= { '--delete', '--checksum', '--cached' } :
+            raise bftp_ex.FTPInvalidCommand
+        kwargs = { 'delete':'--delete' in options, 'checksum':'--checksum' in options }
+        if '--cached' in options :
+            if names[0] != 'put' or self.syncManifest is None :
+                raise bftp_ex.FTPInvalidCommand
+            kwargs['cached'] = True
+        func = self.syncPut if names[0] == 'put' else self.syncGet
+        return Unwrapped( func )( *names[1:], **kwargs )
+
+
+    @ExceptionWrapper
+    def syncPut( self,localDir,remoteDir=None,delete=False,checksum=False,
+                 cached=False,extraArgs=None,maxWorkers=None ) :
+        """ Uploads the new and changed files of a local folder.
+
+        The remote folder (by default, the folder of the same name as
+        localDir in the remote working directory) is read with a single
+        IterTree listing before the local folder is walked.  A local
+        file is uploaded if it is missing remotely, if the sizes differ,
+        or if it is newer than the remote copy; with checksum, the
+        contents are compared instead of the times (see
+        AuxSameContent).  The comparisons and uploads are done by up to
+        maxWorkers threads (default: the maxWorkers attribute).  With
+        delete, remote files that do not exist locally are then deleted.
+        Only files are synchronized, not empty folders.  Probably does
+        not need to be overridden by subclasses.
+
+        With cached (and a manifest), the remote folder is not listed.
+        Instead, local files the manifest records as synchronized, and
+        unchanged since, are assumed to be up to date, and only the
+        others are uploaded.  This is much faster for large folders
+        with little churn, but does not notice changes made to the
+        remote folder by anyone else.
+
+        Arguments:
+            localDir (str):    local folder to be synchronized
+            remoteDir (str):   remote folder to be updated
+            delete (bool):     delete extraneous remote files
+            checksum (bool):   compare contents rather than times
+            cached (bool):     rely on the manifest instead of a listing
+            extraArgs (dict):  may be used by subclasses
+            maxWorkers (int):  number of concurrent uploads
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPNoSuchDirError
+            FTPObjectAlreadyExistsError
+
+        """
+
+        localRoot = os.path.join( self.localWorkingDir, localDir )
+        if not os.path.isdir( localRoot ) :
+            raise bftp_ex.FTPNoSuchDirError
+        if remoteDir is None :
+            remoteDir = os.path.basename( os.path.abspath(localRoot) )
+        remoteRoot = self.AbsolutePath(remoteDir) if remoteDir else self.remoteWorkingDir
+        objType = self.ObjectType(remoteRoot) if remoteRoot else OBJ_DIR
+        if objType == OBJ_FILE :
+            raise bftp_ex.FTPObjectAlreadyExistsError
+        (manifest,location) = (self.syncManifest,self.cloudStorageLocation)
+        if cached and manifest :
+            remote = None
+            extraneous = set( manifest.Keys(location, remoteRoot + '/' if remoteRoot else '') )
+        elif objType == OBJ_NONE :
+            remote = {}
+        else :
+            remote = { entry['name']:entry for entry in self.IterTree(remoteRoot) if entry['type'] == OBJ_FILE }
+
+        def RemotePath( relName ) :
+            return remoteRoot + '/' + relName if remoteRoot else relName
+
+        report = TransferReport('uploaded')
+        def Files() :
+            for (relName,localPath,st) in WalkFiles(localRoot) :
+                if remote is not None :
+                    yield ( relName, localPath, st, remote.pop(relName,None) )
+                elif manifest.Lookup( location, RemotePath(relName), localPath, st ) is None :
+                    extraneous.discard( RemotePath(relName) )
+                    yield ( relName, localPath, st, None )
+                else :
+                    extraneous.discard( RemotePath(relName) )
+                    report.AddSkipped()
+
+        def PutOne( item ) :
+            (relName,localPath,st,entry) = item
+            if entry and self.SameFile( localPath, st, entry, checksum, upload=True ) :
+                report.AddSkipped()
+                return
+            Unwrapped( self.AuxPutInCloud )( localPath, RemotePath(relName), extraArgs )
+            if manifest :
+                manifest.Synced( location, RemotePath(relName), None, localPath, st )
+            report.AddSuccess( st.st_size )
+
+        RunParallel( PutOne, Files(), maxWorkers or self.maxWorkers, report=report,
+                     nameOf=lambda item : item[0], countItems=False )
+        keys = extraneous if remote is None else [ entry['key'] for entry in remote.values() ]
+        if delete and keys :
+            deleted = Unwrapped( self.AuxDeleteManyFromCloud )( iter(keys), maxWorkers or self.maxWorkers,
+                                                                TransferReport('deleted') )
+            report.AddDeleted( deleted.files )
+            report.failures.extend( deleted.failures )
+            if manifest :
+                failed = set( name for (name,error) in deleted.failures )
+                for key in keys :
+                    if key not in failed :
+                        manifest.Forget( location, key )
+        if manifest :
+            manifest.Flush()
+        return report.Finish()
+
+
+    @ExceptionWrapper
+    def syncGet( self,remoteDir,localDir=None,delete=False,checksum=False,
+                 extraArgs=None,maxWorkers=None ) :
+        """ Downloads the new and changed files of a remote folder.
+
+        The local folder (by default, the folder of the same name as
+        remoteDir in the local working directory; it must be given when
+        remoteDir is the root, which has no name) is scanned first, and
+        then the remote folder is read with a single IterTree listing.
+        A remote file is downloaded if it is missing locally, if the
+        sizes differ, or if it is newer than the local copy; with
+        checksum, the contents are compared instead of the times (see
+        AuxSameContent).  Downloaded files are given the remote
+        modification time, so that the next sync finds them up to date.
+        The comparisons and downloads are done by up to maxWorkers
+        threads (default: the maxWorkers attribute).  With delete, local
+        files that do not exist remotely are then deleted.  Probably
+        does not need to be overridden by subclasses.
+
+        Arguments:
+            remoteDir (str):   remote folder to be synchronized
+            localDir (str):    local folder to be updated
+            delete (bool):     delete extraneous local files
+            checksum (bool):   compare contents rather than times
+            extraArgs (dict):  possibly used by subclasses
+            maxWorkers (int):  number of concurrent downloads
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPNoSuchDirError
+            FTPInvalidCommand:  remoteDir is the root and localDir is not given
+
+        """
+
+        remotePath = self.AbsolutePath(remoteDir)
+        if remotePath and self.ObjectType(remotePath) != OBJ_DIR :
+            raise bftp_ex.FTPNoSuchDirError
+        if localDir is None :
+            if not remotePath :
+                raise bftp_ex.FTPInvalidCommand
+            localDir = os.path.basename(remotePath)
+        localRoot = os.path.join( self.localWorkingDir, localDir )
+        os.makedirs( localRoot, exist_ok=True )
+        local = { relName:(localPath,st) for (relName,localPath,st) in WalkFiles(localRoot) }
+
+        report = TransferReport('downloaded')
+        def Files() :
+            for entry in self.IterTree(remotePath) :
+                if entry['type'] == OBJ_FILE :
+                    yield ( entry, local.pop(entry['name'],None) )
+
+        def GetOne( item ) :
+            (entry,found) = item
+            if found and self.SameFile( found[0], found[1], entry, checksum, upload=False ) :
+                report.AddSkipped()
+                return
+            localPath = LocalPathFor( localRoot, entry['name'] )
+            os.makedirs( os.path.dirname(localPath), exist_ok=True )
+            Unwrapped( self.AuxGetEntryFromCloud )( entry, localPath, extraArgs )
+            if entry['mtime'] is not None :
+                mtime = entry['mtime'].timestamp()
+                os.utime( localPath, (mtime,mtime) )
+            if self.syncManifest :
+                self.syncManifest.Synced( self.cloudStorageLocation, entry['key'], entry['etag'],
+                                      localPath, os.stat(localPath) )
+            report.AddSuccess( entry['size'] )
+
+        RunParallel( GetOne, Files(), maxWorkers or self.maxWorkers, report=report,
+                     nameOf=lambda item : item[0]['name'], countItems=False )
+        if delete :
+            for (relName,(localPath,st)) in local.items() :
+                try :
+                    os.remove( localPath )
+                    report.AddDeleted()
+                except OSError as e :
+                    report.AddFailure( relName, e )
+        if self.syncManifest :
+            self.syncManifest.Flush()
+        return report.Finish()
+
+
+    def SameFile( self, localPath, st, entry, checksum, upload ) :
+        """ Auxiliary method:  decide whether a local file and a cloud file match.
+
+        They match if the manifest (if any) records that the local
+        file, as it is now, matched the cloud file with the same etag.
+        They do not match if the size of the local file is neither
+        that of the cloud file nor that of its content (see
+        ContentSize, which differs for compressed files).  Otherwise, with
+        checksum their contents are compared with AuxSameContent;
+        without it, the copy being updated must not be older than
+        the source (the local file is the source if upload is true).
+        Times are compared in whole seconds, as cloud modification
+        times (S3's LastModified, for one) have no fractional part and
+        a file uploaded in the second it was written would otherwise
+        seem newer than its copy.  A match found this way is recorded
+        in the manifest.
+
+        Arguments:
+            localPath (str)    :  local file
+            st (os.stat_result):  its status
+            entry (dict)       :  cloud file, as generated by IterTree
+            checksum (bool)    :  compare contents rather than times
+            upload (bool)      :  whether the local file is the source
+
+        Returns a boolean.
+
+        """
+
+        manifest = self.syncManifest
+        if manifest and entry['etag'] and \
+           manifest.Lookup( self.cloudStorageLocation, entry['key'], localPath, st ) == entry['etag'] :
+            return True
+        elif st.st_size != entry['size'] and st.st_size != self.ContentSize( entry ) :
+            return False
+        elif checksum :
+            same = self.AuxSameContent( localPath, entry )
+        elif entry['mtime'] is None :
+            return False
+        elif upload :
+            same = int(st.st_mtime) <= int(entry['mtime'].timestamp())
+        else :
+            same = int(st.st_mtime) >= int(entry['mtime'].timestamp())
+        if same and manifest :
+            manifest.Synced( self.cloudStorageLocation, entry['key'], entry['etag'], localPath, st )
+        return same
+
+
+    def ContentSize( self, entry ) :
+        """ Auxiliary method:  size of the content of a cloud file.
+
+        Listings give the size of files as stored.  Subclasses that may
+        store files transformed (compressed, for example) should
+        override this method to give the size of the content a download
+        produces.  By default it is the size in the entry.
+
+        Arguments:
+            entry (dict) : cloud file, as generated by IterTree
+
+        Returns the size in bytes.
+
+        """
+
+        return entry['size']
+
+
+    def AuxSameContent( self, localPath, entry ) :
+        """ Check whether a local file has the same content as a cloud file.
+
+        Subclasses should override this method if their cloud provider
+        does not record the MD5 digest of files as the etag.  By default
+        the hexadecimal MD5 digest of the local file is compared with
+        the etag of the entry.
+
+        Arguments:
+            localPath (str) : local file
+            entry (dict)    : cloud file, as generated by IterTree
+
+        Returns a boolean.
+
+        """
+
+        return entry['etag'] is not None and \
+               self.LocalDigest( localPath, 'md5', lambda : self.CpuCall(FileMD5,localPath) ) == entry['etag']
+
+
+    def LocalDigest( self, localPath, kind, Compute ) :
+        """ Auxiliary method:  digest of a local file, remembered in the manifest.
+
+        Returns the result of Compute(), a digest of the given kind
+        (such as 'md5'), unless the manifest has one recorded for the
+        file as it is now.
+
+        """
+
+        if self.syncManifest :
+            return self.syncManifest.Digest( localPath, kind, Compute )
+        return Compute()
+
+
+    @ExceptionWrapper
+    def pack( self,args ) :
+        """ Uploads the files of a local folder packed into a few archives.
+
+        This is the pack command, which takes the form
+
+            pack [--size SIZE] localDir [remoteDir]
+
+        where SIZE is the size of the archives (such as 256MB).  See
+        packTree.
+
+        Arguments:
+            args (list):  as above
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        packSize = DEFAULT_PACK_SIZE
+        if args[:1] == ['--size'] and len(args) > 1 :
+            try :
+                packSize = ParseSize( args[1] )
+            except ValueError :
+                raise bftp_ex.FTPInvalidCommand
+            args = args[2:]
+        if len(args) not in (1,2) or packSize <= 0 :
+            raise bftp_ex.FTPInvalidCommand
+        return self.packTree( *args, packSize=packSize )
+
+
+    @ExceptionWrapper
+    def packTree( self,localDir,remoteDir=None,packSize=DEFAULT_PACK_SIZE,
+                  extraArgs=None,maxWorkers=None ) :
+        """ Uploads the files of a local folder as tar archives with an index.
+
+        Uploading many small files one request at a time is limited by
+        the latency of the requests.  Instead, the files beneath the
+        local folder are packed into tar archives of about packSize
+        bytes each, named pack-00000.tar and so forth, in the remote
+        folder (by default, the folder of the same name as localDir in
+        the remote working directory).  The archives are built as they
+        are uploaded (see AuxPutStreamInCloud), nothing being staged on
+        disk, by up to maxWorkers threads (default: the maxWorkers
+        attribute).  Then an index of where each file lies in the
+        archives (see PackIndex) is uploaded as PACK_INDEX, so that
+        unpackTree can fetch any of them with ranged requests.  If any
+        archive fails, no index is uploaded and the archives that were
+        uploaded are deleted, so that the command can simply be run
+        again.  The remote folder must not already hold a packed
+        folder.  Probably does not need to be overridden by subclasses.
+
+        Arguments:
+            localDir (str):    local folder to be packed
+            remoteDir (str):   remote folder to hold the archives
+            packSize (int):    size of the archives in bytes
+            extraArgs (dict):  may be used by subclasses
+            maxWorkers (int):  number of concurrent uploads
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPNoSuchDirError
+            FTPObjectAlreadyExistsError
+
+        """
+
+        localRoot = os.path.join( self.localWorkingDir, localDir )
+        if not os.path.isdir( localRoot ) :
+            raise bftp_ex.FTPNoSuchDirError
+        if remoteDir is None :
+            remoteDir = os.path.basename( os.path.abspath(localRoot) )
+        remoteRoot = self.AbsolutePath(remoteDir) if remoteDir else self.remoteWorkingDir
+        def RemotePath( name ) :
+            return remoteRoot + '/' + name if remoteRoot else name
+        if ( remoteRoot and self.ObjectType(remoteRoot) == OBJ_FILE ) or \
+           self.ObjectType( RemotePath(PACK_INDEX) ) != OBJ_NONE :
+            raise bftp_ex.FTPObjectAlreadyExistsError
+
+        index = PackIndex()
+        report = TransferReport('packed')
+        def PutArchive( item ) :
+            (number,group) = item
+            layout = Layout( group )
+            Unwrapped( self.AuxPutStreamInCloud )( ChunkReader( ArchiveChunks(layout) ),
+                                                   RemotePath( ARCHIVE_NAME % number ), extraArgs )
+            index.Add( number, layout )
+            report.AddSuccess( sum( member[4] for member in layout ), count=len(layout) )
+
+        RunParallel( PutArchive, enumerate( Groups( WalkFiles(localRoot), packSize ) ),
+                     maxWorkers or self.maxWorkers, report=report,
+                     nameOf=lambda item : ARCHIVE_NAME % item[0], countItems=False )
+        if report.failures :
+            uploaded = sorted( set( value[0] for value in index.members.values() ) )
+            deleted = Unwrapped( self.AuxDeleteManyFromCloud )( ( RemotePath( ARCHIVE_NAME % number )
+                                                                  for number in uploaded ),
+                                                                maxWorkers or self.maxWorkers, TransferReport() )
+            report.failures.extend( deleted.failures )
+            (report.files,report.nbytes) = ( 0, 0 )
+            return report.Finish()
+        Unwrapped( self.AuxPutBytesInCloud )( memoryview( index.Encode() ), RemotePath(PACK_INDEX), extraArgs )
+        return report.Finish()
+
+
+    @ExceptionWrapper
+    def unpack( self,args ) :
+        """ Downloads files from a packed folder.
+
+        This is the unpack command, which takes the form
+
+            unpack remoteDir [pattern ...]
+
+        See unpackTree.
+
+        Arguments:
+            args (list):  as above
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            raise bftp_ex.FTPInvalidCommand
+        return self.unpackTree( args[0], args[1:] or None )
+
+
+    @ExceptionWrapper
+    def unpackTree( self,remoteDir,patterns=None,extraArgs=None,maxWorkers=None ) :
+        """ Downloads files from a folder uploaded by packTree.
+
+        The index of the packed folder is read, and the files whose
+        names (relative to the packed folder) match any of the patterns
+        (by default, all files) are written beneath a local folder of
+        the same name as remoteDir in the local working directory,
+        with their original modification times.  Files lying close
+        together in an archive are fetched with a single ranged request
+        (see PackIndex.Ranges and AuxIterRangeFromCloud), so fetching a
+        whole packed folder costs about one request per archive, and
+        fetching one file a single request.  Each file is written as
+        its bytes arrive, so that no file or range is held in memory
+        whole.  The requests are made by up to maxWorkers threads
+        (default: the maxWorkers attribute).  Probably does not need
+        to be overridden by subclasses.
+
+        Arguments:
+            remoteDir (str):   packed remote folder
+            patterns (list):   file name patterns, or None for all files
+            extraArgs (dict):  may be used by subclasses
+            maxWorkers (int):  number of concurrent downloads
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPNoSuchFileError:  remoteDir holds no index
+
+        """
+
+        remoteRoot = self.AbsolutePath(remoteDir)
+        def RemotePath( name ) :
+            return remoteRoot + '/' + name if remoteRoot else name
+        if self.ObjectType( RemotePath(PACK_INDEX) ) != OBJ_FILE :
+            raise bftp_ex.FTPNoSuchFileError
+        index = PackIndex.Decode( Unwrapped( self.AuxGetBytesFromCloud )( RemotePath(PACK_INDEX), extraArgs ) )
+        localRoot = os.path.join( self.localWorkingDir, os.path.basename(remoteRoot) )
+
+        report = TransferReport('unpacked')
+        def Names() :
+            for name in index.Match( patterns ) :
+                try :
+                    LocalPathFor( localRoot, name )
+                except bftp_ex.FTPInvalidCloudLocation as e :
+                    report.AddFailure( name, e )
+                else :
+                    yield name
+
+        def GetRange( run ) :
+            (number,start,end,members) = run
+            chunks = Unwrapped( self.AuxIterRangeFromCloud )( RemotePath( ARCHIVE_NAME % number ),
+                                                              start, end-start, extraArgs ) if end > start else ()
+            (current,fp) = ( None, None )
+            def Finish() :
+                fp.close()
+                os.utime( fp.name, (current[3],current[3]) )
+                report.AddSuccess( current[2] )
+            try :
+                for (member,piece) in MemberPieces( chunks, start, members ) :
+                    if member is not current :
+                        if fp :
+                            Finish()
+                        localPath = LocalPathFor( localRoot, member[0] )
+                        os.makedirs( os.path.dirname(localPath), exist_ok=True )
+                        (current,fp) = ( member, open( localPath, 'wb' ) )
+                    fp.write( piece )
+                if fp :
+                    Finish()
+            finally :
+                if fp and not fp.closed :
+                    fp.close()
+                if hasattr( chunks, 'close' ) :
+                    chunks.close()
+
+        RunParallel( GetRange, index.Ranges( Names() ), maxWorkers or self.maxWorkers, report=report,
+                     nameOf=lambda run : '%s bytes %d-%d' % ( ARCHIVE_NAME % run[0], run[1], run[2] ),
+                     countItems=False )
+        return report.Finish()
+
+
+    def CpuCall( self, func, *args ) :
+        """ Auxiliary method:  run a CPU-bound stage of a transfer.
+
+        With a CPU pool (see the cpu command), func(*args) runs in one
+        of its worker processes, and must therefore be a module-level
+        function taking and returning picklable values.  Paths given
+        to it should be absolute, as the workers keep the working
+        directory they started in.  Otherwise it runs in the calling
+        thread.
+
+        Returns the result of func.
+
+        """
+
+        if self.cpuPool :
+            return self.cpuPool.Run( func, *args )
+        return func( *args )
+
+
+    @abstractmethod
+    def IsDir(self,loc) :
+        """ Auxiliary method:  check if specified cloud location is directory.
+
+        Subclasses must override and implement this method.
+        This method assumes loc is a valid cloud location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function below.
+
+        Returns a boolean.
+
+        """
+
+        pass 
+
+
+    @abstractmethod
+    def IsFile(self,loc) :
+        """ Auxiliary method:  check if specified location is a file
+
+        Subclasses must override and implement this method.
+        This method assumes loc is a valid cloud location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns a boolean.
+
+        """
+
+        pass
+
+
+    def ObjectType(self,loc) :
+        """ Auxiliary method:  classify a cloud location.
+
+        Tells whether loc is a file, a directory or does not exist,
+        so that commands such as get, delete and mkdir need only a
+        single lookup.  This default implementation combines IsFile
+        and IsDir.  Subclasses should override it when their cloud
+        provider can answer the question more cheaply.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns OBJ_FILE, OBJ_DIR or OBJ_NONE.
+
+        """
+
+        if self.IsFile(loc) :
+            return OBJ_FILE
+        elif self.IsDir(loc) :
+            return OBJ_DIR
+        else :
+            return OBJ_NONE
+
+
+    @ExceptionWrapper
+    def DirEmpty(self,loc) :
+        """ Auxiliary method:  check if specified directory is empty.
+
+        Subclasses must override and implement this method.        
+        This method assumes loc is a valid cloud location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns a boolean.
+
+        """
+
+        pass
+
+
+    @abstractmethod
+    def AbsolutePath(self,f) :
+        """ Auxiliary method:  transform relative cloud path to absolute path.
 
         Subclasses should override and implement this method.
         What constitutes an absolute path may depend on the cloud
@@ -600,6 +2241,196 @@ class BaseFtpClient :
         self.localWorkingDir = os.getcwd()
 
 
+    @ExceptionWrapper
+    def parallel( self, args ) :
+        """ Set or show the number of concurrent transfers.
+
+        With one argument, sets the maxWorkers attribute used by the
+        batch commands (mget, mput and mdelete).  With no arguments,
+        returns the current setting.
+
+        Arguments:
+            args (list):  empty, or a single positive integer
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            return 'parallel ' + str(self.maxWorkers)
+        try :
+            maxWorkers = int(args[0])
+        except ValueError :
+            raise bftp_ex.FTPInvalidCommand
+        if len(args) != 1 or maxWorkers < 1 :
+            raise bftp_ex.FTPInvalidCommand
+        self.maxWorkers = maxWorkers
+
+
+    @ExceptionWrapper
+    def cpu( self, args ) :
+        """ Set or show the number of worker processes for hashing.
+
+        With a positive number, hashing done by sync --checksum, and
+        any other stage a subclass runs with CpuCall (such as the S3
+        client's compression), runs in that many worker processes (see
+        CpuPool) while the threads set by the parallel command do the
+        transfers, so that several cores are used.  With 0 or off,
+        these stages run in the transfer threads themselves.  With no
+        arguments, returns the current setting.
+
+        Arguments:
+            args (list):  empty, a number of processes, or off
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            return str(self.cpuPool) if self.cpuPool else 'cpu off'
+        if len(args) != 1 :
+            raise bftp_ex.FTPInvalidCommand
+        try :
+            maxWorkers = 0 if args[0] == 'off' else int(args[0])
+        except ValueError :
+            raise bftp_ex.FTPInvalidCommand
+        if maxWorkers < 0 :
+            raise bftp_ex.FTPInvalidCommand
+        if self.cpuPool :
+            self.cpuPool.Close()
+        self.cpuPool = CpuPool( maxWorkers ) if maxWorkers else None
+
+
+    @ExceptionWrapper
+    def manifest( self, args ) :
+        """ Turn the sync manifest on or off, or show or clear it.
+
+        The manifest is an SQLite database (see the Manifest class)
+        that sync uses to avoid hashing and comparing files that have
+        not changed since they were last synchronized.
+
+        Arguments:
+            args (list):  empty, on (optionally followed by the path of
+                          the database), off, or clear
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            return str(self.syncManifest) if self.syncManifest else 'manifest off'
+        elif args[0] == 'on' and len(args) <= 2 :
+            if self.syncManifest :
+                self.syncManifest.Close()
+            self.syncManifest = Manifest( args[1] if len(args) == 2 else None )
+        elif args == ['off'] :
+            if self.syncManifest :
+                self.syncManifest.Close()
+            self.syncManifest = None
+        elif args == ['clear'] and self.syncManifest :
+            self.syncManifest.Clear()
+        else :
+            raise bftp_ex.FTPInvalidCommand
+
+
+    @ExceptionWrapper
+    def journal( self, args ) :
+        """ Turn the transfer journal on or off, or show it.
+
+        The journal is an SQLite database (see the TransferJournal
+        class) recording unfinished batch commands and large transfers,
+        which the resume command finishes.
+
+        Arguments:
+            args (list):  empty, on (optionally followed by the path of
+                          the database), or off
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            return str(self.transferJournal) if self.transferJournal else 'journal off'
+        elif args[0] == 'on' and len(args) <= 2 :
+            if self.transferJournal :
+                self.transferJournal.Close()
+            self.transferJournal = TransferJournal( args[1] if len(args) == 2 else None )
+        elif args == ['off'] :
+            if self.transferJournal :
+                self.transferJournal.Close()
+            self.transferJournal = None
+        else :
+            raise bftp_ex.FTPInvalidCommand
+
+
+    @ExceptionWrapper
+    def resume( self ) :
+        """ Finish the transfers recorded in the journal for the current location.
+
+        Batch commands are run again, in their original working
+        directories, skipping the items they had completed; then any
+        other recorded uploads and downloads are retried with
+        AuxPutInCloud and AuxGetFromCloud, which subclasses implement
+        so as to continue where the transfer stopped.  A batch command
+        that fails is recorded in the report and kept in the journal
+        for the next resume, unless the error is one of
+        PERMANENT_RESUME_ERRORS (such as a missing local folder).  The
+        working directories are restored afterwards.
+
+        Returns a TransferReport.
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        journal = self.transferJournal
+        if journal is None :
+            raise bftp_ex.FTPInvalidCommand
+        location = self.cloudStorageLocation
+        report = TransferReport('resumed')
+        (savedLocal,savedRemote) = (self.localWorkingDir,self.remoteWorkingDir)
+        try :
+            for batch in journal.Batches(location) :
+                try :
+                    os.chdir( batch['localDir'] )
+                    (self.localWorkingDir,self.remoteWorkingDir) = (batch['localDir'],batch['remoteDir'])
+                    self.resumingBatch = batch['batchId']
+                    result = Unwrapped( getattr( self, batch['command'] ) )( *batch['args'] )
+                    if self.resumingBatch is not None :
+                        # the command finished without reaching its items
+                        journal.EndBatch( batch['batchId'] )
+                except Exception as e :
+                    report.AddFailure( batch['command'], e )
+                    if isinstance( e, PERMANENT_RESUME_ERRORS ) :
+                        journal.EndBatch( batch['batchId'] )
+                    continue
+                finally :
+                    self.resumingBatch = None
+                if result :
+                    report.AddReport( result )
+            for (key,localPath,extraArgs) in journal.Uploads(location) :
+                try :
+                    Unwrapped( self.AuxPutInCloud )( localPath, key, extraArgs )
+                    report.AddSuccess( os.path.getsize(localPath) )
+                except Exception as e :
+                    report.AddFailure( key, e )
+            for (key,localPath,extraArgs) in journal.Downloads(location) :
+                try :
+                    Unwrapped( self.AuxGetFromCloud )( key, localPath, extraArgs )
+                    report.AddSuccess( os.path.getsize(localPath) )
+                except Exception as e :
+                    report.AddFailure( key, e )
+        finally :
+            os.chdir( savedLocal )
+            (self.localWorkingDir,self.remoteWorkingDir) = (savedLocal,savedRemote)
+        return report.Finish()
+
+
     @ExceptionWrapper
     def bye(self) :
         """ Quit. """
@@ -618,13 +2449,33 @@ class BaseFtpClient :
     # Methods for command line processing.
     ###################################################################
 
-    @ExceptionWrapper
-    def CommandLine(self) :
-        """ Provide interactive command-line ftp interface.
+    def CloudCommands(self) :
+        """ Auxiliary method:  extra commands offered by a subclass.
 
-        Provides interactive ftp command-line processing from standard
-        input and invokes the appropriate instance method corresponding
-        to the parsed command.
+        Returns a dictionary mapping command names to methods, which
+        CommandLine adds to its commands taking a list of arguments.
+        These commands configure the client and may be used before a
+        connection is opened.  Subclasses may override this to expose
+        cloud provider-specific settings.
+
+        """
+
+        return {}
+
+
+    def ParseCommand( self, line ) :
+        """ Auxiliary method:  find the method that carries out a command.
+
+        Arguments:
+            line (list):  words of the command, as typed
+
+        Returns (method, args, needsLocation), where method(*args)
+        carries out the command and needsLocation tells whether it
+        requires an open cloud storage location.
+
+        Raises:
+            FTPInvalidCommand
+            FTPInvalidCloudLocation:  wrong number of arguments
 
         """
 
@@ -632,8 +2483,9 @@ class BaseFtpClient :
             'bye'     : self.bye,
             'quit'    : self.bye,
             'close'   : self.close,
-            'ls'      : self.ls,
-            'pwd'     : self.pwd
+            'ls'      : self.PrintLs,
+            'pwd'     : self.pwd,
+            'resume'  : self.resume
         }
 
         ftpCmdFctLookupOneArg = {
@@ -644,38 +2496,494 @@ class BaseFtpClient :
             'lcd'     : self.lcd,
             'mkdir'   : self.mkdir,
             'put'     : self.put,
-            'rmdir'   : self.rmdir
+            'rmdir'   : self.rmdir,
+            'rmtree'  : self.rmtree
+        }
+
+        ftpCmdFctLookupRecursive = {
+            'get'     : self.getTree,
+            'put'     : self.putTree,
+            'rmdir'   : self.rmtree
         }
 
         ftpCmdFctLookupMultipleArgs = {
             'mget'    : self.mget,
             'mput'    : self.mput,
-            'mdelete' : self.mdelete
+            'mdelete' : self.mdelete,
+            'parallel': self.parallel,
+            'cpu'     : self.cpu,
+            'sync'    : self.sync,
+            'manifest': self.manifest,
+            'journal' : self.journal,
+            'pack'    : self.pack,
+            'unpack'  : self.unpack
         }
 
-        notNeedValidCloudLocation = ( 'open', 'bye', 'quit', 'close', 'lcd' )
+        ftpCmdFctLookupMultipleArgs.update( self.CloudCommands() )
+
+        notNeedValidCloudLocation = ( 'open', 'bye', 'quit', 'close', 'lcd', 'parallel', 'cpu',
+                                      'manifest', 'journal' ) + \
+                                    tuple( self.CloudCommands() )
+
+        needsLocation = not line[0] in notNeedValidCloudLocation
+        if ftpCmdFctLookupNoArgs.get( line[0] ) != None :
+            return ( ftpCmdFctLookupNoArgs[ line[0] ], (), needsLocation )
+        elif ftpCmdFctLookupRecursive.get( line[0] ) != None and \
+             len(line) == 3 and line[1] == '-r' :
+            return ( ftpCmdFctLookupRecursive[ line[0] ], (line[2],), needsLocation )
+        elif line[0] == 'get' and len(line) == 4 and line[1] == '--range' :
+            return ( self.GetRangeToFile, (line[3],line[2]), needsLocation )
+        elif line[0] == 'get' and len(line) == 3 and line[2] == '-' :
+            return ( self.GetToStdout, (line[1],), needsLocation )
+        elif line[0] == 'put' and len(line) == 3 and line[1] == '-' :
+            return ( self.PutFromStdin, (line[2],), needsLocation )
+        elif ftpCmdFctLookupOneArg.get( line[0] ) != None :
+            if len(line) == 2 :
+                return ( ftpCmdFctLookupOneArg[ line[0] ], (line[1],), needsLocation )
+            else :
+                raise bftp_ex.FTPInvalidCloudLocation
+        elif ftpCmdFctLookupMultipleArgs.get( line[0] ) != None :
+            return ( ftpCmdFctLookupMultipleArgs[ line[0] ], (line[1:],), needsLocation )
+        else :
+            raise bftp_ex.FTPInvalidCommand
+
+
+    @ExceptionWrapper
+    def GetToStdout( self, fileName ) :
+        """ Auxiliary method:  write a cloud file to standard output (get file -)."""
+
+        sys.stdout.flush()
+        Unwrapped( self.get_stream )( fileName, sys.stdout.buffer )
+        sys.stdout.buffer.flush()
+
+
+    @ExceptionWrapper
+    def PutFromStdin( self, fileName ) :
+        """ Auxiliary method:  upload standard input to a cloud file (put - file)."""
+
+        Unwrapped( self.put_stream )( sys.stdin.buffer, fileName )
+
+
+    @ExceptionWrapper
+    def CommandLine(self) :
+        """ Provide interactive command-line ftp interface.
+
+        Provides interactive ftp command-line processing from standard
+        input and invokes the appropriate instance method corresponding
+        to the parsed command.  A - in place of the local file name of
+        get or put stands for standard output or standard input.  Quits
+        at the end of the input.
+
+        """
 
         while True :
-            line = sys.stdin.readline().split()
+            # read through the binary buffer, so that put - sees
+            # exactly the bytes after its command line
+            line = sys.stdin.buffer.readline()
+            if not line :
+                self.bye()
+            line = line.decode().split()
             if not line :
                 continue
-            if self.cloudStorageLocation==None and \
-               not line[0] in notNeedValidCloudLocation :
+            (method,args,needsLocation) = self.ParseCommand( line )
+            if self.cloudStorageLocation==None and needsLocation :
                 raise bftp_ex.FTPInvalidCloudLocation
-            if ftpCmdFctLookupNoArgs.get( line[0] ) != None :
-                rVal = ftpCmdFctLookupNoArgs[ line[0] ]()
-            elif ftpCmdFctLookupOneArg.get( line[0] ) != None :
-                if len(line) == 2 :
-                    rVal = ftpCmdFctLookupOneArg[ line[0] ](line[1])
-                else :
-                    raise bftp_ex.FTPInvalidCloudLocation
-            elif ftpCmdFctLookupMultipleArgs.get( line[0] ) != None :
-                rVal = ftpCmdFctLookupMultipleArgs[ line[0] ](line[1:])
-            else :
-                raise bftp_ex.FTPInvalidCommand
+            rVal = method( *args )
             if rVal :
                 print( rVal )
-            
 
 
+    def RunScript( self, script, maxWorkers=1 ) :
+        """ Run a script of commands non-interactively.
+
+        The script holds commands as typed at CommandLine, one per line
+        or separated by semicolons, with comments starting at #.  The
+        whole script is parsed before anything runs, so a mistyped
+        command is reported without side effects.  Commands then run
+        in order, without the exception handling decorators of the
+        methods behind them, so that every error is seen here.  As in
+        sftp batch files, the script stops after the first command that
+        fails unless that command is prefixed with -.  A batch command
+        that leaves files untransferred counts as failed.
+
+        With maxWorkers above one, runs of consecutive transfer commands
+        in the same direction (see CONCURRENT_COMMANDS) are run up to
+        maxWorkers at a time, so they should not overlap.  Any other
+        command waits for those before it and runs on its own.  The
+        outcome and elapsed time of each command are printed to
+        standard error at the end.
+
+        Arguments:
+            script (str):      commands to run
+            maxWorkers (int):  commands run at a time
+
+        Returns an exit status:  0 if every command succeeded, 1 if a
+        command failed, or 2 if the script is invalid.
+
+        """
+
+        started = time.time()
+        commands = []
+        for (number,line,ignoreErrors) in ScriptLines( script ) :
+            try :
+                (method,args,needsLocation) = self.ParseCommand( line )
+            except ( bftp_ex.FTPInvalidCommand, bftp_ex.FTPInvalidCloudLocation ) as e :
+                PrintError( 'line %d: %s' % (number,' '.join(line)), e )
+                return 2
+            commands.append( { 'line':number, 'text':' '.join(line), 'method':method, 'args':args,
+                               'needsLocation':needsLocation, 'ignoreErrors':ignoreErrors,
+                               'direction':None if '-' in line else CONCURRENT_COMMANDS.get(
+                                               line[1] if line[0]=='sync' and len(line) > 1 else line[0] ),
+                               'status':'skipped', 'seconds':0.0 } )
+
+        def Run( command ) :
+            start = time.time()
+            try :
+                if self.cloudStorageLocation==None and command['needsLocation'] :
+                    raise bftp_ex.FTPInvalidCloudLocation
+                rVal = Unwrapped( command['method'] )( *command['args'] )
+                if rVal :
+                    print( rVal )
+                command['status'] = 'failed' if getattr( rVal, 'failures', None ) else 'ok'
+            except SystemExit :
+                command['status'] = 'quit'
+            except Exception as e :
+                PrintError( 'line %d: %s' % (command['line'],command['text']), e )
+                command['status'] = 'failed'
+            if command['status'] == 'failed' and command['ignoreErrors'] :
+                command['status'] = 'ignored'
+            command['seconds'] = time.time() - start
+
+        pending = []
+        for command in commands + [None] :
+            if command and command['direction'] and maxWorkers > 1 and \
+               ( not pending or pending[0]['direction'] == command['direction'] ) :
+                pending.append( command )
+                continue
+            RunParallel( Run, pending, min(maxWorkers,len(pending)), countItems=False )
+            pending = []
+            if any( c['status'] in ('failed','quit') for c in commands ) :
+                break
+            if command and command['direction'] and maxWorkers > 1 :
+                pending.append( command )
+            elif command :
+                Run( command )
+
+        for command in commands :
+            sys.stderr.write( '%9.3fs  %-7s  line %d: %s\n' % ( command['seconds'], command['status'],
+                                                              command['line'], command['text'] ) )
+        sys.stderr.write( '%9.3fs  total\n' % ( time.time() - started ) )
+        return 1 if any( c['status'] == 'failed' for c in commands ) else 0
+
+
+
+
+###################################################################
+# Helpers
+###################################################################
+
+def WalkFiles( root ) :
+    """ Generates the files beneath a local folder.
+
+    Walks the folder with os.scandir, without following symbolic
+    links to folders.  Yields (relName, path, stat) tuples, where
+    relName is relative to root and uses / separators.
+
+    """
+
+    stack = [ ('',root) ]
+    while stack :
+        (relDir,localDir) = stack.pop()
+        with os.scandir( localDir ) as it :
+            for e in it :
+                relName = relDir + '/' + e.name if relDir else e.name
+                if e.is_dir( follow_symlinks=False ) :
+                    stack.append( (relName,e.path) )
+                elif e.is_file() :
+                    yield ( relName, e.path, e.stat() )
+
+
+def ScriptLines( script ) :
+    """ Generates the commands of a script (see BaseFtpClient.RunScript).
+
+    Yields (number, line, ignoreErrors) tuples, where number is the
+    line of the script the command is on, line the words of the
+    command and ignoreErrors whether it was prefixed with -.
+
+    """
+
+    for (number,text) in enumerate( script.splitlines(), 1 ) :
+        for command in text.split('#')[0].split(';') :
+            line = command.split()
+            ignoreErrors = bool(line) and line[0].startswith('-')
+            if ignoreErrors :
+                line = ( [line[0][1:]] if line[0][1:] else [] ) + line[1:]
+            if line :
+                yield ( number, line, ignoreErrors )
+
+
+def LocalPathFor( localRoot, relName ) :
+    """ Returns the local path of a cloud file, given its name relative to a folder.
+
+    Cloud names come from listings or indexes written by others, so a
+    name that is absolute or has .. components, and so could lead
+    outside localRoot, is refused.
+
+    Raises:
+        FTPInvalidCloudLocation
+
+    """
+
+    parts = relName.split('/')
+    if relName.startswith('/') or '..' in parts or \
+       ( os.sep != '/' and any( os.sep in part for part in parts ) ) :
+        raise bftp_ex.FTPInvalidCloudLocation
+    return os.path.join( localRoot, *parts )
+
+
+def ParseByteRange( value ) :
+    """ Converts a range such as 0-1023, 1GB- or -64MB to (offset, length).
+
+    START-END (inclusive) gives (START, END-START+1), START- gives
+    (START, None) and -COUNT the last COUNT bytes, as (-COUNT, None).
+    Positions may be given as sizes (see ParseSize).
+
+    Raises:
+        ValueError
+
+    """
+
+    (first,dash,last) = value.partition('-')
+    if not dash or not ( first or last ) :
+        raise ValueError( value )
+    if not first :
+        count = ParseSize( last )
+        if count <= 0 :
+            raise ValueError( value )
+        return ( -count, None )
+    start = ParseSize( first )
+    if not last :
+        return ( start, None )
+    end = ParseSize( last )
+    if end < start :
+        raise ValueError( value )
+    return ( start, end-start+1 )
+
+
+def ClampRange( offset, length, size ) :
+    """ Returns the (start, end) positions of a range within a file of size bytes.
+
+    offset and length are as given by ParseByteRange; a negative
+    offset counts from the end of the file.  end is exclusive, and
+    neither position lies past the end of the file.
+
+    """
+
+    start = max( 0, size+offset ) if offset < 0 else min( offset, size )
+    end = size if length is None else min( size, start+length )
+    return ( start, end )
+
+
+def FileMD5( path, start=0, length=None ) :
+    """ Returns the hexadecimal MD5 digest of a file, or of part of it."""
+
+    md5 = hashlib.md5()
+    with open( path, 'rb' ) as fp :
+        fp.seek( start )
+        remaining = length
+        while remaining is None or remaining > 0 :
+            chunk = fp.read( 1024*1024 if remaining is None else min(remaining,1024*1024) )
+            if not chunk :
+                break
+            md5.update( chunk )
+            if remaining is not None :
+                remaining -= len(chunk)
+    return md5.hexdigest()
+
+
+def CopyStream( src, dst, chunkSize=1024*1024 ) :
+    """ Copies binary stream src to dst in chunks.  Returns the number of bytes copied."""
+
+    nbytes = 0
+    while True :
+        chunk = src.read( chunkSize )
+        if not chunk :
+            return nbytes
+        dst.write( chunk )
+        nbytes += len(chunk)
+
+
+def ReadFully( stream, size ) :
+    """ Reads size bytes from a binary stream, or fewer at its end.
+
+    Unlike a single read of a pipe, which may return fewer bytes than
+    asked for, this only returns a short result at the end of the stream.
+
+    """
+
+    chunks = []
+    while size > 0 :
+        chunk = stream.read( size )
+        if not chunk :
+            break
+        chunks.append( chunk )
+        size -= len(chunk)
+    return b''.join( chunks )
+
+
+def ReadInto( stream, view ) :
+    """ Fills a memoryview from a binary stream.
+
+    Uses the readinto method of the stream where it has one, so the
+    content is not copied on the way.  Returns the number of bytes
+    read, which is less than the size of view only at the end of the
+    stream.
+
+    """
+
+    readinto = getattr( stream, 'readinto', None )
+    nbytes = 0
+    while nbytes < len(view) :
+        if readinto :
+            count = readinto( view[nbytes:] )
+        else :
+            chunk = stream.read( min( len(view)-nbytes, 1024*1024 ) )
+            count = len(chunk)
+            view[nbytes:nbytes+count] = chunk
+        if not count :
+            break
+        nbytes += count
+    return nbytes
+
+
+
+
+class BufferReader( io.RawIOBase ) :
+    """ Read-only binary file over a bytes-like object.
+
+    The object is not copied:  readinto copies straight from it and
+    read copies only the bytes asked for.  The file can be rewound,
+    so request bodies made from it can be retried.
+
+    """
+
+    def __init__( self, buffer ) :
+
+        super().__init__()
+        self.view = memoryview(buffer).cast('B')
+        self.pos = 0
+
+    def readable( self ) :
+        return True
+
+    def seekable( self ) :
+        return True
+
+    def tell( self ) :
+        return self.pos
+
+    def seek( self, offset, whence=io.SEEK_SET ) :
+        base = { io.SEEK_SET:0, io.SEEK_CUR:self.pos, io.SEEK_END:len(self.view) }[whence]
+        self.pos = max( 0, base + offset )
+        return self.pos
+
+    def readinto( self, b ) :
+        chunk = self.view[ self.pos:self.pos+len(b) ]
+        memoryview(b).cast('B')[ :len(chunk) ] = chunk
+        self.pos += len(chunk)
+        return len(chunk)
+
+    def read( self, size=-1 ) :
+        end = len(self.view) if size is None or size < 0 else self.pos + size
+        chunk = self.view[ self.pos:end ].tobytes()
+        self.pos += len(chunk)
+        return chunk
+
+
+
+
+class ChunkReader( io.RawIOBase ) :
+    """ Read-only binary stream over an iterable of byte strings.
+
+    The chunks are drawn from the iterable as they are read, so a
+    generator (compressing a file block by block, or producing an
+    archive file by file) can feed an upload.
+
+    """
+
+    def __init__( self, chunks ) :
+
+        super().__init__()
+        self.chunks = iter( chunks )
+        self.pending = b''
+
+    def readable( self ) :
+        return True
+
+    def read( self, size=-1 ) :
+        if size is None or size < 0 :
+            return self.pending + b''.join( self.chunks )
+        while not self.pending :
+            self.pending = next( self.chunks, None )
+            if self.pending is None :
+                self.pending = b''
+                return b''
+        (chunk,self.pending) = ( self.pending[:size], self.pending[size:] )
+        return chunk
+
+    def readinto( self, b ) :
+        chunk = self.read( len(b) )
+        memoryview(b).cast('B')[ :len(chunk) ] = chunk
+        return len(chunk)
+
+
+
+
+class BufferWriter( io.RawIOBase ) :
+    """ Write-only binary file filling a writable memoryview.
+
+    Writing past the end of the view raises FTPBufferTooSmallError.
+    Its tell method gives the number of bytes written.
+
+    """
+
+    def __init__( self, view ) :
+
+        super().__init__()
+        self.view = view
+        self.pos = 0
+
+    def writable( self ) :
+        return True
+
+    def tell( self ) :
+        return self.pos
+
+    def write( self, b ) :
+        b = memoryview(b).cast('B')
+        if self.pos + len(b) > len(self.view) :
+            raise bftp_ex.FTPBufferTooSmallError
+        self.view[ self.pos:self.pos+len(b) ] = b
+        self.pos += len(b)
+        return len(b)
+
+
+def Unwrapped( method ) :
+    """ Returns a bound method without its exception handling decorators.
+
+    The decorators print errors and return None; the undecorated
+    method raises them, for callers that need to know a command failed.
+
+    """
+
+    return types.MethodType( inspect.unwrap(method.__func__), method.__self__ )
+
+
+def PrintError( context, e ) :
+    """ Reports exception e, raised by what context describes, on standard error."""
 
+    sys.stderr.write( context + ':  ' )
+    if hasattr( e, 'errorLog' ) :
+        e.errorLog()
+    else :
+        sys.stderr.write( '%s: %s\n' % ( type(e).__name__, e ) )
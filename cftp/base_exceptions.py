@@ -67,3 +67,14 @@ class FTPDirNotEmptyError(Exception) :
     def errorLog(self):
         sys.stderr.write( 'Error:  Directory is not empty.\n' )
 
+class FTPBufferTooSmallError(Exception) :
+    """A cloud file does not fit in the buffer it is to be read into."""
+
+    def errorLog(self):
+        sys.stderr.write( 'Error:  File is larger than the buffer.\n' )
+
+class FTPTruncatedContentError(FTPError) :
+    """Compressed content ended part way through a gzip member or zstd frame."""
+
+    def errorLog(self):
+        sys.stderr.write( 'Error:  Compressed content is truncated.\n' )
@@ -0,0 +1,438 @@
+#!/usr/local/bin/python3
+import sys, os, json, time, shutil, tempfile, argparse, platform, subprocess, resource
+from collections import OrderedDict
+from cftp.parallel import FormatSize
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# Offline benchmarks for the cftp transfer and listing paths.
+#
+# Run "python -m cftp.bench --help" for usage.  Each scenario runs in
+# a child process, so that its peak RSS is not inflated by earlier
+# scenarios.  The s3 backend runs S3FtpClient against moto's in-process
+# S3 mock (pip install moto); the local backend runs LocalFtpClient
+# against a temporary directory, optionally with injected latency.
+
+
+# Bucket created in the moto mock
+BENCH_BUCKET = 'cftp-bench'
+
+# Launches of the s3ftp entry point timed by each startup scenario
+# (multiplied by --scale)
+STARTUP_RUNS = 10
+
+
+
+
+###################################################################
+# Setting up clients
+###################################################################
+
+def OpenClient( backend, root, latency ) :
+    """ Returns an opened client for the backend, plus a request counter.
+
+    The counter is a function returning the number of requests issued
+    by the client so far.
+
+    """
+
+    if backend == 'local' :
+        import cftp.local
+        ftp = cftp.local.LocalFtpClient( latency=latency )
+        ftp.open( root )
+        return ( ftp, lambda : ftp.requests )
+
+    import boto3
+    import cftp.s3
+    boto3.client('s3').create_bucket( Bucket=BENCH_BUCKET )
+    ftp = cftp.s3.S3FtpClient( cacheTtl=0 )
+    ftp.open( BENCH_BUCKET )
+    calls = [0]
+    def CountCall( **kwargs ) :
+        calls[0] += 1
+    ftp.s3Client.meta.events.register( 'before-call.s3', CountCall )
+    return ( ftp, lambda : calls[0] )
+
+
+def MockS3() :
+    """ Returns a context manager that mocks S3 in-process using moto."""
+
+    try :
+        from moto import mock_aws
+    except ImportError :
+        try :
+            from moto import mock_s3 as mock_aws
+        except ImportError :
+            sys.stderr.write( 'The s3 backend needs moto (pip install moto).\n' )
+            sys.exit(2)
+    for var in ( 'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SECURITY_TOKEN', 'AWS_SESSION_TOKEN' ) :
+        os.environ.setdefault( var, 'testing' )
+    os.environ.setdefault( 'AWS_DEFAULT_REGION', 'us-east-1' )
+    return mock_aws()
+
+
+def MakeFiles( directory, count, size ) :
+    """ Creates count files of size bytes in directory.  Returns their names."""
+
+    os.makedirs( directory, exist_ok=True )
+    data = os.urandom( min(size,1024*1024) )
+    names = []
+    for i in range(count) :
+        name = 'f%07d.dat' % i
+        with open( os.path.join(directory,name), 'wb' ) as fp :
+            remaining = size
+            while remaining > 0 :
+                fp.write( data[:remaining] )
+                remaining -= len(data)
+        names.append( name )
+    return names
+
+
+def Populate( ftp, folder, localDir, count, size, maxWorkers ) :
+    """ Uploads count files of size bytes to folder (not measured)."""
+
+    MakeFiles( localDir, count, size )
+    ftp.lcd( localDir )
+    ftp.cd( '/' )
+    ftp.mkdir( folder )
+    ftp.cd( folder )
+    ftp.mput( ['*'], maxWorkers=maxWorkers )
+    ftp.lcd( '..' )
+    shutil.rmtree( localDir )
+    os.makedirs( localDir )
+    ftp.lcd( localDir )
+
+
+
+
+###################################################################
+# Scenarios
+###################################################################
+#
+# Each scenario has a setup function and a run function, both taking
+# the client and a context dictionary (scale, workDir, maxWorkers).
+# Only the run function is timed; it returns the number of bytes moved.
+
+def ScaledCount( ctx, n ) :
+    return max( 1, int(n * ctx['scale']) )
+
+
+def SetupListing( n ) :
+    def Setup( ftp, ctx ) :
+        Populate( ftp, 'listing', ctx['workDir'] + '/up', ScaledCount(ctx,n), 16, ctx['setupWorkers'] )
+    return Setup
+
+
+def RunLs( ftp, ctx ) :
+    count = 0
+    for name in ftp.iter_ls() :
+        count += 1
+    ctx['items'] = count
+    return 0
+
+
+def SetupSmallPut( ftp, ctx ) :
+    ctx['localDir'] = ctx['workDir'] + '/up'
+    MakeFiles( ctx['localDir'], ScaledCount(ctx,2000), 4096 )
+    ftp.lcd( ctx['localDir'] )
+    ftp.mkdir( 'small' )
+    ftp.cd( 'small' )
+
+
+def RunMput( ftp, ctx ) :
+    report = ftp.mput( ['*'], maxWorkers=ctx['maxWorkers'] )
+    ctx['items'] = report.files
+    ctx['errors'] = len(report.failures)
+    return report.nbytes
+
+
+def SetupSmallGet( ftp, ctx ) :
+    Populate( ftp, 'small', ctx['workDir'] + '/down', ScaledCount(ctx,2000), 4096, ctx['setupWorkers'] )
+
+
+def RunMget( ftp, ctx ) :
+    report = ftp.mget( ['*'], maxWorkers=ctx['maxWorkers'] )
+    ctx['items'] = report.files
+    ctx['errors'] = len(report.failures)
+    return report.nbytes
+
+
+def SetupDelete( ftp, ctx ) :
+    Populate( ftp, 'delete', ctx['workDir'] + '/up', ScaledCount(ctx,10000), 16, ctx['setupWorkers'] )
+
+
+def RunMdelete( ftp, ctx ) :
+    report = ftp.mdelete( ['*'], maxWorkers=ctx['maxWorkers'] )
+    ctx['items'] = report.files
+    ctx['errors'] = len(report.failures)
+    return 0
+
+
+def SetupLargePut( ftp, ctx ) :
+    ctx['localDir'] = ctx['workDir'] + '/up'
+    MakeFiles( ctx['localDir'], 1, ScaledCount(ctx,256*1024*1024) )
+    ftp.lcd( ctx['localDir'] )
+
+
+def SetupMappedPut( ftp, ctx ) :
+    SetupLargePut( ftp, ctx )
+    if hasattr( ftp, 'SetS3TransferConfig' ) :
+        ftp.SetS3TransferConfig( { 'mmap_upload':True } )
+
+
+def RunPut( ftp, ctx ) :
+    ftp.put( 'f0000000.dat' )
+    ctx['items'] = 1
+    return os.path.getsize( 'f0000000.dat' )
+
+
+def SetupLargeGet( ftp, ctx ) :
+    Populate( ftp, 'large', ctx['workDir'] + '/down', 1, ScaledCount(ctx,256*1024*1024), 1 )
+
+
+def RunGet( ftp, ctx ) :
+    ftp.get( 'f0000000.dat' )
+    ctx['items'] = 1
+    return os.path.getsize( 'f0000000.dat' )
+
+
+# Startup scenarios time cold launches of the s3ftp entry point with
+# these arguments, rather than commands of an opened client
+STARTUP_SCENARIOS = OrderedDict( [
+    ( 'start-help',   [ '--help' ] ),
+    ( 'start-local',  [ '-c', 'lcd .; bye' ] ),
+    ( 'start-import', None ),
+] )
+
+
+SCENARIOS = OrderedDict( [
+    ( 'ls-10k',       ( SetupListing(10000),  RunLs ) ),
+    ( 'ls-100k',      ( SetupListing(100000), RunLs ) ),
+    ( 'mput-small',   ( SetupSmallPut,        RunMput ) ),
+    ( 'mget-small',   ( SetupSmallGet,        RunMget ) ),
+    ( 'mdelete-10k',  ( SetupDelete,          RunMdelete ) ),
+    ( 'put-large',    ( SetupLargePut,        RunPut ) ),
+    ( 'put-mmap',     ( SetupMappedPut,       RunPut ) ),
+    ( 'get-large',    ( SetupLargeGet,        RunGet ) ),
+] )
+
+
+
+
+###################################################################
+# Running scenarios
+###################################################################
+
+def PeakRssKb() :
+    """ Returns the peak resident set size of this process, in KB."""
+
+    return RssKb( resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss )
+
+
+def RssKb( maxrss ) :
+    """ Converts an ru_maxrss value (bytes on macOS, KB elsewhere) to KB."""
+
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def LaunchTimed( cmd ) :
+    """ Runs cmd, discarding its output.
+
+    The child is reaped with os.wait4, which gives the resource usage
+    of that child alone; RUSAGE_CHILDREN would give the peak over every
+    child reaped so far, including those of earlier scenarios.
+
+    Returns (seconds, exit code, peak RSS in KB).
+
+    """
+
+    start = time.perf_counter()
+    proc = subprocess.Popen( cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=ChildEnv() )
+    (pid,status,usage) = os.wait4( proc.pid, 0 )
+    seconds = time.perf_counter() - start
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    return ( seconds, proc.returncode, RssKb( usage.ru_maxrss ) )
+
+
+def RunScenario( name, backend, scale, maxWorkers, latency ) :
+    """ Runs one scenario in this process.  Returns a result dictionary."""
+
+    (setup,run) = SCENARIOS[name]
+    workDir = tempfile.mkdtemp( prefix='cftp-bench-' )
+    root = workDir + '/root'
+    os.makedirs( root )
+    ctx = { 'scale':scale, 'workDir':workDir, 'maxWorkers':maxWorkers,
+            'setupWorkers':max(maxWorkers,8), 'items':0, 'errors':0 }
+    savedDir = os.getcwd()
+    try :
+        mock = MockS3() if backend == 's3' else None
+        if mock :
+            mock.start()
+        try :
+            (ftp,Requests) = OpenClient( backend, root, 0.0 )
+            setup( ftp, ctx )
+            if backend == 'local' :
+                ftp.latency = latency
+            setupRssKb = PeakRssKb()
+            requestsBefore = Requests()
+            start = time.perf_counter()
+            nbytes = run( ftp, ctx )
+            seconds = time.perf_counter() - start
+            requests = Requests() - requestsBefore
+        finally :
+            if mock :
+                mock.stop()
+    finally :
+        os.chdir( savedDir )
+        shutil.rmtree( workDir, ignore_errors=True )
+    return OrderedDict( [ ('scenario',name), ('items',ctx['items']), ('errors',ctx['errors']),
+                          ('requests',requests), ('seconds',round(seconds,4)), ('bytes',nbytes),
+                          ('bytes_per_s',round(nbytes/seconds,1) if seconds > 0 else 0.0),
+                          ('setup_rss_kb',setupRssKb), ('peak_rss_kb',PeakRssKb()) ] )
+
+
+def RunStartup( name, scale ) :
+    """ Times cold launches of the s3ftp entry point.  Returns a result dictionary.
+
+    Each launch is a fresh interpreter, so imports are not shared
+    between them.  The start-import scenario instead imports cftp.s3
+    and boto3, which is what opening a bucket costs on top of the
+    others.  The time reported is the median per launch, and the peak
+    RSS the largest of any one launch.
+
+    """
+
+    if STARTUP_SCENARIOS[name] is None :
+        cmd = [ sys.executable, '-c', 'import cftp.s3; cftp.s3.ImportBoto3()' ]
+    else :
+        cmd = [ sys.executable, '-c', 'import sys; from cftp.__main__ import main; main(sys.argv[1:])' ] + \
+              STARTUP_SCENARIOS[name]
+    times = []
+    (errors,peak) = ( 0, 0 )
+    for i in range( max(1,int(STARTUP_RUNS*scale)) ) :
+        (seconds,code,rssKb) = LaunchTimed( cmd )
+        times.append( seconds )
+        errors += code != 0
+        peak = max( peak, rssKb )
+    if errors == len(times) :
+        return OrderedDict( [ ('scenario',name), ('failed',True) ] )
+    times.sort()
+    return OrderedDict( [ ('scenario',name), ('items',len(times)), ('errors',errors), ('requests',0),
+                          ('seconds',round(times[len(times)//2],4)), ('bytes',0), ('bytes_per_s',0.0),
+                          ('setup_rss_kb',0), ('peak_rss_kb',peak) ] )
+
+
+def RunInChild( name, args ) :
+    """ Runs one scenario in a fresh interpreter.  Returns a result dictionary."""
+
+    cmd = [ sys.executable, '-m', 'cftp.bench', '--child', name, '--backend', args.backend,
+            '--scale', str(args.scale), '--parallel', str(args.parallel),
+            '--latency', str(args.latency) ]
+    proc = subprocess.run( cmd, stdout=subprocess.PIPE, universal_newlines=True, env=ChildEnv() )
+    if proc.returncode != 0 :
+        return OrderedDict( [ ('scenario',name), ('failed',True) ] )
+    return json.loads( proc.stdout.strip().splitlines()[-1], object_pairs_hook=OrderedDict )
+
+
+def ChildEnv() :
+    """ Returns the environment for child interpreters.
+
+    PYTHONPATH is extended with the folder holding this copy of cftp,
+    so children import the same code from any working directory.
+
+    """
+
+    env = dict( os.environ )
+    top = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+    env['PYTHONPATH'] = os.pathsep.join( [top] + [ p for p in [env.get('PYTHONPATH')] if p ] )
+    return env
+
+
+def PackageVersion() :
+    """ Returns the installed cftp version, if known."""
+
+    try :
+        from importlib.metadata import version
+        return version( 'cftp' )
+    except Exception :
+        return 'unknown'
+
+
+def PrintTable( results, baseline=None ) :
+    """ Prints results, with the time relative to a baseline run if given."""
+
+    old = { r['scenario']:r for r in (baseline or {}).get('results',[]) }
+    print( '%-13s %9s %9s %10s %12s %11s%s' % ( 'scenario', 'items', 'requests', 'seconds',
+                                                'throughput', 'peak RSS', '   vs baseline' if old else '' ) )
+    for r in results :
+        if r.get('failed') :
+            print( '%-13s FAILED' % r['scenario'] )
+            continue
+        line = '%-13s %9d %9d %10.3f %10s/s %11s' % ( r['scenario'], r['items'], r['requests'], r['seconds'],
+                                                   FormatSize(r['bytes_per_s']), FormatSize(r['peak_rss_kb']*1024) )
+        prev = old.get( r['scenario'] )
+        if prev and not prev.get('failed') and prev['seconds'] > 0 :
+            line += '   %6.2fx time, %+d requests' % ( r['seconds']/prev['seconds'], r['requests']-prev['requests'] )
+        print( line )
+
+
+
+
+###################################################################
+# Command line
+###################################################################
+
+def main( args=None ) :
+    """Runs the benchmark scenarios and reports the results."""
+
+    parser = argparse.ArgumentParser( prog='python -m cftp.bench',
+                                      description='Offline benchmarks for cftp listing and transfer paths.' )
+    parser.add_argument( 'scenarios', nargs='*', metavar='scenario',
+                         help='scenarios to run (default: all): ' + ', '.join(list(SCENARIOS)+list(STARTUP_SCENARIOS)) )
+    parser.add_argument( '--backend', choices=('s3','local'), default='s3',
+                         help='s3 (moto mock, the default) or local (LocalFtpClient)' )
+    parser.add_argument( '--scale', type=float, default=1.0,
+                         help='multiply file counts and sizes by this factor' )
+    parser.add_argument( '--parallel', type=int, default=8,
+                         help='worker threads for batch commands (default 8)' )
+    parser.add_argument( '--latency', type=float, default=0.0,
+                         help='seconds added per request (local backend only)' )
+    parser.add_argument( '--json', metavar='FILE', help='also write results to FILE' )
+    parser.add_argument( '--compare', metavar='FILE', help='compare with results saved by --json' )
+    parser.add_argument( '--child', help=argparse.SUPPRESS )
+    args = parser.parse_args( args )
+
+    if args.child :
+        result = RunScenario( args.child, args.backend, args.scale, args.parallel, args.latency )
+        print( json.dumps(result) )
+        return 0
+
+    unknown = [ name for name in args.scenarios if name not in SCENARIOS and name not in STARTUP_SCENARIOS ]
+    if unknown :
+        parser.error( 'unknown scenario(s): ' + ', '.join(unknown) )
+    results = [ RunStartup(name,args.scale) if name in STARTUP_SCENARIOS else RunInChild(name,args)
+                for name in (args.scenarios or list(SCENARIOS)+list(STARTUP_SCENARIOS)) ]
+
+    baseline = None
+    if args.compare :
+        with open( args.compare ) as fp :
+            baseline = json.load( fp )
+    PrintTable( results, baseline )
+
+    if args.json :
+        report = OrderedDict( [ ('cftp_version',PackageVersion()), ('python',platform.python_version()),
+                                ('backend',args.backend), ('scale',args.scale), ('parallel',args.parallel),
+                                ('latency',args.latency), ('time',time.strftime('%Y-%m-%dT%H:%M:%S')),
+                                ('results',results) ] )
+        with open( args.json, 'w' ) as fp :
+            json.dump( report, fp, indent=2 )
+    return 1 if any( r.get('failed') for r in results ) else 0
+
+
+
+if __name__ == '__main__' :
+    sys.exit( main() )
@@ -0,0 +1,336 @@
+#!/usr/local/bin/python3
+import time, threading, posixpath
+from collections import OrderedDict
+from cftp.base import OBJ_NONE, OBJ_FILE, OBJ_DIR
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+
+
+# Returned by MetadataCache lookups when nothing (fresh) is cached
+MISS = object()
+
+
+
+
+###################################################################
+# Cache of cloud object metadata
+###################################################################
+
+class MetadataCache :
+    """In-process cache of object types and directory listings.
+
+    Two kinds of information are kept, both keyed by absolute cloud
+    path (as returned by AbsolutePath):  the type of a location
+    (OBJ_FILE, OBJ_DIR or OBJ_NONE) and the listing of a directory
+    (a dictionary mapping the name and type of each entry to its
+    IterDir entry, as S3 may hold a file and a folder of the same
+    name).  A cached listing also answers type lookups for everything
+    inside that directory, a file taking precedence over a folder of
+    the same name.  Items expire ttl seconds after being stored, and the
+    least recently used items are evicted beyond maxEntries.  Listings
+    with more than maxListing entries are not cached.  A ttl of 0
+    disables the cache.
+
+    Clients keep the cache coherent with their own changes by calling
+    Created and Removed after writing to the cloud, rather than
+    discarding everything.  Changes made by other clients become
+    visible when the affected items expire.
+
+    A listing may take long enough to read for the client to change
+    the directory meanwhile (mdelete deletes what it has listed so
+    far, for one).  Each change therefore counts as a new generation
+    of the directories it may affect:  a client takes the Generation
+    of a directory before listing it, and passes it to PutListing,
+    which stores nothing if the directory has changed since.
+
+    Attributes:
+        ttl (float)       :  seconds an item stays valid
+        maxEntries (int)  :  number of items kept
+        maxListing (int)  :  largest listing kept
+        hits (int)        :  lookups answered from the cache
+        misses (int)      :  lookups not answered from the cache
+
+    """
+
+    def __init__( self, ttl=30.0, maxEntries=10000, maxListing=10000 ) :
+        """ Create an empty cache."""
+
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.maxListing = maxListing
+        self.hits = 0
+        self.misses = 0
+        self.items = OrderedDict()
+        self.epoch = 0
+        self.listGenerations = {}
+        self.treeGenerations = {}
+        self.lock = threading.RLock()
+
+
+    ###################################################################
+    # Lookups
+    ###################################################################
+
+    def GetType( self, path ) :
+        """ Returns the cached type of path, or MISS."""
+
+        with self.lock :
+            objType = self.Get( ('type',path) )
+            if objType is MISS and path :
+                listing = self.Get( ('list',ParentOf(path)) )
+                if listing is not MISS :
+                    objType = ListedType( listing, posixpath.basename(path) )
+            self.Count( objType )
+            return objType
+
+
+    def GetListing( self, path ) :
+        """ Returns copies of the cached entries of directory path, or MISS."""
+
+        with self.lock :
+            listing = self.Get( ('list',path) )
+            self.Count( listing )
+            if listing is MISS :
+                return MISS
+            return [ dict(entry) for entry in listing.values() ]
+
+
+    def Generation( self, path ) :
+        """ Returns a token that changes whenever the listing of directory path may have.
+
+        The listing changes with anything created or removed beneath
+        path, and with the removal of path or of one of its parents.
+
+        """
+
+        with self.lock :
+            treeGenerations = []
+            parent = path
+            while True :
+                treeGenerations.append( self.treeGenerations.get( parent, 0 ) )
+                if not parent :
+                    break
+                parent = ParentOf(parent)
+            return ( self.epoch, self.listGenerations.get( path, 0 ), tuple(treeGenerations) )
+
+
+    def PutType( self, path, objType, generation=None ) :
+        """ Remember the type of path, unless generation (of path) is given and outdated."""
+
+        with self.lock :
+            if generation is None or generation == self.Generation( path ) :
+                self.Set( ('type',path), objType )
+
+
+    def PutListing( self, path, entries, generation=None ) :
+        """ Remember the entries of directory path, if there are not too many.
+
+        If generation is given, as returned by Generation before the
+        entries were read, nothing is stored if path has changed since.
+
+        """
+
+        if len(entries) <= self.maxListing :
+            with self.lock :
+                if generation is not None and generation != self.Generation( path ) :
+                    return
+                self.Set( ('list',path), OrderedDict( ( (entry['name'],entry['type']), dict(entry) )
+                                                      for entry in entries ) )
+                self.Set( ('type',path), OBJ_DIR )
+
+
+    ###################################################################
+    # Invalidation
+    ###################################################################
+
+    def Created( self, path, entry ) :
+        """ Record that the client has just created (or overwritten) path.
+
+        The entry (as generated by IterDir) replaces any cached entry
+        for path in its parent's listing.  Parent directories that
+        were cached as missing, or absent from their own parent's
+        listing, are recorded as directories.
+
+        """
+
+        with self.lock :
+            self.Changed( path )
+            self.Set( ('type',path), entry['type'] )
+            if entry['type'] == OBJ_DIR and self.Get( ('list',path) ) is MISS :
+                self.Set( ('list',path), OrderedDict() )
+            (child,childEntry) = (path,entry)
+            while child :
+                parent = ParentOf(child)
+                listing = self.Get( ('list',parent) )
+                if listing is not MISS :
+                    name = posixpath.basename(child)
+                    key = ( name, childEntry['type'] )
+                    if child==path or key not in listing :
+                        listing[key] = dict( childEntry, name=name )
+                if parent and self.Get( ('type',parent) ) is OBJ_NONE :
+                    self.Set( ('type',parent), OBJ_DIR )
+                childEntry = { 'key':parent, 'type':OBJ_DIR, 'size':0, 'etag':None, 'mtime':None }
+                child = parent
+
+
+    def Removed( self, path, objType=None ) :
+        """ Record that the client has just deleted path (a file or empty directory).
+
+        The path is removed from its parent's listing:  only as a file
+        or as a directory if objType says which was deleted, and
+        otherwise as both.  The parent may have been an implied
+        directory (one without a marker object) that disappears along
+        with its last entry, and so may its own parents.  Going up from
+        the parent, each directory that may have disappeared has its
+        type and listing forgotten, and so does the listing of its own
+        parent, which may still show it.  This stops at the first
+        parent whose listing shows other entries, as that directory
+        certainly still exists.
+
+        """
+
+        with self.lock :
+            self.Changed( path, tree=objType != OBJ_FILE )
+            self.Set( ('type',path), OBJ_NONE )
+            if objType != OBJ_FILE :
+                self.Drop( ('list',path) )
+            child = path
+            while child :
+                parent = ParentOf(child)
+                name = posixpath.basename(child)
+                listing = self.Get( ('list',parent) )
+                if listing is not MISS :
+                    if child == path :
+                        for removedType in ( (objType,) if objType else (OBJ_FILE,OBJ_DIR) ) :
+                            listing.pop( (name,removedType), None )
+                        if ListedType( listing, name ) is not OBJ_NONE :
+                            self.Set( ('type',path), ListedType( listing, name ) )
+                        if listing :
+                            return
+                    else :
+                        self.Drop( ('list',parent) )
+                        if any( key != (name,OBJ_DIR) for key in listing ) :
+                            return
+                if parent :
+                    self.Drop( ('type',parent) )
+                    self.Drop( ('list',parent) )
+                child = parent
+
+
+    def RemovedTree( self, path ) :
+        """ Record that the client has just deleted path and everything beneath it."""
+
+        with self.lock :
+            self.Changed( path, tree=True )
+            prefix = path + '/'
+            for key in [ key for key in self.items if key[1].startswith(prefix) ] :
+                del self.items[key]
+            self.Removed( path, OBJ_DIR )
+
+
+    def Forget( self, path ) :
+        """ Drop everything cached about path and its parent's listing."""
+
+        with self.lock :
+            self.Changed( path, tree=True )
+            self.Drop( ('type',path) )
+            self.Drop( ('list',path) )
+            self.Drop( ('list',ParentOf(path)) )
+
+
+    def Clear( self ) :
+        """ Drop everything."""
+
+        with self.lock :
+            self.items.clear()
+            self.listGenerations.clear()
+            self.treeGenerations.clear()
+            self.epoch += 1
+
+
+    def __str__( self ) :
+
+        return 'cache: %d item(s), ttl %g s, %d hit(s), %d miss(es)' % \
+               ( len(self.items), self.ttl, self.hits, self.misses )
+
+
+    ###################################################################
+    # Helpers (call with the lock held)
+    ###################################################################
+
+    def Get( self, key ) :
+        """ Returns the fresh value stored under key, or MISS."""
+
+        item = self.items.get( key )
+        if item is None :
+            return MISS
+        (expires,value) = item
+        if expires < time.monotonic() :
+            del self.items[key]
+            return MISS
+        self.items.move_to_end( key )
+        return value
+
+
+    def Set( self, key, value ) :
+        """ Store value under key, evicting the least recently used items."""
+
+        if self.ttl <= 0 :
+            return
+        self.items[key] = ( time.monotonic() + self.ttl, value )
+        self.items.move_to_end( key )
+        while len(self.items) > self.maxEntries :
+            self.items.popitem( last=False )
+
+
+    def Changed( self, path, tree=False ) :
+        """ Start a new generation of every directory a change to path may affect.
+
+        These are the parents of path, whose listings may show it (or
+        a parent implied by it), and, with tree (path may have been a
+        directory), path and everything beneath it.
+
+        """
+
+        if tree :
+            self.treeGenerations[path] = self.treeGenerations.get( path, 0 ) + 1
+        parent = path
+        while parent :
+            parent = ParentOf(parent)
+            self.listGenerations[parent] = self.listGenerations.get( parent, 0 ) + 1
+
+
+    def Drop( self, key ) :
+        """ Remove key, if present."""
+
+        self.items.pop( key, None )
+
+
+    def Count( self, value ) :
+        """ Update the hit and miss counters."""
+
+        if value is MISS :
+            self.misses += 1
+        else :
+            self.hits += 1
+
+
+
+
+def ListedType( listing, name ) :
+    """ Returns the type a cached listing gives the entry called name."""
+
+    if (name,OBJ_FILE) in listing :
+        return OBJ_FILE
+    return OBJ_DIR if (name,OBJ_DIR) in listing else OBJ_NONE
+
+
+def ParentOf( path ) :
+    """ Returns the parent of an absolute cloud path ('' for the root)."""
+
+    return posixpath.dirname( path )
@@ -0,0 +1,122 @@
+#!/usr/local/bin/python3
+import zlib
+import cftp.base_exceptions as bftp_ex
+
+try :
+    import zstandard
+    # older releases cannot tell where a frame ends (see Decompressor)
+    if not hasattr( zstandard.ZstdDecompressor().decompressobj(), 'eof' ) :
+        zstandard = None
+except ImportError :
+    zstandard = None
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# Content codings supported, as named in the Content-Encoding header
+CODECS = ( 'gzip', 'zstd' )
+
+# Files are compressed in independent blocks of this many bytes
+COMPRESS_BLOCK_SIZE = 8 * 1024 * 1024
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+
+
+###################################################################
+# Compression of files in blocks
+###################################################################
+
+def CheckCodec( codec ) :
+    """ Check that a codec is known and, for zstd, that zstandard is installed.
+
+    A zstandard release whose decompression objects lack the eof
+    attribute counts as not installed.
+
+    Raises:
+        ValueError
+
+    """
+
+    if codec not in CODECS or ( codec == 'zstd' and zstandard is None ) :
+        raise ValueError( codec )
+
+
+def CompressBlock( path, offset, length, codec ) :
+    """ Returns part of a file, compressed as a complete gzip member or zstd frame.
+
+    The members of consecutive blocks, concatenated, are a valid
+    compressed file whose content is the whole file.  As blocks are
+    independent, they can be compressed in separate processes (this
+    is a module-level function so that it can run in a CpuPool).
+
+    """
+
+    with open( path, 'rb' ) as fp :
+        fp.seek( offset )
+        data = fp.read( length )
+    if codec == 'zstd' :
+        return zstandard.ZstdCompressor( level=ZSTD_LEVEL ).compress( data )
+    compressor = zlib.compressobj( GZIP_LEVEL, zlib.DEFLATED, 31 )
+    return compressor.compress( data ) + compressor.flush()
+
+
+
+
+###################################################################
+# Decompression of streamed content
+###################################################################
+
+class Decompressor :
+    """ Decompresses content arriving in chunks.
+
+    The content may hold several gzip members or zstd frames one after
+    the other, as written by CompressBlock, and is decompressed as the
+    concatenation of their contents.
+
+    """
+
+    def __init__( self, codec ) :
+        """ Create a decompressor for a codec (see CheckCodec)."""
+
+        CheckCodec( codec )
+        self.codec = codec
+        self.obj = self.NewObj()
+        self.started = False
+
+
+    def NewObj( self ) :
+
+        if self.codec == 'zstd' :
+            return zstandard.ZstdDecompressor().decompressobj()
+        return zlib.decompressobj( 31 )
+
+
+    def decompress( self, data ) :
+        """ Returns the content decompressed from the next chunk of data."""
+
+        out = []
+        while data :
+            self.started = True
+            out.append( self.obj.decompress( data ) )
+            if not self.obj.eof :
+                break
+            (data,self.obj,self.started) = ( self.obj.unused_data, self.NewObj(), False )
+        return b''.join( out )
+
+
+    def finish( self ) :
+        """ Check that the content did not end part way through a member.
+
+        Raises:
+            FTPTruncatedContentError
+
+        """
+
+        if self.started :
+            raise bftp_ex.FTPTruncatedContentError( 'truncated %s content' % self.codec )
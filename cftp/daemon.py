@@ -0,0 +1,260 @@
+#!/usr/local/bin/python3
+import sys, os, io, json, socket, socketserver, threading, contextlib, tempfile
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# This module only imports the standard library at load time, so that
+# the thin client (Forward) starts quickly.  The server side imports
+# the rest of cftp when it starts.
+
+
+
+
+###################################################################
+# Daemon holding warm client sessions
+###################################################################
+
+class Daemon( socketserver.ThreadingMixIn, socketserver.UnixStreamServer ) :
+    """Long-lived server running command scripts in warm sessions.
+
+    Listens on a Unix domain socket for requests from Forward, each a
+    line of JSON with the cloud location to use, a script of commands
+    (see BaseFtpClient.RunScript), the number of commands to run at a
+    time and the local working directory of the requesting process.
+    The script runs in a session for that location, opened the first
+    time it is asked for and kept for later requests along with its
+    connection pool, metadata cache and transfer settings, so that
+    only the first request pays for opening it.  Every request starts
+    in the remote folder the location names and in the requester's
+    local working directory.  Other settings a script changes (such
+    as compress, tconfig, parallel, journal, manifest, cpu or cache)
+    belong to the session, and so persist for later requests for the
+    same location.
+
+    Output of the script is sent back as lines of JSON, each holding
+    the stream (out or err) and the text written, followed by a last
+    line holding the exit status.  Requests are run one at a time,
+    as standard output and the working directory belong to the whole
+    process.
+
+    Attributes:
+        Factory (callable):  makes a new, unopened client
+        sessions (dict)   :  cloud location to (client, remote folder)
+
+    """
+
+    daemon_threads = True
+
+    def __init__( self, path, Factory ) :
+        """ Listen at path (readable and writable by the owner only)."""
+
+        self.Factory = Factory
+        self.sessions = {}
+        self.lock = threading.Lock()
+        oldMask = os.umask( 0o077 )
+        try :
+            super().__init__( path, RequestHandler )
+        finally :
+            os.umask( oldMask )
+
+
+    def Run( self, request, out, err ) :
+        """ Run the script of a request, writing its output to out and err.
+
+        Scripts using standard input or output (put - and get -) are
+        refused, as those of the daemon are not the requester's, and
+        so are scripts using open or close, which would change the
+        location of the session for later requests.
+
+        Returns the exit status.
+
+        """
+
+        from cftp.base import Unwrapped, PrintError, ScriptLines
+        import cftp.base_exceptions as bftp_ex
+
+        with self.lock, contextlib.redirect_stdout( out ), contextlib.redirect_stderr( err ) :
+            location = request.get( 'location' )
+            if location not in self.sessions :
+                client = self.Factory()
+                if location :
+                    try :
+                        Unwrapped( client.open )( location )
+                    except Exception as e :
+                        PrintError( 'open ' + location, e )
+                        return 1
+                self.sessions[ location ] = ( client, client.remoteWorkingDir )
+            (client,remoteDir) = self.sessions[ location ]
+            for (number,line,ignoreErrors) in ScriptLines( request['script'] ) :
+                try :
+                    (method,args,needsLocation) = client.ParseCommand( line )
+                except ( bftp_ex.FTPInvalidCommand, bftp_ex.FTPInvalidCloudLocation ) :
+                    continue
+                if method in ( client.GetToStdout, client.PutFromStdin ) :
+                    reason = 'standard input and output are not available through the daemon'
+                elif method in ( client.open, client.close ) :
+                    reason = 'the daemon keeps one session per location; pass the location instead'
+                else :
+                    continue
+                sys.stderr.write( 'line %d: %s:  %s\n' % (number,' '.join(line),reason) )
+                return 2
+            client.remoteWorkingDir = remoteDir
+            try :
+                Unwrapped( client.lcd )( request['cwd'] )
+            except OSError as e :
+                PrintError( 'lcd ' + request['cwd'], e )
+                return 1
+            return client.RunScript( request['script'], request.get('jobs',1) )
+
+
+
+
+class RequestHandler( socketserver.StreamRequestHandler ) :
+    """ Reads a request from the socket, runs it and sends back its output."""
+
+    def handle( self ) :
+
+        request = json.loads( self.rfile.readline() )
+        lock = threading.Lock()
+        status = self.server.Run( request, ResponseWriter(self.wfile,'out',lock),
+                                  ResponseWriter(self.wfile,'err',lock) )
+        with lock :
+            self.wfile.write( json.dumps( {'status':status} ).encode() + b'\n' )
+
+
+
+
+class ResponseWriter( io.TextIOBase ) :
+    """ Text stream sending what is written to it as lines of JSON.
+
+    Each write becomes a line holding the name of the stream and the
+    text.  The lock is shared by the writers of one connection.
+
+    """
+
+    def __init__( self, wfile, stream, lock ) :
+
+        super().__init__()
+        (self.wfile,self.stream,self.lock) = (wfile,stream,lock)
+
+    def writable( self ) :
+        return True
+
+    def write( self, text ) :
+        if text :
+            with self.lock :
+                self.wfile.write( json.dumps( {'stream':self.stream,'data':text} ).encode() + b'\n' )
+        return len(text)
+
+
+
+
+###################################################################
+# Server and client entry points
+###################################################################
+
+def Serve( path=None, Factory=None ) :
+    """ Run a daemon at path until interrupted.
+
+    Factory makes the clients of the sessions; the default makes
+    S3FtpClient objects.  A leftover socket file at path is removed,
+    unless a daemon is still listening there.  The folder of path is
+    created readable by the owner only, and refused if it belongs to
+    another user.
+
+    No return value.
+
+    """
+
+    if path is None :
+        path = SocketPath()
+    if Factory is None :
+        import cftp.s3
+        Factory = cftp.s3.S3FtpClient
+    os.makedirs( os.path.dirname(path) or '.', mode=0o700, exist_ok=True )
+    if not OwnedByUser( os.path.dirname(path) or '.' ) :
+        sys.stderr.write( '%s belongs to another user\n' % os.path.dirname(path) )
+        sys.exit(1)
+    if os.path.exists( path ) :
+        try :
+            with socket.socket( socket.AF_UNIX ) as sock :
+                sock.connect( path )
+        except OSError :
+            os.remove( path )
+        else :
+            sys.stderr.write( 'A daemon is already listening at %s\n' % path )
+            sys.exit(1)
+    server = Daemon( path, Factory )
+    sys.stderr.write( 'Listening at %s\n' % path )
+    try :
+        server.serve_forever()
+    except KeyboardInterrupt :
+        pass
+    finally :
+        server.server_close()
+        os.remove( path )
+
+
+def Forward( script, location=None, jobs=1, path=None, out=None, err=None ) :
+    """ Run a script in the daemon listening at path.
+
+    Output of the script is written to out and err (by default,
+    standard output and standard error) as the daemon sends it.
+
+    A socket at path belonging to another user is not used, so that
+    nobody else can see or answer the script.
+
+    Returns the exit status of the script, or None if no daemon of
+    this user is listening at path.
+
+    """
+
+    if path is None :
+        path = SocketPath()
+    (out,err) = ( out or sys.stdout, err or sys.stderr )
+    try :
+        if not OwnedByUser( path ) :
+            err.write( 'Not using %s:  it belongs to another user\n' % path )
+            return None
+    except OSError :
+        return None
+    sock = socket.socket( socket.AF_UNIX )
+    try :
+        sock.connect( path )
+    except OSError :
+        sock.close()
+        return None
+    with sock, sock.makefile('rwb') as f :
+        f.write( json.dumps( { 'location':location, 'script':script, 'jobs':jobs,
+                               'cwd':os.getcwd() } ).encode() + b'\n' )
+        f.flush()
+        for line in f :
+            message = json.loads( line )
+            if 'status' in message :
+                return message['status']
+            ( out if message['stream'] == 'out' else err ).write( message['data'] )
+    err.write( 'Connection to daemon lost\n' )
+    return 1
+
+
+def SocketPath() :
+    """ Returns the default socket path.
+
+    This is cftp/s3ftp.sock in $XDG_RUNTIME_DIR if that is set, and
+    otherwise cftp-UID/s3ftp.sock in the temporary folder.
+
+    """
+
+    if os.environ.get('XDG_RUNTIME_DIR') :
+        return os.path.join( os.environ['XDG_RUNTIME_DIR'], 'cftp', 's3ftp.sock' )
+    return os.path.join( tempfile.gettempdir(), 'cftp-%d' % os.getuid(), 's3ftp.sock' )
+
+
+def OwnedByUser( path ) :
+    """ Returns whether path belongs to the user running this process."""
+
+    return os.stat( path ).st_uid == os.getuid()
@@ -0,0 +1,260 @@
+#!/usr/local/bin/python3
+import os, json, time, sqlite3, threading
+from cftp.manifest import Identity, CachePath
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    location TEXT, key TEXT, upload_id TEXT, path TEXT, dev INTEGER, ino INTEGER, size INTEGER,
+    mtime_ns INTEGER, part_size INTEGER, extra_args TEXT, started REAL,
+    PRIMARY KEY (location, key) );
+CREATE TABLE IF NOT EXISTS parts (
+    upload_id TEXT, part_number INTEGER, etag TEXT,
+    PRIMARY KEY (upload_id, part_number) );
+CREATE TABLE IF NOT EXISTS downloads (
+    location TEXT, key TEXT, path TEXT, etag TEXT, extra_args TEXT, started REAL,
+    PRIMARY KEY (location, key, path) );
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id INTEGER PRIMARY KEY, location TEXT, command TEXT, args TEXT,
+    local_dir TEXT, remote_dir TEXT, started REAL );
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id INTEGER, name TEXT,
+    PRIMARY KEY (batch_id, name) );
+'''
+
+
+
+
+###################################################################
+# Durable record of transfers in progress
+###################################################################
+
+class TransferJournal :
+    """On-disk journal of unfinished transfers, used to resume them.
+
+    Three kinds of work are recorded in an SQLite database, each
+    change being committed at once so that it survives the process
+    being killed.  Multipart uploads are recorded with their upload
+    ID, part size and the identity of the local file (see
+    manifest.Identity), along with each part as it completes.  Partial
+    downloads are recorded with the etag of the object being fetched,
+    so they can be continued if the object has not changed.  Batch
+    commands (such as mput) are recorded with their arguments and
+    working directories, along with the name of each item as it
+    completes, so they can be run again skipping those items.
+
+    Records are removed when the work completes.  Locations are
+    cloud storage locations (such as S3 bucket names).  Instances are
+    safe to use from several threads.
+
+    Attributes:
+        path (str):  database file
+
+    """
+
+    def __init__( self, path=None ) :
+        """ Open (creating if need be) the journal at path.
+
+        The default path is cftp/journal.sqlite in $XDG_CACHE_HOME,
+        or in ~/.cache if that is not set.
+
+        """
+
+        if path is None :
+            path = CachePath( 'journal.sqlite' )
+        self.path = os.path.abspath( os.path.expanduser(path) )
+        os.makedirs( os.path.dirname(self.path), exist_ok=True )
+        self.db = sqlite3.connect( self.path, check_same_thread=False )
+        self.lock = threading.Lock()
+        with self.lock :
+            self.db.execute( 'PRAGMA journal_mode=WAL' )
+            self.db.executescript( SCHEMA )
+
+
+    ###################################################################
+    # Multipart uploads
+    ###################################################################
+
+    def StartUpload( self, location, key, uploadId, path, st, partSize, extraArgs ) :
+        """ Record a multipart upload of the local file at path (with status st)."""
+
+        self.Write( 'INSERT OR REPLACE INTO uploads VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                    (location,key,uploadId,os.path.abspath(path)) + Identity(st) +
+                    (partSize,json.dumps(extraArgs),time.time()) )
+
+
+    def FindUpload( self, location, key ) :
+        """ Returns the recorded upload to location/key, or None.
+
+        The upload is a dictionary with keys uploadId, path, identity
+        (of the local file when the upload started), partSize and
+        extraArgs.
+
+        """
+
+        with self.lock :
+            row = self.db.execute( 'SELECT upload_id, path, dev, ino, size, mtime_ns, part_size, extra_args '
+                                   'FROM uploads WHERE location=? AND key=?', (location,key) ).fetchone()
+        if row is None :
+            return None
+        return { 'uploadId':row[0], 'path':row[1], 'identity':tuple(row[2:6]),
+                 'partSize':row[6], 'extraArgs':json.loads(row[7]) }
+
+
+    def PartDone( self, uploadId, partNumber, etag ) :
+        """ Record that a part of an upload has been uploaded."""
+
+        self.Write( 'INSERT OR REPLACE INTO parts VALUES (?,?,?)', (uploadId,partNumber,etag) )
+
+
+    def Parts( self, uploadId ) :
+        """ Returns a dictionary mapping the recorded part numbers of an upload to ETags."""
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT part_number, etag FROM parts WHERE upload_id=?',
+                                    (uploadId,) ).fetchall()
+        return dict( rows )
+
+
+    def EndUpload( self, location, key ) :
+        """ Forget the upload to location/key and its parts."""
+
+        with self.lock :
+            row = self.db.execute( 'SELECT upload_id FROM uploads WHERE location=? AND key=?',
+                                   (location,key) ).fetchone()
+            if row :
+                self.db.execute( 'DELETE FROM parts WHERE upload_id=?', row )
+            self.db.execute( 'DELETE FROM uploads WHERE location=? AND key=?', (location,key) )
+            self.db.commit()
+
+
+    def Uploads( self, location ) :
+        """ Returns (key, path, extraArgs) for each recorded upload to location."""
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT key, path, extra_args FROM uploads WHERE location=? '
+                                    'ORDER BY started', (location,) ).fetchall()
+        return [ (key,path,json.loads(extraArgs)) for (key,path,extraArgs) in rows ]
+
+
+    ###################################################################
+    # Partial downloads
+    ###################################################################
+
+    def StartDownload( self, location, key, path, etag, extraArgs ) :
+        """ Record a download of location/key (with etag) to the local path."""
+
+        self.Write( 'INSERT OR REPLACE INTO downloads VALUES (?,?,?,?,?,?)',
+                    (location,key,os.path.abspath(path),etag,json.dumps(extraArgs),time.time()) )
+
+
+    def FindDownload( self, location, key, path ) :
+        """ Returns the etag recorded for a download of location/key to path, or None."""
+
+        with self.lock :
+            row = self.db.execute( 'SELECT etag FROM downloads WHERE location=? AND key=? AND path=?',
+                                   (location,key,os.path.abspath(path)) ).fetchone()
+        return row[0] if row else None
+
+
+    def EndDownload( self, location, key, path ) :
+        """ Forget the download of location/key to path."""
+
+        self.Write( 'DELETE FROM downloads WHERE location=? AND key=? AND path=?',
+                    (location,key,os.path.abspath(path)) )
+
+
+    def Downloads( self, location ) :
+        """ Returns (key, path, extraArgs) for each recorded download from location."""
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT key, path, extra_args FROM downloads WHERE location=? '
+                                    'ORDER BY started', (location,) ).fetchall()
+        return [ (key,path,json.loads(extraArgs)) for (key,path,extraArgs) in rows ]
+
+
+    ###################################################################
+    # Batch commands
+    ###################################################################
+
+    def StartBatch( self, location, command, args, localDir, remoteDir ) :
+        """ Record a batch command and its arguments.  Returns its batch ID."""
+
+        with self.lock :
+            cursor = self.db.execute( 'INSERT INTO batches VALUES (NULL,?,?,?,?,?,?)',
+                                      (location,command,json.dumps(args),localDir,remoteDir,time.time()) )
+            self.db.commit()
+            return cursor.lastrowid
+
+
+    def ItemDone( self, batchId, name ) :
+        """ Record that the named item of a batch has been processed."""
+
+        self.Write( 'INSERT OR IGNORE INTO batch_items VALUES (?,?)', (batchId,name) )
+
+
+    def DoneItems( self, batchId ) :
+        """ Returns the set of names of the processed items of a batch."""
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT name FROM batch_items WHERE batch_id=?', (batchId,) ).fetchall()
+        return set( row[0] for row in rows )
+
+
+    def EndBatch( self, batchId ) :
+        """ Forget a batch and its items."""
+
+        with self.lock :
+            self.db.execute( 'DELETE FROM batch_items WHERE batch_id=?', (batchId,) )
+            self.db.execute( 'DELETE FROM batches WHERE batch_id=?', (batchId,) )
+            self.db.commit()
+
+
+    def Batches( self, location ) :
+        """ Returns the recorded batches at location, oldest first.
+
+        Each batch is a dictionary with keys batchId, command, args,
+        localDir and remoteDir.
+
+        """
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT batch_id, command, args, local_dir, remote_dir FROM batches '
+                                    'WHERE location=? ORDER BY batch_id', (location,) ).fetchall()
+        return [ { 'batchId':row[0], 'command':row[1], 'args':json.loads(row[2]),
+                   'localDir':row[3], 'remoteDir':row[4] } for row in rows ]
+
+
+    ###################################################################
+    # Maintenance
+    ###################################################################
+
+    def Close( self ) :
+        """ Close the database."""
+
+        with self.lock :
+            self.db.close()
+
+
+    def Write( self, sql, params ) :
+        """ Execute and commit a change."""
+
+        with self.lock :
+            self.db.execute( sql, params )
+            self.db.commit()
+
+
+    def __str__( self ) :
+
+        with self.lock :
+            counts = [ self.db.execute( 'SELECT count(*) FROM ' + table ).fetchone()[0]
+                       for table in ( 'uploads', 'downloads', 'batches' ) ]
+        return 'journal %s: %d upload(s), %d download(s), %d batch(es) unfinished' % \
+               ( (self.path,) + tuple(counts) )
@@ -0,0 +1,518 @@
+#!/usr/local/bin/python3
+import sys, os, shutil, time, threading, datetime, filecmp
+from cftp.base import BaseFtpClient,ExceptionWrapper,OBJ_NONE,OBJ_FILE,OBJ_DIR,CopyStream,ReadInto
+import cftp.base_exceptions as bftp_ex
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# Size of the chunks copied at a time when bandwidth is limited
+COPY_CHUNK_SIZE = 256 * 1024
+
+# Number of entries returned per simulated listing request
+LIST_PAGE_SIZE = 1000
+
+# Suffix of the file a stream is written to before it replaces its target
+PARTIAL_SUFFIX = '.cftp-part'
+
+
+
+
+###################################################################
+# Local Ftp Client class definition
+###################################################################
+
+class LocalFtpClient(BaseFtpClient) :
+    """Emulates basic ftp client functionality on a local directory tree.
+
+    This class implements the BaseFtpClient abstract class using a
+    directory on the local file system as the "cloud".  It is meant
+    for testing and benchmarking the command paths of BaseFtpClient
+    (mget, mput, mdelete and so forth) without network access.
+
+    The open method takes the path of an existing local directory,
+    which becomes the cloudStorageLocation (stored as an absolute path).
+    As in S3FtpClient, remoteWorkingDir is a path relative to that root,
+    with no trailing forward slash, and the root is represented by the
+    empty string.  Paths may not refer to anything outside the root.
+
+    Every operation that would be a request to a cloud provider is
+    counted in the requests attribute and can be slowed down by a fixed
+    latency.  Transfers (of files, streams, buffers and ranges alike)
+    can additionally be limited to a bandwidth, in bytes per second, to
+    approximate a remote link.
+
+    Attributes:
+        latency (float)   :  seconds added to every simulated request
+        bandwidth (int)   :  bytes per second per transfer, or None
+        requests (int)    :  number of simulated requests so far
+
+    """
+
+    ###################################################################
+    # Initialization
+    ###################################################################
+
+    def __init__( self, isInteractive=False, latency=0.0, bandwidth=None ) :
+        """ Create a local ftp client."""
+
+        super().__init__( isInteractive )
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.requestLock = threading.Lock()
+
+
+
+    ###################################################################
+    # Methods for interacting with the local "cloud"
+    ###################################################################
+
+
+    @ExceptionWrapper
+    def open( self, loc ) :
+        """Uses the local directory loc as the cloud storage location.
+
+        Attributes:
+            loc (str):  local directory to serve as the root
+
+        No return value.
+
+        Raises:
+            FTPInvalidCloudLocation
+
+        """
+
+        root = os.path.abspath( os.path.expanduser(loc) )
+        if not os.path.isdir( root ) :
+            raise bftp_ex.FTPInvalidCloudLocation
+        self.cloudStorageLocation = root
+        self.remoteWorkingDir = ''
+
+
+    def AuxDeleteFromCloud( self, remotePath ) :
+        """ Delete a file from the local root.
+
+        Arguments:
+            remotePath (str):  path to file to be deleted
+
+        No return value.
+
+        """
+
+        self.Request()
+        os.remove( self.RealPath(remotePath) )
+
+
+    def AuxGetFromCloud( self, remotePath, localPath, extraArgs ) :
+        """Copies a file from the local root.
+
+        Arguments:
+            remotePath (str):  file to be gotten
+            localPath (str) :  where to put it
+            extraArgs (dict):  ignored
+
+        No return value.
+
+        """
+
+        self.Request()
+        self.Copy( self.RealPath(remotePath), localPath )
+
+
+    def AuxGetStreamFromCloud( self, remotePath, stream, extraArgs ) :
+        """Copies a file from the local root to a binary stream.
+
+        Returns the number of bytes written.
+
+        """
+
+        self.Request()
+        with open( self.RealPath(remotePath), 'rb' ) as fp :
+            return self.CopyThrottled( fp, stream )
+
+
+    def AuxGetBytesFromCloud( self, remotePath, extraArgs ) :
+        """Reads a file in the local root into memory.
+
+        Returns a bytearray.
+
+        """
+
+        self.Request()
+        start = time.time()
+        with open( self.RealPath(remotePath), 'rb', buffering=0 ) as fp :
+            buffer = bytearray( os.fstat(fp.fileno()).st_size )
+            self.Throttle( start, ReadInto( fp, memoryview(buffer) ) )
+        return buffer
+
+
+    def AuxGetRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """Reads part of a file in the local root into memory.
+
+        Returns a bytearray.
+
+        """
+
+        self.Request()
+        started = time.time()
+        with open( self.RealPath(remotePath), 'rb', buffering=0 ) as fp :
+            size = os.fstat(fp.fileno()).st_size
+            start = max( 0, size+offset ) if offset < 0 else min( offset, size )
+            fp.seek( start )
+            buffer = bytearray( size-start if length is None else min( length, size-start ) )
+            self.Throttle( started, ReadInto( fp, memoryview(buffer) ) )
+        return buffer
+
+
+    def AuxIterRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """Reads part of a file in the local root in COPY_CHUNK_SIZE chunks."""
+
+        self.Request()
+        (start,nbytes) = ( time.time(), 0 )
+        with open( self.RealPath(remotePath), 'rb', buffering=0 ) as fp :
+            fp.seek( offset )
+            while length > 0 :
+                chunk = fp.read( min( length, COPY_CHUNK_SIZE ) )
+                if not chunk :
+                    break
+                length -= len(chunk)
+                nbytes += len(chunk)
+                self.Throttle( start, nbytes )
+                yield chunk
+
+
+    def AuxGetSizeFromCloud( self, remotePath ) :
+        """Returns the size of a file in the local root."""
+
+        self.Request()
+        return os.path.getsize( self.RealPath(remotePath) )
+
+
+    def AuxGetIntoFromCloud( self, remotePath, view, extraArgs ) :
+        """Reads a file in the local root into a buffer.
+
+        Returns the number of bytes read.
+
+        Raises:
+            FTPBufferTooSmallError
+
+        """
+
+        self.Request()
+        start = time.time()
+        with open( self.RealPath(remotePath), 'rb', buffering=0 ) as fp :
+            size = os.fstat(fp.fileno()).st_size
+            if size > len(view) :
+                raise bftp_ex.FTPBufferTooSmallError
+            nbytes = ReadInto( fp, view[:size] )
+        self.Throttle( start, nbytes )
+        return nbytes
+
+
+    def ls( self ) :
+        """Lists contents of current working folder in the local root.
+
+        Returns a sorted list.
+
+        Raises:
+            FTPNoSuchDirError
+
+        """
+
+        return sorted( entry['name'] for entry in self.IterDir(self.remoteWorkingDir) )
+
+
+    def iter_ls( self ) :
+        """Generates contents of current working folder in the local root.
+
+        Raises:
+            FTPNoSuchDirError
+
+        """
+
+        for entry in self.IterDir( self.remoteWorkingDir ) :
+            yield entry['name']
+
+
+    def IterDir( self, loc ) :
+        """ Auxiliary method:  generate the entries directly inside a folder.
+
+        Entries are as described in BaseFtpClient.IterDir; the etag
+        is always None.  One request is counted per LIST_PAGE_SIZE
+        entries, as for a paginated cloud listing.
+
+        Raises:
+            FTPNoSuchDirError
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(loc)
+        if not os.path.isdir( realPath ) :
+            raise bftp_ex.FTPNoSuchDirError
+        with os.scandir( realPath ) as it :
+            entries = sorted( it, key=lambda e : e.name )
+        for (i,e) in enumerate(entries) :
+            if i and i % LIST_PAGE_SIZE == 0 :
+                self.Request()
+            st = e.stat()
+            isDir = e.is_dir()
+            yield { 'name':e.name, 'key':loc + '/' + e.name if loc else e.name,
+                    'type':OBJ_DIR if isDir else OBJ_FILE,
+                    'size':0 if isDir else st.st_size, 'etag':None,
+                    'mtime':datetime.datetime.fromtimestamp( st.st_mtime, datetime.timezone.utc ) }
+
+
+    def AuxMkDirInCloud( self, remotePath ) :
+        """Make a directory in the local root.
+
+        Arguments:
+           remotePath (str):  directory specifier
+
+        No return value.
+
+        """
+
+        self.Request()
+        os.makedirs( self.RealPath(remotePath), exist_ok=True )
+
+
+    def AuxPutInCloud( self, localPath, remotePath, extraArgs ) :
+        """Copies a file into the local root.
+
+        Missing parent directories are created, as they would be
+        implied in S3.
+
+        Arguments:
+            localPath (str)  : file to be transferred
+            remotePath (str) : where to put it
+            extraArgs (dict) : ignored
+
+        No return value.
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(remotePath)
+        os.makedirs( os.path.dirname(realPath), exist_ok=True )
+        self.Copy( localPath, realPath )
+
+
+    def AuxPutBytesInCloud( self, view, remotePath, extraArgs ) :
+        """Writes a buffer to a file in the local root.
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(remotePath)
+        os.makedirs( os.path.dirname(realPath), exist_ok=True )
+        start = time.time()
+        with open( realPath, 'wb', buffering=0 ) as fp :
+            nbytes = 0
+            while nbytes < len(view) :
+                nbytes += fp.write( view[nbytes:] )
+        self.Throttle( start, nbytes )
+        return nbytes
+
+
+    def AuxPutStreamInCloud( self, stream, remotePath, extraArgs ) :
+        """Copies a binary stream into a file in the local root.
+
+        The stream is written to a file with PARTIAL_SUFFIX, which
+        replaces the target only once the stream has been copied in
+        full, so that, as with a cloud upload, a stream that fails
+        part way through leaves no truncated file behind.
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(remotePath)
+        os.makedirs( os.path.dirname(realPath), exist_ok=True )
+        partPath = realPath + PARTIAL_SUFFIX
+        try :
+            with open( partPath, 'wb' ) as fp :
+                nbytes = self.CopyThrottled( stream, fp )
+        except BaseException :
+            os.remove( partPath )
+            raise
+        os.replace( partPath, realPath )
+        return nbytes
+
+
+    def AuxRmDirFromCloud( self, remotePath ) :
+        """ Remove a folder from the local root.
+
+        Arguments:
+            remotePath (str) : directory to be removed
+
+        No return value.
+
+        """
+
+        self.Request()
+        os.rmdir( self.RealPath(remotePath) )
+
+
+    def AuxSameContent( self, localPath, entry ) :
+        """ Compare a local file with a file in the local root, byte by byte.
+
+        Returns a boolean.
+
+        """
+
+        self.Request()
+        return filecmp.cmp( localPath, self.RealPath(entry['key']), shallow=False )
+
+
+    def IsDir( self, loc ) :
+        """ Auxiliary method:  check if specified location is a directory.
+
+        Returns a boolean.
+
+        """
+
+        self.Request()
+        return os.path.isdir( self.RealPath(loc) )
+
+
+    def IsFile( self, loc ) :
+        """ Auxiliary method:  check if specified location is a file.
+
+        Returns a boolean.
+
+        """
+
+        self.Request()
+        return os.path.isfile( self.RealPath(loc) )
+
+
+    def ObjectType( self, loc ) :
+        """ Auxiliary method:  classify a location with a single request.
+
+        Returns OBJ_FILE, OBJ_DIR or OBJ_NONE.
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(loc)
+        if os.path.isfile( realPath ) :
+            return OBJ_FILE
+        elif os.path.isdir( realPath ) :
+            return OBJ_DIR
+        else :
+            return OBJ_NONE
+
+
+    def DirEmpty( self, loc ) :
+        """ Auxiliary method:  check if specified directory is empty.
+
+        Returns a boolean.
+
+        Raises:
+            FTPNoSuchDirError
+
+        """
+
+        self.Request()
+        realPath = self.RealPath(loc)
+        if not os.path.isdir( realPath ) :
+            raise bftp_ex.FTPNoSuchDirError
+        with os.scandir( realPath ) as it :
+            return next( it, None ) == None
+
+
+    def AbsolutePath( self, f ) :
+        """ Auxiliary method:  transform relative path to absolute path.
+
+        Follows the same conventions as S3FtpClient.AbsolutePath:
+        the result is relative to the root, has no leading or trailing
+        forward slash, and the root itself is the empty string.  A
+        leading / makes f relative to the root rather than to the
+        remote working directory.
+
+        Returns a string.
+
+        Raises:
+            FTPInvalidCloudLocation
+
+        """
+
+        if f[0]!='/' and self.remoteWorkingDir :
+            remotePath = self.remoteWorkingDir + '/' + f.rstrip('/')
+        else :
+            remotePath = f.lstrip('/').rstrip('/')
+        remotePath = os.path.normpath(remotePath).replace('\\','/')
+        if remotePath=='.' :
+            remotePath = ''
+        elif remotePath=='..' or remotePath.startswith('../') :
+            raise bftp_ex.FTPInvalidCloudLocation
+        return remotePath
+
+
+
+    ###################################################################
+    # Auxiliary methods
+    ###################################################################
+
+
+    def RealPath( self, remotePath ) :
+        """ Returns the local file system path of an absolute remote path."""
+
+        return os.path.join( self.cloudStorageLocation, remotePath ) if remotePath \
+               else self.cloudStorageLocation
+
+
+    def Request( self ) :
+        """ Counts one simulated request and waits for the configured latency."""
+
+        with self.requestLock :
+            self.requests += 1
+        if self.latency > 0 :
+            time.sleep( self.latency )
+
+
+    def Copy( self, src, dst ) :
+        """ Copies file src to dst, no faster than the configured bandwidth."""
+
+        if not self.bandwidth :
+            shutil.copyfile( src, dst )
+            return
+        with open( src, 'rb' ) as fin, open( dst, 'wb' ) as fout :
+            self.CopyThrottled( fin, fout )
+
+
+    def CopyThrottled( self, src, dst ) :
+        """ Copies binary stream src to dst, no faster than the configured bandwidth.
+
+        Returns the number of bytes copied.
+
+        """
+
+        if not self.bandwidth :
+            return CopyStream( src, dst )
+        (start,copied) = ( time.time(), 0 )
+        while True :
+            chunk = src.read( COPY_CHUNK_SIZE )
+            if not chunk :
+                return copied
+            dst.write( chunk )
+            copied += len(chunk)
+            self.Throttle( start, copied )
+
+
+    def Throttle( self, start, nbytes ) :
+        """ Waits until a transfer of nbytes begun at start has taken as long as the bandwidth allows."""
+
+        if self.bandwidth :
+            delay = nbytes / self.bandwidth - ( time.time() - start )
+            if delay > 0 :
+                time.sleep( delay )
@@ -0,0 +1,209 @@
+#!/usr/local/bin/python3
+import os, sqlite3, threading
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+
+
+# Changes written to disk at a time
+COMMIT_EVERY = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT, kind TEXT, dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, digest TEXT,
+    PRIMARY KEY (path, kind) );
+CREATE TABLE IF NOT EXISTS synced (
+    location TEXT, key TEXT, etag TEXT, path TEXT, dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+    PRIMARY KEY (location, key) );
+'''
+
+
+
+
+###################################################################
+# Persistent index of local files and their cloud copies
+###################################################################
+
+class Manifest :
+    """On-disk index used by sync to avoid hashing and listing.
+
+    Two kinds of records are kept in an SQLite database.  Digests
+    map a local file, identified by its path, device, inode, size and
+    modification time, to a content digest of some kind (for example
+    its MD5 digest, or the ETag S3 would give it for a certain part
+    size), so a file is only hashed again once it changes.  Sync
+    records note that a local file, in the state given by the same
+    identity, was last found to be identical to a cloud file at
+    location/key with a certain etag (or an unknown one, recorded as
+    the empty string, right after an upload).
+
+    A local file is assumed unchanged while its identity is; like
+    rsync, this can be fooled by a change that restores the size and
+    modification time.  Changes are committed every COMMIT_EVERY
+    writes and by Flush.  Instances are safe to use from several
+    threads.
+
+    Attributes:
+        path (str):  database file
+
+    """
+
+    def __init__( self, path=None ) :
+        """ Open (creating if need be) the manifest at path.
+
+        The default path is cftp/manifest.sqlite in $XDG_CACHE_HOME,
+        or in ~/.cache if that is not set.
+
+        """
+
+        if path is None :
+            path = CachePath( 'manifest.sqlite' )
+        self.path = os.path.abspath( os.path.expanduser(path) )
+        os.makedirs( os.path.dirname(self.path), exist_ok=True )
+        self.db = sqlite3.connect( self.path, check_same_thread=False )
+        self.lock = threading.Lock()
+        self.pending = 0
+        with self.lock :
+            self.db.execute( 'PRAGMA journal_mode=WAL' )
+            self.db.executescript( SCHEMA )
+
+
+    ###################################################################
+    # Local content digests
+    ###################################################################
+
+    def Digest( self, path, kind, Compute ) :
+        """ Returns a digest of the local file at path.
+
+        The digest is looked up under kind, and if the file has
+        changed since it was recorded, it is computed by calling
+        Compute() and recorded.
+
+        """
+
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self.lock :
+            row = self.db.execute( 'SELECT dev, ino, size, mtime_ns, digest FROM digests '
+                                   'WHERE path=? AND kind=?', (path,kind) ).fetchone()
+        if row and row[:4] == Identity(st) :
+            return row[4]
+        digest = Compute()
+        self.Write( 'INSERT OR REPLACE INTO digests VALUES (?,?,?,?,?,?,?)',
+                    (path,kind) + Identity(st) + (digest,) )
+        return digest
+
+
+    ###################################################################
+    # Sync records
+    ###################################################################
+
+    def Lookup( self, location, key, path, st ) :
+        """ Returns the etag recorded for location/key and the local file.
+
+        Returns None if there is no record, or the local file (with
+        status st) has changed since it was recorded.  An etag that was
+        unknown when the record was made is returned as ''.
+
+        """
+
+        with self.lock :
+            row = self.db.execute( 'SELECT path, dev, ino, size, mtime_ns, etag FROM synced '
+                                   'WHERE location=? AND key=?', (location,key) ).fetchone()
+        if row and row[0] == os.path.abspath(path) and row[1:5] == Identity(st) :
+            return row[5]
+        return None
+
+
+    def Synced( self, location, key, etag, path, st ) :
+        """ Record that location/key (etag, or None if unknown) matches the local file."""
+
+        self.Write( 'INSERT OR REPLACE INTO synced VALUES (?,?,?,?,?,?,?,?)',
+                    (location,key,etag or '',os.path.abspath(path)) + Identity(st) )
+
+
+    def Keys( self, location, prefix ) :
+        """ Returns the recorded keys at location that start with prefix."""
+
+        with self.lock :
+            rows = self.db.execute( 'SELECT key FROM synced WHERE location=? AND substr(key,1,?)=?',
+                                    (location,len(prefix),prefix) ).fetchall()
+        return [ row[0] for row in rows ]
+
+
+    def Forget( self, location, key ) :
+        """ Drop the record of location/key."""
+
+        self.Write( 'DELETE FROM synced WHERE location=? AND key=?', (location,key) )
+
+
+    ###################################################################
+    # Maintenance
+    ###################################################################
+
+    def Clear( self ) :
+        """ Drop every record."""
+
+        with self.lock :
+            self.db.execute( 'DELETE FROM digests' )
+            self.db.execute( 'DELETE FROM synced' )
+            self.db.commit()
+            self.pending = 0
+
+
+    def Flush( self ) :
+        """ Commit outstanding changes."""
+
+        with self.lock :
+            self.db.commit()
+            self.pending = 0
+
+
+    def Close( self ) :
+        """ Commit outstanding changes and close the database."""
+
+        with self.lock :
+            self.db.commit()
+            self.db.close()
+
+
+    def Write( self, sql, params ) :
+        """ Execute a change, committing every COMMIT_EVERY changes."""
+
+        with self.lock :
+            self.db.execute( sql, params )
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY :
+                self.db.commit()
+                self.pending = 0
+
+
+    def __str__( self ) :
+
+        with self.lock :
+            digests = self.db.execute( 'SELECT count(*) FROM digests' ).fetchone()[0]
+            synced = self.db.execute( 'SELECT count(*) FROM synced' ).fetchone()[0]
+        return 'manifest %s: %d digest(s), %d synced file(s)' % ( self.path, digests, synced )
+
+
+
+
+def Identity( st ) :
+    """ Returns the (device, inode, size, mtime in ns) of a stat result."""
+
+    return ( st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns )
+
+
+def CachePath( name ) :
+    """ Returns the path of name in the cftp cache folder.
+
+    The folder is cftp in $XDG_CACHE_HOME, or in ~/.cache if that
+    is not set.
+
+    """
+
+    return os.path.join( os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'cftp', name )
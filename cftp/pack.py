@@ -0,0 +1,244 @@
+#!/usr/local/bin/python3
+import json, gzip, fnmatch, tarfile, threading
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+# Name of the index written next to the archives of a packed folder
+PACK_INDEX = 'pack-index.json.gz'
+
+# Names of the archives, by number
+ARCHIVE_NAME = 'pack-%05d.tar'
+
+# Default size of the archives (see the pack command)
+DEFAULT_PACK_SIZE = 64 * 1024 * 1024
+
+# Members separated by less than this many bytes are fetched with a
+# single ranged request, up to MAX_RANGE_SIZE bytes per request
+RANGE_GAP = 64 * 1024
+MAX_RANGE_SIZE = 16 * 1024 * 1024
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+# Size of the chunks in which files are read into archives
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+
+
+###################################################################
+# Writing archives
+###################################################################
+
+def Groups( files, packSize ) :
+    """ Groups files into lists to be packed into archives of about packSize bytes.
+
+    Files are (relName, path, stat) tuples, as generated by WalkFiles.
+    A list is closed once its files add up to packSize or more, so a
+    file larger than packSize makes up an archive of its own.
+
+    """
+
+    (group,total) = ( [], 0 )
+    for item in files :
+        group.append( item )
+        total += item[2].st_size + 2*BLOCK_SIZE
+        if total >= packSize :
+            yield group
+            (group,total) = ( [], 0 )
+    if group :
+        yield group
+
+
+def Layout( group ) :
+    """ Plans the tar archive of a group of files.
+
+    Returns a list of (relName, path, header, offset, size, mtime)
+    tuples, one per file, where header is the tar header of the file
+    and offset the position of its content in the archive.
+
+    """
+
+    (layout,offset) = ( [], 0 )
+    for (relName,path,st) in group :
+        info = tarfile.TarInfo( relName )
+        (info.size,info.mtime,info.mode) = ( st.st_size, int(st.st_mtime), 0o644 )
+        header = info.tobuf( tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape' )
+        offset += len(header)
+        layout.append( (relName,path,header,offset,st.st_size,st.st_mtime) )
+        offset += st.st_size + (-st.st_size) % BLOCK_SIZE
+    return layout
+
+
+def ArchiveChunks( layout ) :
+    """ Generates the content of the tar archive planned by Layout.
+
+    Files are read one at a time, in chunks of READ_CHUNK_SIZE bytes,
+    as the archive is consumed, so that it can be uploaded as a stream
+    without holding a whole file in memory.
+
+    Raises:
+        OSError:  a file changed size since it was planned
+
+    """
+
+    for (relName,path,header,offset,size,mtime) in layout :
+        yield header
+        with open( path, 'rb' ) as fp :
+            left = size
+            while left > 0 :
+                chunk = fp.read( min( left, READ_CHUNK_SIZE ) )
+                if not chunk :
+                    raise OSError( 'file changed while being packed: ' + path )
+                left -= len(chunk)
+                yield chunk
+            if fp.read( 1 ) :
+                raise OSError( 'file changed while being packed: ' + path )
+        yield bytes( (-size) % BLOCK_SIZE )
+    yield bytes( 2*BLOCK_SIZE )
+
+
+
+def MemberPieces( chunks, start, members ) :
+    """ Splits the content of a ranged request into the members it holds.
+
+    chunks are the bytes of an archive from position start on, as
+    generated by AuxIterRangeFromCloud, and members the (name, offset,
+    size, mtime) tuples of a range planned by PackIndex.Ranges, in
+    order of offset.  The chunks are consumed as the pieces are, so
+    that members can be written out as their bytes arrive.
+
+    Generates (member, piece) pairs, the pieces of each member in
+    order, with a single empty piece for an empty member.
+
+    Raises:
+        OSError:  the chunks end before the last member
+
+    """
+
+    chunks = iter( chunks )
+    (view,pos) = ( memoryview(b''), start )
+    for member in members :
+        (offset,size) = member[1:3]
+        if not size :
+            yield ( member, b'' )
+            continue
+        left = size
+        while left > 0 :
+            if not view :
+                chunk = next( chunks, None )
+                if chunk is None :
+                    raise OSError( 'archive ended before ' + member[0] )
+                view = memoryview( chunk )
+            if pos < offset :
+                skip = min( offset-pos, len(view) )
+                (view,pos) = ( view[skip:], pos+skip )
+                continue
+            piece = view[:left]
+            (view,pos,left) = ( view[len(piece):], pos+len(piece), left-len(piece) )
+            yield ( member, piece )
+
+
+
+###################################################################
+# Index of packed files
+###################################################################
+
+class PackIndex :
+    """Maps the files of a packed folder to their place in its archives.
+
+    Each member (a file, named by its path relative to the packed
+    folder) is recorded with the number of its archive, the offset
+    and size of its content there and its modification time, so that
+    it can be fetched with a ranged request.  The index is stored as
+    gzipped JSON in PACK_INDEX.  Instances are safe to update from
+    several worker threads.
+
+    Attributes:
+        members (dict)  :  name to (archive number, offset, size, mtime)
+
+    """
+
+    def __init__( self, members=None ) :
+        """ Create an index, empty unless members are given."""
+
+        self.members = members or {}
+        self.lock = threading.Lock()
+
+
+    def Add( self, number, layout ) :
+        """ Record the members of archive number, as planned by Layout."""
+
+        with self.lock :
+            for (relName,path,header,offset,size,mtime) in layout :
+                self.members[relName] = ( number, offset, size, mtime )
+
+
+    def Match( self, patterns=None ) :
+        """ Returns the sorted names of members matching any of the patterns (all if None)."""
+
+        return sorted( name for name in self.members
+                       if not patterns or any( fnmatch.fnmatchcase(name,p) for p in patterns ) )
+
+
+    def Ranges( self, names, gap=RANGE_GAP, maxSize=MAX_RANGE_SIZE ) :
+        """ Plans the ranged requests fetching the named members.
+
+        Members of the same archive lying within gap bytes of each
+        other are fetched together, in ranges of at most maxSize bytes
+        (a larger member is a range of its own).
+
+        Generates (archive number, start, end, members) tuples, where
+        members lists the (name, offset, size, mtime) of the members
+        between byte start and byte end (exclusive).
+
+        """
+
+        byArchive = {}
+        for name in names :
+            (number,offset,size,mtime) = self.members[name]
+            byArchive.setdefault( number, [] ).append( (name,offset,size,mtime) )
+        for number in sorted(byArchive) :
+            (run,start,end) = ( [], 0, 0 )
+            for member in sorted( byArchive[number], key=lambda m : m[1] ) :
+                (offset,size) = member[1:3]
+                if run and ( offset - end > gap or offset + size - start > maxSize ) :
+                    yield ( number, start, end, run )
+                    run = []
+                if not run :
+                    start = offset
+                run.append( member )
+                end = offset + size
+            if run :
+                yield ( number, start, end, run )
+
+
+    def Encode( self ) :
+        """ Returns the index as gzipped JSON."""
+
+        members = [ [name] + list(value) for (name,value) in sorted(self.members.items()) ]
+        return gzip.compress( json.dumps( {'version':1,'members':members} ).encode() )
+
+
+    @classmethod
+    def Decode( cls, data ) :
+        """ Returns the index stored in data, as made by Encode.
+
+        Raises:
+            ValueError
+
+        """
+
+        index = json.loads( gzip.decompress( bytes(data) ) )
+        if index.get('version') != 1 :
+            raise ValueError( 'unknown pack index version' )
+        return cls( { m[0]:tuple(m[1:]) for m in index['members'] } )
+
+
+    def __str__( self ) :
+
+        archives = len( set( value[0] for value in self.members.values() ) )
+        return '%d file(s) in %d archive(s)' % ( len(self.members), archives )
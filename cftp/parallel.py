@@ -0,0 +1,292 @@
+#!/usr/local/bin/python3
+import re, time, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+# This code is protected under the GNU General Public License, Version 3.
+# See https://www.gnu.org/copyleft/gpl.html.
+# Author:  Dude Revolucion (dudrevolucion@gmail.com)
+
+
+
+
+###################################################################
+# Summary of a batch of per-file operations
+###################################################################
+
+class TransferReport :
+    """Collects the outcome of a batch command such as mget or mput.
+
+    Batch commands record one success or failure per file rather
+    than aborting on the first error.  Converting a report to a
+    string gives a summary line with the number of files, the bytes
+    moved and the throughput, followed by one line per failure.
+    Instances are safe to update from several worker threads.
+
+    Attributes:
+        verb (str)       :  describes the operation in the summary line
+        files (int)      :  number of files processed successfully
+        nbytes (int)     :  number of bytes moved
+        skipped (int)    :  number of files left alone as up to date
+        deleted (int)    :  number of extraneous files deleted
+        failures (list)  :  (name, exception) pairs
+        elapsed (float)  :  seconds from creation until Finish was called
+
+    """
+
+    def __init__( self, verb='transferred' ) :
+        """ Create an empty report and start its clock."""
+
+        self.verb = verb
+        self.files = 0
+        self.nbytes = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.failures = []
+        self.elapsed = 0.0
+        self.startTime = time.time()
+        self.lock = threading.Lock()
+
+
+    def AddSuccess( self, nbytes=0, count=1 ) :
+        """ Record count successfully processed files totalling nbytes."""
+
+        with self.lock :
+            self.files += count
+            self.nbytes += nbytes
+
+
+    def AddSkipped( self, count=1 ) :
+        """ Record count files that needed no transfer."""
+
+        with self.lock :
+            self.skipped += count
+
+
+    def AddDeleted( self, count=1 ) :
+        """ Record count extraneous files deleted."""
+
+        with self.lock :
+            self.deleted += count
+
+
+    def AddFailure( self, name, error ) :
+        """ Record that processing the named file raised error."""
+
+        with self.lock :
+            self.failures.append( (name,error) )
+
+
+    def AddReport( self, other ) :
+        """ Add the counts and failures of another report to this one."""
+
+        with self.lock :
+            self.files += other.files
+            self.nbytes += other.nbytes
+            self.skipped += other.skipped
+            self.deleted += other.deleted
+            self.failures.extend( other.failures )
+
+
+    def Finish( self ) :
+        """ Stop the clock.  Returns the report itself."""
+
+        self.elapsed = time.time() - self.startTime
+        return self
+
+
+    def __str__( self ) :
+
+        rate = self.nbytes / self.elapsed if self.elapsed > 0 else 0.0
+        extra = ''.join( ', %d %s' % (n,what) for (n,what) in
+                         ( (self.skipped,'up to date'), (self.deleted,'deleted') ) if n )
+        lines = [ '%d file(s) %s, %s in %.2f s (%s/s)%s, %d error(s)' %
+                  ( self.files, self.verb, FormatSize(self.nbytes), self.elapsed,
+                    FormatSize(rate), extra, len(self.failures) ) ]
+        for (name,error) in self.failures :
+            msg = str(error)
+            lines.append( '  %s:  %s%s' % ( name, type(error).__name__, ' ' + msg if msg else '' ) )
+        return '\n'.join( lines )
+
+
+
+
+###################################################################
+# Bounded worker pool
+###################################################################
+
+def RunParallel( func, items, maxWorkers=1, report=None, nameOf=str, countItems=True,
+                 stopOnFailure=False ) :
+    """ Applies func to each item using a bounded pool of worker threads.
+
+    Items are drawn lazily from the iterable, with at most twice
+    maxWorkers of them queued at any time, so that a generator
+    such as iter_ls can feed the pool without being materialized.
+    An exception raised by func is recorded in the report as a
+    failure for that item and does not stop the batch, unless
+    stopOnFailure is set:  then no further items are drawn and those
+    queued but not yet started are cancelled.  With maxWorkers of 1
+    the items are processed in the calling thread.
+
+    Arguments:
+        func (callable)    :  applied to each item; returns bytes moved
+        items (iterable)   :  work items
+        maxWorkers (int)   :  number of worker threads
+        report (TransferReport) :  report to update; created if None
+        nameOf (callable)  :  names an item in failure messages
+        countItems (bool)  :  record a success per item; pass False
+                              when func updates the report itself
+        stopOnFailure (bool) :  give up on the items left after the
+                              first failure
+
+    Returns the (finished) TransferReport.
+
+    """
+
+    if report is None :
+        report = TransferReport()
+
+    def RunOne( item ) :
+        try :
+            rVal = func( item )
+        except Exception as e :
+            report.AddFailure( nameOf(item), e )
+        else :
+            if countItems :
+                report.AddSuccess( rVal or 0 )
+
+    def Stopped() :
+        return stopOnFailure and report.failures
+
+    if maxWorkers <= 1 :
+        for item in items :
+            if Stopped() :
+                break
+            RunOne( item )
+    else :
+        with ThreadPoolExecutor( max_workers=maxWorkers ) as pool :
+            pending = set()
+            for item in items :
+                if len(pending) >= 2*maxWorkers :
+                    (done,pending) = wait( pending, return_when=FIRST_COMPLETED )
+                if Stopped() :
+                    break
+                pending.add( pool.submit(RunOne,item) )
+            while pending and not Stopped() :
+                (done,pending) = wait( pending, return_when=FIRST_COMPLETED )
+            for future in pending :
+                future.cancel()
+
+    return report.Finish()
+
+
+
+
+###################################################################
+# Worker processes for CPU-bound stages
+###################################################################
+
+class CpuPool :
+    """Runs the CPU-bound stages of transfers in worker processes.
+
+    Hashing or compressing a file holds a core for as long as it
+    takes, so with many files a single process is limited by the
+    speed of one core rather than by the network.
+    A CpuPool runs these stages in up to maxWorkers processes, while
+    the threads of RunParallel keep doing the network requests:  a
+    thread hands a file to the pool, waits for the result and then
+    transfers it.  The work is described by a module-level function
+    and its arguments (file paths rather than contents), so little
+    data crosses between processes.
+
+    The processes are started with the spawn method, which is safe
+    in a process running threads, when the first function is run.
+    They are kept until Close is called.
+
+    Attributes:
+        maxWorkers (int)  :  number of worker processes
+
+    """
+
+    def __init__( self, maxWorkers ) :
+        """ Create a pool; no processes are started yet."""
+
+        self.maxWorkers = maxWorkers
+        self.executor = None
+        self.lock = threading.Lock()
+
+
+    def Run( self, func, *args ) :
+        """ Run func(*args) in a worker process.
+
+        Returns the result of func, or raises its exception.
+
+        """
+
+        with self.lock :
+            if self.executor is None :
+                self.executor = ProcessPoolExecutor( max_workers=self.maxWorkers,
+                                    mp_context=multiprocessing.get_context('spawn') )
+        return self.executor.submit( func, *args ).result()
+
+
+    def Close( self ) :
+        """ Stop the worker processes once their work is done."""
+
+        with self.lock :
+            if self.executor is not None :
+                self.executor.shutdown()
+                self.executor = None
+
+
+    def __str__( self ) :
+
+        return 'cpu %d' % self.maxWorkers
+
+
+
+
+###################################################################
+# Helpers
+###################################################################
+
+def Batches( items, size ) :
+    """ Groups an iterable into lists of at most size items each."""
+
+    batch = []
+    for item in items :
+        batch.append( item )
+        if len(batch) == size :
+            yield batch
+            batch = []
+    if batch :
+        yield batch
+
+
+def ParseSize( value ) :
+    """ Converts a size such as 64MB, 512k or 1048576 to a number of bytes.
+
+    Units are powers of 1024 and case-insensitive; a trailing B or
+    iB is optional.  Integers are returned unchanged.
+
+    Raises:
+        ValueError
+
+    """
+
+    if isinstance( value, int ) :
+        return value
+    match = re.fullmatch( r'([0-9.]+)\s*([KMGT]?)(I?B)?', str(value).strip().upper() )
+    if not match :
+        raise ValueError( value )
+    multiplier = { '':1, 'K':1024, 'M':1024**2, 'G':1024**3, 'T':1024**4 }[ match.group(2) ]
+    return int( float(match.group(1)) * multiplier )
+
+
+def FormatSize( nbytes ) :
+    """ Returns a human-readable string for a number of bytes."""
+
+    for unit in ( 'B', 'KB', 'MB', 'GB', 'TB' ) :
+        if nbytes < 1024 or unit=='TB' :
+            return '%.1f %s' % ( nbytes, unit ) if unit!='B' else '%d B' % nbytes
+        nbytes /= 1024.0
@@ -1,9 +1,14 @@
 #!/usr/local/bin/python3
-import sys,boto3,json,os
+import sys,io,json,os,math,mmap,hashlib,functools,threading,contextlib
+from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
 from functools import wraps
-from boto3.s3.transfer import S3Transfer
-from cftp.base import BaseFtpClient,ExceptionWrapper
+from cftp.base import BaseFtpClient,ExceptionWrapper,OBJ_NONE,OBJ_FILE,OBJ_DIR,FileMD5,ReadFully,\
+                      ReadInto,BufferReader,BufferWriter,ChunkReader,Unwrapped,ClampRange
+from cftp.parallel import RunParallel, TransferReport, Batches, ParseSize, FormatSize
+from cftp.manifest import Identity
+from cftp.cache import MetadataCache, MISS
+from cftp.compression import CODECS, COMPRESS_BLOCK_SIZE, CheckCodec, CompressBlock, Decompressor
 import cftp.base_exceptions as bftp_ex
 import cftp.s3_exceptions as s3e
 
@@ -13,6 +18,127 @@ import cftp.s3_exceptions as s3e
 # Author:  Dude Revolucion (dudrevolucion@gmail.com)
 
 
+# Size of the HTTP connection pool shared by concurrent transfers
+MAX_POOL_CONNECTIONS = 64
+
+# Size of the chunks read from streaming response bodies
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of keys in a DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+# Default lifetime (seconds) and capacity of the metadata cache
+DEFAULT_CACHE_TTL = 30.0
+DEFAULT_CACHE_SIZE = 10000
+
+# Default transfer settings (see the tconfig command)
+DEFAULT_TRANSFER_CONFIG = {
+    'multipart_threshold' : 8 * 1024 * 1024,
+    'multipart_chunksize' : 8 * 1024 * 1024,
+    'max_concurrency'     : 10,
+    'max_io_queue'        : 100,
+    'auto_tune'           : True,
+    'mmap_upload'         : False
+}
+
+MIB = 1024 * 1024
+
+# S3 limits on multipart uploads
+MAX_PARTS = 10000
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+
+# Arguments that must be repeated on each UploadPart request
+# and on CompleteMultipartUpload
+UPLOAD_PART_ARGS = ( 'SSECustomerAlgorithm', 'SSECustomerKey', 'SSECustomerKeyMD5',
+                     'RequestPayer', 'ExpectedBucketOwner' )
+
+# Number of S3Transfer objects kept for part sizes other than the
+# configured one (see TransferFor)
+MAX_TRANSFERS = 4
+
+# Number of times a download starts again because the object was
+# replaced while it was being fetched, before giving up
+MAX_RESTARTS = 3
+
+# S3 object parameters accepted as defaults before boto3 is imported:
+# a copy of the upload and download arguments allowed by its S3Transfer,
+# which are used instead once it is (see AllowedObjectArgs)
+ALLOWED_OBJECT_ARGS = frozenset( (
+    'ACL', 'CacheControl', 'ChecksumAlgorithm', 'ChecksumMode', 'ContentDisposition',
+    'ContentEncoding', 'ContentLanguage', 'ContentType', 'ExpectedBucketOwner', 'Expires',
+    'GrantFullControl', 'GrantRead', 'GrantReadACP', 'GrantWriteACP', 'Metadata',
+    'ObjectLockLegalHoldStatus', 'ObjectLockMode', 'ObjectLockRetainUntilDate', 'RequestPayer',
+    'ServerSideEncryption', 'StorageClass', 'SSECustomerAlgorithm', 'SSECustomerKey',
+    'SSECustomerKeyMD5', 'SSEKMSKeyId', 'SSEKMSEncryptionContext', 'Tagging', 'VersionId',
+    'WebsiteRedirectLocation' ) )
+
+# Streams of unknown length are uploaded in parts whose size doubles
+# every STREAM_PART_DOUBLING parts, to stay within MAX_PARTS
+STREAM_PART_DOUBLING = 1000
+
+# User metadata recording the size and MD5 digest of the content of
+# compressed objects, which listings and ETags describe as stored
+META_SIZE = 'cftp-size'
+META_MD5 = 'cftp-md5'
+
+# Suffix of partially downloaded files while the journal is on
+PARTIAL_SUFFIX = '.cftp-part'
+
+# Auto-tuning aims for this many parts per concurrent thread,
+# without making parts larger than AUTO_TUNE_MAX_PART_SIZE
+AUTO_TUNE_PARTS_PER_THREAD = 8
+AUTO_TUNE_MAX_PART_SIZE = 128 * 1024 * 1024
+
+
+
+
+###################################################################
+# Deferred imports
+###################################################################
+
+# Set by ImportBoto3.  Until then ClientError is a stand-in, so that
+# except clauses naming it stay valid.
+boto3 = S3Transfer = TransferConfig = Config = None
+
+class ClientError(Exception) :
+    """Stands in for botocore's ClientError until boto3 is imported."""
+
+
+def ImportBoto3() :
+    """ Imports boto3 and the S3 transfer machinery into this module.
+
+    Importing them takes longer than anything else s3ftp does to start
+    up, so it is put off until a client first needs them, which is
+    when it opens a bucket.  Commands that do not touch S3 (such as
+    lcd, or --help) then start quickly.
+
+    No return value.
+
+    """
+
+    global boto3, S3Transfer, TransferConfig, Config, ClientError
+    if S3Transfer is None :
+        import boto3
+        from boto3.s3.transfer import S3Transfer, TransferConfig
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+
+
+def AllowedObjectArgs() :
+    """ Returns the names of the S3 object parameters accepted as defaults.
+
+    These are the upload and download arguments allowed by boto3's
+    S3Transfer once ImportBoto3 has run, and ALLOWED_OBJECT_ARGS
+    before then.
+
+    """
+
+    if S3Transfer is None :
+        return ALLOWED_OBJECT_ARGS
+    return frozenset( S3Transfer.ALLOWED_UPLOAD_ARGS ) | frozenset( S3Transfer.ALLOWED_DOWNLOAD_ARGS )
+
+
 
 ###################################################################
 # Exception handling decorator
@@ -47,6 +173,15 @@ def S3ExceptionWrapper( func ) :
         except s3e.S3FTPInvalidObjectParameter as e :
             e.errorLog()
 
+        except s3e.S3FTPInvalidTransferConfig as e :
+            e.errorLog()
+
+        except s3e.S3FTPInvalidCompression as e :
+            e.errorLog()
+
+        except s3e.S3FTPCompressedRangeError as e :
+            e.errorLog()
+
         except :
             raise
 
@@ -92,6 +227,36 @@ class S3FtpClient(BaseFtpClient) :
     constructor is also called with default parameters, then use those
     to overwrite any parameters loaded from the .s3ftp.json file.
 
+    Transfer settings (multipart threshold and part size, concurrency,
+    IO queue size) are handled the same way.  They come from the
+    TransferConfig entry of .s3ftp.json, if any, and then from the
+    s3TransferConfig constructor argument.  They can be changed at any
+    time with SetS3TransferConfig or the tconfig command.  Unless the
+    auto_tune setting is turned off, the part size is raised for large
+    files to stay within S3's part limit and to keep every thread busy.
+    With the mmap_upload setting on, large files are uploaded from a
+    memory map of the file (see PutMapped).
+
+    Files can be compressed (gzip, or zstd if the zstandard package is
+    installed) as they are uploaded by put and the other commands
+    uploading files.  The codec comes from the Compression entry of
+    .s3ftp.json, the compression constructor argument or the compress
+    command, and a Compression entry in the extraArgs of a command
+    overrides it for that command.  Compressed objects are stored with
+    the codec as their ContentEncoding, and downloads of files and of
+    streams decompress objects whose ContentEncoding is one of the
+    codecs, whatever the current setting.  The size and MD5 digest of
+    the original file are stored in the object's metadata, so that
+    sync can tell whether a compressed object is up to date.
+
+    Object types and folder listings are kept in a metadata cache for
+    cacheTtl seconds (constructor argument; 0 disables it), so that
+    navigating and transferring in folders that were just listed does
+    not cost a request per command.  Changes made through this client
+    update the cache as they happen.  Changes made by others become
+    visible once the cached items expire, or after the cache clear
+    command.
+
     ISSUE TO CHECK:  See the open method.  What if the loc parameter
     points to a file rather than a folder?  Also, could improve handling
     of invalid extraArgs keys and values for the S3 transfer functions.
@@ -100,11 +265,23 @@ class S3FtpClient(BaseFtpClient) :
     where the file name pattern includes a directory, but they do a
     poor job of informing the user.
 
+    Opening a bucket takes a single HeadBucket request, which also
+    tells the bucket's region; the client is then bound to that region.
+    Regions are remembered, and unless reuseSession is off, the boto3
+    session and its clients (with their connection pools) are kept
+    across close and open, so reopening a bucket costs no requests.
+
     Attributes:
         s3Bucket (boto3.S3Bucket)     :  object representing Amazon S3 bucket
         s3Client (boto3.client)       :  used for interacting with Amazon S3
         s3Transfer (boto3.S3Transfer) :  transfers to/from S3
+        reuseSession (bool)           :  keep boto3 session and clients on close
+        maxPoolConnections (int)      :  connection pool size of new clients
+        bucketRegions (dict)          :  region of each bucket opened
         s3DefaultObjParams (dict)     :  other parameters for S3 objects
+        s3TransferConfig (dict)       :  multipart transfer settings
+        compression (str)             :  codec for uploaded files, or None
+        metaCache (MetadataCache)     :  cached object types and listings
 
     """
 
@@ -112,15 +289,29 @@ class S3FtpClient(BaseFtpClient) :
     # Initialization and exception handling
     ###################################################################
 
-    def __init__( self, isInteractive=False, s3DefaultObjParams=None ) :
+    def __init__( self, isInteractive=False, s3DefaultObjParams=None, s3TransferConfig=None,
+                  cacheTtl=DEFAULT_CACHE_TTL, cacheSize=DEFAULT_CACHE_SIZE, reuseSession=True,
+                  compression=None ) :
         """ Create an S3 ftp client."""
 
         super().__init__( isInteractive )
 
-        self.s3Bucket = None
         self.s3Client = None
+        self.bucketResource = None
+        self.boto3Session = None
+        self.s3Clients = {}
+        self.bucketRegions = {}
+        self.reuseSession = reuseSession
+        self.maxPoolConnections = MAX_POOL_CONNECTIONS
         self.s3Transfer = None
+        self.s3Transfers = OrderedDict()
+        self.transferUsers = {}
+        self.retiredTransfers = []
+        self.transferLock = threading.Lock()
         self.s3DefaultObjParams = None
+        self.s3TransferConfig = dict( DEFAULT_TRANSFER_CONFIG )
+        self.compression = None
+        self.metaCache = MetadataCache( cacheTtl, cacheSize )
 
         # Set default object parameters for S3Transfer from file
         if os.path.exists('.s3ftp.json' ) :
@@ -135,10 +326,20 @@ class S3FtpClient(BaseFtpClient) :
         # Set default object parameters from constructor argument
         if s3DefaultObjParams!=None :
             if self.S3ParamsAreValid(s3DefaultObjParams) :
+                if self.s3DefaultObjParams==None :
+                    self.s3DefaultObjParams = {}
                 for key,value in s3DefaultObjParams.items() :
                     self.s3DefaultObjParams[key] = value
             else :
                 raise s3e.S3FTPInvalidObjectParameter
+
+        # Set transfer settings from constructor argument
+        if s3TransferConfig!=None :
+            self.ApplyS3TransferConfig( s3TransferConfig )
+
+        # Set compression from constructor argument
+        if compression!=None :
+            self.ApplyCompression( compression )
                 
 
 
@@ -156,9 +357,13 @@ class S3FtpClient(BaseFtpClient) :
         """
 
         super().close()
-        self.s3Bucket = None
         self.s3Client = None
-        self.s3Transfer = None
+        self.bucketResource = None
+        if not self.reuseSession :
+            self.boto3Session = None
+            self.s3Clients = {}
+        self.RetireTransfers()
+        self.metaCache.Clear()
 
 
 
@@ -173,331 +378,1544 @@ class S3FtpClient(BaseFtpClient) :
 
         """
 
-        objs = self.s3Bucket.objects.filter( Prefix=remotePath )
-        objs = [ obj for obj in objs if obj.size > 0 ]
-        objs[0].delete()
+        self.s3Client.delete_object( Bucket=self.cloudStorageLocation, Key=remotePath )
+        self.metaCache.Removed( remotePath, OBJ_FILE )
+
+
+    @S3ExceptionWrapper
+    def AuxDeleteManyFromCloud( self, remotePaths, maxWorkers, report ) :
+        """ Delete many files from an Amazon S3 bucket.
+
+        Groups the keys into DeleteObjects requests of up to 1000 keys
+        each, and issues up to maxWorkers of those requests at once.
+        Keys that S3 reports it could not delete are recorded in the
+        report as failures.
+
+        Arguments:
+            remotePaths (iterable) : keys to be deleted
+            maxWorkers (int)       : number of concurrent requests
+            report (TransferReport): records successes and failures
+
+        Returns the report.
+
+        """
+
+        def DeleteBatch( keys ) :
+            rsp = self.s3Client.delete_objects( Bucket=self.cloudStorageLocation,
+                                                Delete={ 'Objects':[ {'Key':key} for key in keys ],
+                                                         'Quiet':True } )
+            errors = rsp.get('Errors',[])
+            for err in errors :
+                report.AddFailure( err['Key'], s3e.S3FTPDeleteError( err.get('Code','') + ' ' + err.get('Message','') ) )
+            failed = { err['Key'] for err in errors }
+            for key in keys :
+                if key not in failed and not key.endswith('/') :
+                    self.metaCache.Removed( key, OBJ_FILE )
+            report.AddSuccess( count=len(keys)-len(errors) )
+
+        return RunParallel( DeleteBatch, Batches(remotePaths,DELETE_BATCH_SIZE), maxWorkers,
+                            report=report, countItems=False,
+                            nameOf=lambda keys : '%d keys from %s' % (len(keys),keys[0]) )
 
 
 
     @S3ExceptionWrapper
-    def AuxGetFromCloud( self, remotePath, localPath, extraArgs ) :
+    def AuxGetFromCloud( self, remotePath, localPath, extraArgs, restarts=0 ) :
         """Downloads a file from an S3 bucket.
 
+        A HeadObject request gives the object's size, which tunes the
+        transfer, and its ContentEncoding.  Compressed objects (see
+        compress) are fetched with a single GetObject request and
+        decompressed as they arrive.  Objects of at least
+        multipart_threshold bytes are fetched in parallel segments by
+        GetSegments (see SegmentPlan), each request conditional on the
+        ETag given by HeadObject so that an object replaced part way
+        through is downloaded again from the start, up to MAX_RESTARTS
+        times; smaller objects go through S3Transfer.  If there is a
+        transfer journal, objects are fetched with GetResumable instead.
+
         Arguments:
             remotePath (str):  file to be gotten
             localPath (str) :  where to put it
             s3ObjArgs (dict):  args for corresponding S3 client operation
+            restarts (int)  :  number of times the download started again
 
         No return value.
 
+        Raises:
+            FTPNoSuchFileError
+            FTPError:  the object kept being replaced
+
         """
 
-        s3ObjArgs = None
-        if self.s3DefaultObjParams :
-            s3ObjArgs = { key:value for key,value in self.s3DefaultObjParams.items() if key in S3Transfer.ALLOWED_DOWNLOAD_ARGS}
-            if extraArgs :
-                s3ObjArgs.update( { key:value for key,value in extraArgs.items() if key in S3Transfer.ALLOWED_DOWNLOAD_ARGS } )
-        elif extraArgs :
-            s3ObjArgs = { key:value for key,value in extraArgs.items() if key in S3Transfer.ALLOWED_DOWNLOAD_ARGS } 
-        self.s3Transfer.download_file( self.cloudStorageLocation, remotePath, localPath, extra_args=s3ObjArgs )
-            
+        head = self.HeadObject( remotePath )
+        if head is None :
+            raise bftp_ex.FTPNoSuchFileError
+        if self.transferJournal :
+            return self.GetResumable( remotePath, localPath, head['ETag'].strip('"'),
+                                      head['ContentLength'], extraArgs, head.get('ContentEncoding','') )
+        if head.get('ContentEncoding') in CODECS :
+            s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+            rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+            with open( localPath, 'wb' ) as fp :
+                self.WriteBody( rsp, fp )
+            return
+        if head['ContentLength'] >= self.s3TransferConfig['multipart_threshold'] :
+            try :
+                self.GetSegments( remotePath, localPath, 0, head['ContentLength'],
+                                  dict( extraArgs or {}, IfMatch=head['ETag'] ) )
+            except ClientError as e :
+                if e.response['Error']['Code'] not in ('412','PreconditionFailed') :
+                    raise
+                if restarts >= MAX_RESTARTS :
+                    raise bftp_ex.FTPError
+                self.metaCache.Forget( remotePath )
+                Unwrapped( self.AuxGetFromCloud )( remotePath, localPath, extraArgs, restarts+1 )
+            return
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS )
+        with self.TransferFor( head['ContentLength'] ) as s3Transfer :
+            s3Transfer.download_file( self.cloudStorageLocation, remotePath, localPath, extra_args=s3ObjArgs )
+
 
     @S3ExceptionWrapper
-    def ls(self) :
-        """Lists contents of current working folder in an S3 bucket.
+    def AuxGetRangeToFile( self, remotePath, localPath, offset, length, extraArgs, maxWorkers=None, restarts=0 ) :
+        """Downloads part of an S3 object to a local file.
+
+        A HeadObject request gives the object's size and ETag, and the
+        part is fetched by GetSegments, each request conditional on the
+        ETag so that an object replaced part way through is downloaded
+        again from the start, up to MAX_RESTARTS times, as in
+        AuxGetFromCloud.  Compressed objects (see compress) are refused,
+        as a part of their stored content is not a part of the file.
+
+        Arguments:
+            remotePath (str):  file to be read
+            localPath (str) :  where to put the part
+            offset (int)    :  position of the first byte wanted; if
+                               negative, counts from the end
+            length (int)    :  number of bytes wanted, or None for the rest
+            extraArgs (dict):  args for corresponding S3 client operation
+            maxWorkers (int):  number of concurrent segments
+            restarts (int)  :  number of times the download started again
 
-        Returns a list.
+        No return value.
+
+        Raises:
+            FTPNoSuchFileError
+            FTPError:  the object kept being replaced
+            S3FTPCompressedRangeError
 
         """
 
+        head = self.HeadObject( remotePath )
+        if head is None :
+            raise bftp_ex.FTPNoSuchFileError
+        if head.get('ContentEncoding') in CODECS :
+            raise s3e.S3FTPCompressedRangeError
+        (start,end) = ClampRange( offset, length, head['ContentLength'] )
         try :
-            objSummaryIter = self.s3Bucket.objects.filter( Prefix=self.remoteWorkingDir )
-        except :
-            raise bftp_ex.FTPError
-        else :
-            if self.remoteWorkingDir :
-                objs = { obj.key.replace(self.remoteWorkingDir + '/','',1) for obj in objSummaryIter }
-            else :
-                objs = { obj.key.split('/')[0] for obj in objSummaryIter }
-            if not objs :
-                raise bftp_ex.FTPNoSuchDirError
-            objs = [ obj.rstrip('/') for obj in (objs - {''}) ]
-            objs.sort()
-            return objs
-        
-        
+            self.GetSegments( remotePath, localPath, start, end-start,
+                              dict( extraArgs or {}, IfMatch=head['ETag'] ), maxWorkers=maxWorkers )
+        except ClientError as e :
+            if e.response['Error']['Code'] not in ('412','PreconditionFailed') :
+                raise
+            if restarts >= MAX_RESTARTS :
+                raise bftp_ex.FTPError
+            self.metaCache.Forget( remotePath )
+            Unwrapped( self.AuxGetRangeToFile )( remotePath, localPath, offset, length, extraArgs,
+                                                 maxWorkers, restarts+1 )
 
-    @S3ExceptionWrapper
-    def AuxMkDirInCloud( self,remotePath ) :
-        """Make a directory in an S3 bucket.
 
-        Does nothing if folder or file of this name already exists in the
-        remote working directory.
+    @S3ExceptionWrapper
+    def AuxGetEntryFromCloud( self, entry, localPath, extraArgs ) :
+        """Downloads a file described by a listing entry from an S3 bucket.
+
+        The listing already gives the object's size and ETag.  Small
+        objects are therefore fetched with a single GetObject request,
+        conditional on the ETag being unchanged, instead of going
+        through S3Transfer (which would first issue its own HeadObject).
+        Larger objects, and objects that changed since they were
+        listed, are handed to AuxGetFromCloud.  If there is a transfer
+        journal, every object is fetched with GetResumable instead.
+        Compressed objects are decompressed (see WriteBody).
 
         Arguments:
-           remotePath (str):  directory specifier
+            entry (dict)    :  as generated by IterDir
+            localPath (str) :  where to put it
+            extraArgs (dict):  args for corresponding S3 client operation
 
         No return value.
 
         """
 
-        self.s3Bucket.put_object( Key = remotePath + '/' )
+        if self.transferJournal and entry['etag'] :
+            self.GetResumable( entry['key'], localPath, entry['etag'], entry['size'], extraArgs )
+        elif entry['size'] >= self.s3TransferConfig['multipart_threshold'] or not entry['etag'] :
+            Unwrapped( self.AuxGetFromCloud )( entry['key'], localPath, extraArgs )
+        else :
+            s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+            try :
+                rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=entry['key'],
+                                                IfMatch='"' + entry['etag'] + '"', **s3ObjArgs )
+            except ClientError as e :
+                if e.response['Error']['Code'] not in ('412','PreconditionFailed') :
+                    raise
+                self.metaCache.Forget( entry['key'] )
+                return Unwrapped( self.AuxGetFromCloud )( entry['key'], localPath, extraArgs )
+            with open( localPath, 'wb' ) as fp :
+                self.WriteBody( rsp, fp )
 
 
     @S3ExceptionWrapper
-    def open(self,loc) :
-        """Returns an S3 bucket object, stored in s3Bucket.
+    def AuxGetStreamFromCloud( self, remotePath, stream, extraArgs ) :
+        """Writes the content of an S3 object to a binary stream.
 
-        Attributes:
-            loc (str):  cloud location to connect with
+        The GetObject response body is copied to the stream chunk by
+        chunk, so memory use does not depend on the object's size.
+        Compressed objects are decompressed (see WriteBody).
 
-        No return value.
+        Arguments:
+            remotePath (str):  file to be gotten
+            stream (file)   :  where to write it
+            extraArgs (dict):  args for corresponding S3 client operation
+
+        Returns the number of bytes written.
 
         """
 
-        bucketName = loc.split('/')[0]
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+        rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+        return self.WriteBody( rsp, stream )
 
-        bucketFolder = "/".join( loc.split('/')[1:] ).rstrip('/')
 
-        try :
-            s3 = boto3.resource('s3')
-            s3Client = boto3.client('s3')
-            s3Transfer = S3Transfer(s3Client)
-        except :
-            raise base_ex.FTPError
-        else :
-            bucket = [ a for a in s3.buckets.all() if a.name==bucketName ]
-            if not bucket:
-                raise s3e.S3FTPNoSuchBucketError
-            else :
-                self.cloudStorageLocation = bucketName
-                self.s3Bucket = bucket[0]
-                self.s3Client = s3Client
-                self.s3Transfer = s3Transfer
-                self.remoteWorkingDir = bucketFolder
+    def WriteBody( self, rsp, fp ) :
+        """Auxiliary method:  copy the body of a GetObject response to a binary file.
+
+        The body is copied chunk by chunk.  If the object's ContentEncoding
+        is one of the compression codecs (see compress), the body is
+        decompressed on the way.
+
+        Returns the number of bytes written.
+
+        Raises:
+            S3FTPInvalidCompression:  zstd content without zstandard
+            FTPTruncatedContentError:  the body ended part way through
+
+        """
+
+        codec = rsp.get('ContentEncoding')
+        decompressor = None
+        if codec in CODECS :
+            try :
+                decompressor = Decompressor( codec )
+            except ValueError :
+                rsp['Body'].close()
+                raise s3e.S3FTPInvalidCompression
+        nbytes = 0
+        for chunk in rsp['Body'].iter_chunks( STREAM_CHUNK_SIZE ) :
+            if decompressor :
+                chunk = decompressor.decompress( chunk )
+            fp.write( chunk )
+            nbytes += len(chunk)
+        if decompressor :
+            decompressor.finish()
+        return nbytes
 
 
     @S3ExceptionWrapper
-    def AuxPutInCloud( self, localPath, remotePath, extraArgs ) :
-        """Uploads a file to an S3 bucket.
+    def AuxGetBytesFromCloud( self, remotePath, extraArgs ) :
+        """Reads the content of an S3 object into memory.
 
-        This is an auxiliary method that encapsulates S3-specific
-        functionality.  
+        The buffer is allocated once, at the size given by the
+        GetObject response, and the body is read into it.  Compressed
+        objects (see compress) are decompressed (see WriteBody).
 
         Arguments:
-            localPath (str)  : file to be transferred to cloud
-            remotePath (str) : where to put it
-            extraArgs (dict) : for S3Transfer object
-        
-        No return value.
+            remotePath (str):  file to be gotten
+            extraArgs (dict):  args for corresponding S3 client operation
+
+        Returns a bytearray.
 
         """
 
-        s3ObjArgs = None
-        if self.s3DefaultObjParams :
-            s3ObjArgs = { key:value for key,value in self.s3DefaultObjParams.items() if key in S3Transfer.ALLOWED_UPLOAD_ARGS}
-            if extraArgs :
-                s3ObjArgs.update( { key:value for key,value in extraArgs.items() if key in S3Transfer.ALLOWED_UPLOAD_ARGS } )
-        elif extraArgs :
-            s3ObjArgs = { key:value for key,value in extraArgs.items() if key in S3Transfer.ALLOWED_UPLOAD_ARGS } 
-        self.s3Transfer.upload_file( localPath, self.cloudStorageLocation, remotePath, extra_args=s3ObjArgs )
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+        rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+        if rsp.get('ContentEncoding') in CODECS :
+            out = io.BytesIO()
+            self.WriteBody( rsp, out )
+            return bytearray( out.getbuffer() )
+        buffer = bytearray( rsp['ContentLength'] )
+        ReadInto( rsp['Body'], memoryview(buffer) )
+        return buffer
 
 
     @S3ExceptionWrapper
-    def AuxRmDirFromCloud( self,remotePath ) :
-        """ Remove S3 folder.
+    def AuxGetRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """Reads part of an S3 object into memory with a ranged GetObject.
+
+        Only the part requested is transferred:  a negative offset is
+        sent as a suffix range (the last -offset bytes), so reading the
+        tail of an object needs no HeadObject request.  A negative
+        offset with a length shorter than the tail needs the object's
+        size, given by HeadObject, to send an explicit range instead.
+        The body is closed once read, releasing the connection.
+        Besides the usual download arguments, extraArgs may hold an
+        IfMatch ETag.  Compressed objects (see compress) are not
+        decompressed.
 
         Arguments:
-            remotePath (str) : directory to be removed
-        
-        No return value.
+            remotePath (str):  file to be read
+            offset (int)    :  position of the first byte wanted; if
+                               negative, counts from the end
+            length (int)    :  number of bytes wanted, or None for the rest
+            extraArgs (dict):  args for corresponding S3 client operation
+
+        Returns a bytearray.
 
         """
 
-        objs = self.s3Bucket.objects.filter( Prefix=remotePath ) 
-        objs = [ obj for obj in objs ]
-        objs[0].delete()
+        if length is not None and length <= 0 :
+            return bytearray()
+        s3ObjArgs = self.MergeObjArgs( extraArgs, list(S3Transfer.ALLOWED_DOWNLOAD_ARGS) + ['IfMatch'] ) or {}
+        if offset < 0 and length is not None and length < -offset :
+            head = self.HeadObject( remotePath )
+            if head is None :
+                raise bftp_ex.FTPNoSuchFileError
+            (offset,end) = ClampRange( offset, length, head['ContentLength'] )
+            if end <= offset :
+                return bytearray()
+            length = end - offset
+        if offset < 0 :
+            s3ObjArgs['Range'] = 'bytes=%d' % offset
+        else :
+            s3ObjArgs['Range'] = 'bytes=%d-%s' % ( offset, '' if length is None else offset+length-1 )
+        try :
+            rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+        except ClientError as e :
+            if e.response['Error']['Code'] not in ('416','InvalidRange') :
+                raise
+            return bytearray()
+        try :
+            buffer = bytearray( rsp['ContentLength'] if length is None else min( length, rsp['ContentLength'] ) )
+            ReadInto( rsp['Body'], memoryview(buffer) )
+        finally :
+            rsp['Body'].close()
+        return buffer
 
 
-    @S3ExceptionWrapper
-    def IsDir(self,loc) :
-        """ Auxiliary method:  check of specified S3 object is a directory.
+    def AuxIterRangeFromCloud( self, remotePath, offset, length, extraArgs ) :
+        """Streams part of an S3 object with a ranged GetObject.
 
-        An S3 directory is a location that ends with a / character.
-        This method assumes loc is a valid S3 location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function below.
+        The body is read in STREAM_CHUNK_SIZE chunks as they arrive.
+        Besides the usual download arguments, extraArgs may hold an
+        IfMatch ETag.  Compressed objects (see compress) are not
+        decompressed.
 
-        Returns a boolean.
+        Arguments:
+            remotePath (str):  file to be read
+            offset (int)    :  position of the first byte wanted
+            length (int)    :  number of bytes wanted
+            extraArgs (dict):  args for corresponding S3 client operation
+
+        Generates bytes chunks.
 
         """
 
-        objSummaryIter = self.s3Bucket.objects.filter( Prefix=loc )
-        objs = [ obj.key for obj in objSummaryIter ]
-        objs.sort()
-        if loc=='' or (len(objs)==0 and loc=='/') : # bucket root dir
-            return True
-        elif len(objs)==0 : # no such location, thus not a dir
-            return False
-        elif (loc==objs[0] and objs[0][-1]=='/') or (loc+'/')==objs[0] : # is a dir
-            return True
-        else :  # not a dir
-            return False
+        if length <= 0 :
+            return
+        s3ObjArgs = self.MergeObjArgs( extraArgs, list(S3Transfer.ALLOWED_DOWNLOAD_ARGS) + ['IfMatch'] ) or {}
+        s3ObjArgs['Range'] = 'bytes=%d-%d' % ( offset, offset+length-1 )
+        try :
+            rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+        except ClientError as e :
+            if e.response['Error']['Code'] not in ('416','InvalidRange') :
+                raise
+            return
+        try :
+            yield from rsp['Body'].iter_chunks( STREAM_CHUNK_SIZE )
+        finally :
+            rsp['Body'].close()
 
 
     @S3ExceptionWrapper
-    def IsFile(self,loc) :
-        """ Auxiliary method:  check if specified S3 file object is valid.
-
-        Is a file if there is only one S3 object of this name with nonzero size.
-        This method assumes loc is a valid S3 location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function.
+    def AuxGetSizeFromCloud( self, remotePath ) :
+        """Returns the size of an S3 object, given by a HeadObject request.
 
-        Returns a boolean.
+        Raises:
+            FTPNoSuchFileError
 
         """
 
-        objSummaryIter = self.s3Bucket.objects.filter( Prefix=loc )
-        objs = [ obj.size for obj in objSummaryIter ]
-        if len(objs)==1 and objs[0]>0 :
-            return True
-        else :
-            return False
+        head = self.HeadObject( remotePath )
+        if head is None :
+            raise bftp_ex.FTPNoSuchFileError
+        return head['ContentLength']
 
 
     @S3ExceptionWrapper
-    def DirEmpty(self,loc) :
-        """ Auxiliary method:  check if specified directory is empty.
+    def AuxGetIntoFromCloud( self, remotePath, view, extraArgs ) :
+        """Reads the content of an S3 object into a buffer.
 
-        This method assumes loc is a valid S3 location identifier.
-        Assumes loc is an absolute path, as returned by the
-        AbsolutePath auxiliary function.
+        Compressed objects (see compress) are decompressed into the
+        buffer (see WriteBody).
 
-        Returns a boolean.
+        Arguments:
+            remotePath (str)  :  file to be gotten
+            view (memoryview) :  byte view of the buffer
+            extraArgs (dict)  :  args for corresponding S3 client operation
+
+        Returns the number of bytes read.
+
+        Raises:
+            FTPBufferTooSmallError
 
         """
 
-        if self.IsDir(loc) :
-            objSummaryIter = self.s3Bucket.objects.filter( Prefix=loc )
-            objs = [ obj.size for obj in objSummaryIter ]
-            if len(objs)==1 and objs[0]==0 :
-                return True
-            else :
-                return False
-        else :
-            raise base_ex.FTPNoSuchDirError
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+        rsp = self.s3Client.get_object( Bucket=self.cloudStorageLocation, Key=remotePath, **s3ObjArgs )
+        if rsp.get('ContentEncoding') in CODECS :
+            try :
+                return self.WriteBody( rsp, BufferWriter(view) )
+            except bftp_ex.FTPBufferTooSmallError :
+                rsp['Body'].close()
+                raise
+        if rsp['ContentLength'] > len(view) :
+            rsp['Body'].close()
+            raise bftp_ex.FTPBufferTooSmallError
+        return ReadInto( rsp['Body'], view[:rsp['ContentLength']] )
 
 
     @S3ExceptionWrapper
-    def AbsolutePath(self,f) :
-        """ Auxiliary method:  transform relative path to absolute path.
+    def ls(self) :
+        """Lists contents of current working folder in an S3 bucket.
 
-        This function normalizes paramter f to an absolute path
-        specified relative to the root of a bucket location.  Note that
-        result of this function has no trailing forward slash character.  
-        Also, the root directory of a bucket is represented by setting
-        the return parameter to the empty string.
+        Only the entries directly inside the folder are listed, with
+        subdirectories shown once each.  Use iter_ls to avoid holding
+        the whole listing of a very large folder in memory.
 
-        Parameter f is considered an absolute path if it begins with a /
-        character.  Otherwise it is relative to the remote working directory.
+        Returns a sorted list.
 
-        As distinguished from an absolute path, the absolute
-        location of an S3 object is obtained by appending the bucket
-        name to the absolute path.  
+        """
 
-        Returns a string.
+        return sorted( self.iter_ls() )
 
-        """
 
-        if f[0]!='/' and self.remoteWorkingDir :
-            remotePath = self.remoteWorkingDir + '/' + f.rstrip('/')
-        else :
-            remotePath = f.lstrip('/').rstrip('/')
-        remotePath = os.path.normpath(remotePath).replace('\\','/')  # posix
-        if remotePath=='.' : # root folder in bucket
-            remotePath = ''
-        return remotePath
+    def iter_ls(self) :
+        """Generates contents of current working folder in an S3 bucket.
 
+        Yields entry names one page (up to 1000 entries) at a time,
+        in S3 key order.
 
+        Raises:
+            FTPNoSuchDirError
 
-    ###################################################################
-    # Methods for specifying/managing S3 object-related parameters
-    ###################################################################
+        """
 
+        for entry in self.IterDir( self.remoteWorkingDir ) :
+            yield entry['name']
 
-    @S3ExceptionWrapper
-    def LoadS3DefaultObjParams( self, fileName, isRelative=True ) :
-        """Loads default S3 object parameters from a JSON file.
 
-        Loads default S3 object parameters from the specified
-        file.  The file can contain a partial or complete set of
-        S3 object-related parameters.  If it's a partial set, then
-        only overwrite the corresponding object defaults, leaving
-        the others unchanged.  The file is read from the local
-        working directory, unless isRelative is set to False.
+    def IterDir(self,loc) :
+        """ Auxiliary method:  generate the entries directly inside an S3 folder.
 
-        Arguments:
-            fileName (str)       :  file name to read S3 parameters
-            isRelative (boolean) :  file is relative to local working dir
+        Pages through ListObjectsV2 with a / delimiter, so that the
+        cost depends on the number of entries in the folder and not
+        on the size of the subtree beneath it.  Each entry is a
+        dictionary with keys name (relative to loc), key (absolute
+        path), type (OBJ_FILE or OBJ_DIR), size, etag and mtime.
+        The folder's own directory marker is skipped.  Complete
+        listings are kept in the metadata cache, unless the client
+        changed the folder while it was being listed (see
+        MetadataCache.Generation).  Assumes loc is an
+        absolute path, as returned by the AbsolutePath auxiliary
+        function.
 
         Raises:
-            OSError
-            FTPInvalidObjectParameter
+            FTPNoSuchDirError
 
-        No return value.
+        """
+
+        cached = self.metaCache.GetListing( loc )
+        if cached is not MISS :
+            for entry in cached :
+                yield entry
+            return
+
+        generation = self.metaCache.Generation( loc )
+        prefix = loc + '/' if loc else ''
+        found = loc==''
+        listing = []
+        paginator = self.s3Client.get_paginator('list_objects_v2')
+        pages = paginator.paginate( Bucket=self.cloudStorageLocation, Prefix=prefix, Delimiter='/',
+                                    PaginationConfig={'PageSize':1000} )
+        for page in pages :
+            entries = []
+            for p in page.get('CommonPrefixes',[]) :
+                key = p['Prefix'].rstrip('/')
+                entries.append( { 'name':key[len(prefix):], 'key':key, 'type':OBJ_DIR,
+                                  'size':0, 'etag':None, 'mtime':None } )
+            for obj in page.get('Contents',[]) :
+                found = True
+                if obj['Key']==prefix :  # directory marker
+                    continue
+                entries.append( { 'name':obj['Key'][len(prefix):], 'key':obj['Key'], 'type':OBJ_FILE,
+                                  'size':obj['Size'], 'etag':obj['ETag'].strip('"'),
+                                  'mtime':obj['LastModified'] } )
+            if entries :
+                found = True
+            entries.sort( key=lambda entry: entry['key'] )
+            if listing != None :
+                listing.extend( dict(entry) for entry in entries )
+                if len(listing) > self.metaCache.maxListing :
+                    listing = None
+            for entry in entries :
+                yield entry
+        if not found :
+            self.metaCache.PutType( loc, OBJ_NONE, generation )
+            raise bftp_ex.FTPNoSuchDirError
+        if listing != None :
+            self.metaCache.PutListing( loc, listing, generation )
+
+
+    def IterTree(self,loc,withMarker=False) :
+        """ Auxiliary method:  generate every entry beneath an S3 folder.
+
+        Pages through a single ListObjectsV2 listing of the loc/ prefix
+        without a delimiter, so the whole subtree costs one request
+        per 1000 keys.  Files are yielded as OBJ_FILE entries and
+        directory markers as OBJ_DIR entries (directories that have
+        no marker are implied by the names of the files beneath them).
+        Entry names are relative to loc.  The marker of loc itself is
+        skipped, unless withMarker is set:  it is then yielded as an
+        OBJ_DIR entry named ''.  Assumes loc is an absolute path, as
+        returned by the AbsolutePath auxiliary function.
 
         """
 
-        if isRelative==True :
-            localFile = os.path.basename(fileName)
-            fileName = self.localWorkingDir + '/' + localFile
-        fp = open( fileName, 'r' )
-        s3Params = json.load( fp )
-        fp.close()
-        if self.S3ParamsAreValid( s3Params ) :
-            self.s3DefaultObjParams = s3Params
-        else :
-            raise s3e.S3FTPInvalidObjectParameter
+        prefix = loc + '/' if loc else ''
+        paginator = self.s3Client.get_paginator('list_objects_v2')
+        pages = paginator.paginate( Bucket=self.cloudStorageLocation, Prefix=prefix,
+                                    PaginationConfig={'PageSize':1000} )
+        for page in pages :
+            for obj in page.get('Contents',[]) :
+                if obj['Key']==prefix :  # directory marker of loc itself
+                    if withMarker :
+                        yield { 'name':'', 'key':loc, 'type':OBJ_DIR,
+                                'size':0, 'etag':None, 'mtime':obj['LastModified'] }
+                elif obj['Key'].endswith('/') :
+                    key = obj['Key'].rstrip('/')
+                    yield { 'name':key[len(prefix):], 'key':key, 'type':OBJ_DIR,
+                            'size':0, 'etag':None, 'mtime':obj['LastModified'] }
+                else :
+                    yield { 'name':obj['Key'][len(prefix):], 'key':obj['Key'], 'type':OBJ_FILE,
+                            'size':obj['Size'], 'etag':obj['ETag'].strip('"'),
+                            'mtime':obj['LastModified'] }
+        
 
 
     @S3ExceptionWrapper
-    def SaveS3DefaultObjParams( self, fileName, isRelative=True ) :
-        """Stores default S3 object parameters to a JSON file.
+    def AuxMkDirInCloud( self,remotePath ) :
+        """Make a directory in an S3 bucket.
 
-        Save the default S3 object parameters to the specified
-        file in JSON format.  The file is saved to the current
-        local working directory, unless isRelative is set to False.
+        Does nothing if folder or file of this name already exists in the
+        remote working directory.
 
         Arguments:
-            fileName (str) :        file name to store S3 parameters
-            isRelative (boolean) :  file is relative to local working dir
-
-        Raises:
-            OSError
+           remotePath (str):  directory specifier
 
         No return value.
 
         """
 
-        if isRelative==True :
-            localFile = os.path.basename(fileName)
-            fileName = self.localWorkingDir + '/' + localFile
-        fp = open( fileName, 'w' )
-        json.dump( self.S3DefaultObjParams,fp )
-        fp.close()
+        self.s3Client.put_object( Bucket=self.cloudStorageLocation, Key=remotePath + '/' )
+        self.metaCache.Created( remotePath, { 'key':remotePath, 'type':OBJ_DIR, 'size':0,
+                                              'etag':None, 'mtime':None } )
 
 
     @S3ExceptionWrapper
-    def GetS3DefaultObjParams(self) :
-        """Returns current default S3 parameters (a dictionary)."""
-        
-        return self.s3DefaultObjParams
+    def open(self,loc) :
+        """Connects to an S3 bucket.
 
+        Checks that the bucket exists with a single HeadBucket request
+        (none if its region is already known) and binds the client to
+        the bucket's region.  Does not need permission to list the
+        buckets of the account.
 
-    @S3ExceptionWrapper
-    def SetS3DefaultObjParams( self, s3Params ) :
-        """Sets current default S3 parameters to user-specified values.
+        Attributes:
+            loc (str):  cloud location to connect with
+
+        No return value.
+
+        Raises:
+            S3FTPNoSuchBucketError
+            FTPError
+
+        """
+
+        bucketName = loc.split('/')[0]
+
+        bucketFolder = "/".join( loc.split('/')[1:] ).rstrip('/')
+
+        if bucketName not in self.bucketRegions :
+            self.bucketRegions[ bucketName ] = self.BucketRegion( bucketName )
+        s3Client = self.ClientFor( self.bucketRegions[bucketName] )
+        try :
+            s3Transfer = S3Transfer( s3Client, config=self.TransferConfigFor(None) )
+        except Exception :
+            raise bftp_ex.FTPError
+        self.cloudStorageLocation = bucketName
+        self.bucketResource = None
+        self.s3Client = s3Client
+        self.RetireTransfers()
+        self.s3Transfer = s3Transfer
+        self.metaCache.Clear()
+        self.remoteWorkingDir = bucketFolder
+
+
+    @property
+    def s3Bucket( self ) :
+        """ The boto3 Bucket resource of the open bucket, or None.
+
+        Created on first use, as loading the resource model is slow and
+        the client itself does not need it.
+
+        """
+
+        if self.cloudStorageLocation is None :
+            return None
+        if self.bucketResource is None :
+            self.bucketResource = self.Session().resource( 's3',
+                region_name=self.s3Client.meta.region_name ).Bucket( self.cloudStorageLocation )
+        return self.bucketResource
+
+
+    def BucketRegion( self, bucketName ) :
+        """ Auxiliary method:  find the region of a bucket with HeadBucket.
+
+        S3 gives the region in a response header, even when refusing
+        the request because the bucket is in another region or the
+        caller may not list it.
+
+        Returns the region name.
+
+        Raises:
+            S3FTPNoSuchBucketError
+            FTPError
+
+        """
+
+        s3Client = self.ClientFor(None)
+        try :
+            rsp = s3Client.head_bucket( Bucket=bucketName )
+        except ClientError as e :
+            if e.response.get('Error',{}).get('Code') in ( '404', 'NoSuchBucket' ) :
+                raise s3e.S3FTPNoSuchBucketError
+            rsp = e.response
+        region = rsp.get('ResponseMetadata',{}).get('HTTPHeaders',{}).get('x-amz-bucket-region')
+        if region is None :
+            raise s3e.S3FTPNoSuchBucketError
+        return region
+
+
+    def Session( self ) :
+        """ Auxiliary method:  the boto3 session, created on first use.
+
+        Imports boto3 if it is not yet loaded.
+
+        """
+
+        if self.boto3Session is None :
+            ImportBoto3()
+            self.boto3Session = boto3.session.Session()
+        return self.boto3Session
+
+
+    def ClientFor( self, region ) :
+        """ Auxiliary method:  S3 client for a region (None for the default).
+
+        Clients are kept for the life of the session, so their
+        connection pools survive close and open.
+
+        """
+
+        if region not in self.s3Clients :
+            session = self.Session()
+            try :
+                self.s3Clients[ region ] = session.client( 's3', region_name=region,
+                    config=Config(max_pool_connections=self.maxPoolConnections) )
+            except Exception :
+                raise bftp_ex.FTPError
+        return self.s3Clients[ region ]
+
+
+    @S3ExceptionWrapper
+    def AuxPutInCloud( self, localPath, remotePath, extraArgs ) :
+        """Uploads a file to an S3 bucket.
+
+        This is an auxiliary method that encapsulates S3-specific
+        functionality.  If compression is on (see CompressionFor), the
+        file is sent with PutCompressed.  Otherwise, files large enough
+        for a multipart upload are sent with PutResumable if there is a
+        transfer journal, or else with PutMapped if the mmap_upload
+        setting is on.
+
+        Arguments:
+            localPath (str)  : file to be transferred to cloud
+            remotePath (str) : where to put it
+            extraArgs (dict) : for S3Transfer object
+        
+        No return value.
+
+        """
+
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_UPLOAD_ARGS )
+        size = os.path.getsize(localPath)
+        codec = self.CompressionFor( extraArgs )
+        if codec :
+            self.PutCompressed( localPath, remotePath, extraArgs, size, codec )
+            return
+        if self.transferJournal and size >= self.s3TransferConfig['multipart_threshold'] :
+            self.PutResumable( localPath, remotePath, extraArgs, size )
+        elif self.s3TransferConfig['mmap_upload'] and size >= self.s3TransferConfig['multipart_threshold'] :
+            self.PutMapped( localPath, remotePath, extraArgs, size )
+        else :
+            with self.TransferFor( size ) as s3Transfer :
+                s3Transfer.upload_file( localPath, self.cloudStorageLocation, remotePath, extra_args=s3ObjArgs )
+        self.metaCache.Created( remotePath, { 'key':remotePath, 'type':OBJ_FILE, 'size':size,
+                                              'etag':None, 'mtime':None } )
+
+
+    def PutCompressed( self, localPath, remotePath, extraArgs, size, codec ) :
+        """Auxiliary method:  upload a file, compressing it on the way.
+
+        The file is compressed in blocks of COMPRESS_BLOCK_SIZE (see
+        CompressBlock), each by CpuCall, so that with a CPU pool (see
+        the cpu command) they are compressed in worker processes.  The
+        compressed blocks are uploaded as a stream by AuxPutStreamInCloud,
+        so nothing is staged on disk and only the parts in flight are
+        held in memory.  The object's ContentEncoding is set to the
+        codec, and the size and MD5 digest of the file are stored in
+        its metadata (see META_SIZE and META_MD5) for ContentSize and
+        AuxSameContent.  These uploads are not recorded in the transfer
+        journal.
+
+        Arguments:
+            localPath (str)  : file to be transferred to cloud
+            remotePath (str) : where to put it
+            extraArgs (dict) : per-command S3 object parameters
+            size (int)       : file size
+            codec (str)      : gzip or zstd
+
+        Returns the number of (compressed) bytes uploaded.
+
+        """
+
+        localPath = os.path.abspath( localPath )
+        s3ObjArgs = dict( extraArgs or {} )
+        s3ObjArgs['ContentEncoding'] = codec
+        metadata = dict( ( self.MergeObjArgs( extraArgs, ['Metadata'] ) or {} ).get( 'Metadata' ) or {} )
+        metadata[META_SIZE] = str( size )
+        metadata[META_MD5] = self.CpuCall( FileMD5, localPath )
+        s3ObjArgs['Metadata'] = metadata
+        blocks = ( self.CpuCall( CompressBlock, localPath, offset, COMPRESS_BLOCK_SIZE, codec )
+                   for offset in range( 0, max(size,1), COMPRESS_BLOCK_SIZE ) )
+        return Unwrapped( self.AuxPutStreamInCloud )( ChunkReader(blocks), remotePath, s3ObjArgs )
+
+
+    def PutMapped( self, localPath, remotePath, extraArgs, size ) :
+        """Auxiliary method:  upload a file in parts read from a memory map.
+
+        S3Transfer reads each part into a new bytes object, so a large
+        upload allocates and frees one part-sized buffer per part and
+        holds up to max_io_queue of them.  Here the file is mapped
+        read-only instead, and the body of each part is a read-only
+        file over a slice of the mapping (see BufferReader), so parts
+        are read from the page cache as they are sent, without being
+        copied into Python objects.  The parts are sent by up to
+        max_concurrency threads (see UploadParts), with the part size
+        TransferConfigFor chooses.  Where the platform allows it, the
+        kernel is told the mapping will be read sequentially, and the
+        pages of each part are dropped from the process once the part
+        is sent, so its resident memory stays at about the parts in
+        flight however large the file.  If the upload fails, it is
+        aborted.  The file must not be truncated during the upload:
+        reading a page of a mapping past the end of its file kills
+        the process.
+
+        Arguments:
+            localPath (str)  : file to be transferred to cloud
+            remotePath (str) : where to put it
+            extraArgs (dict) : per-command S3 object parameters
+            size (int)       : file size
+
+        No return value.
+
+        """
+
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_UPLOAD_ARGS ) or {}
+        partSize = self.TransferConfigFor(size).multipart_chunksize
+        with open( localPath, 'rb' ) as fp :
+            mapped = mmap.mmap( fp.fileno(), size, access=mmap.ACCESS_READ )
+        view = memoryview( mapped )
+        canAdvise = hasattr( mapped, 'madvise' ) and hasattr( mmap, 'MADV_DONTNEED' )
+        if canAdvise :
+            mapped.madvise( mmap.MADV_SEQUENTIAL )
+
+        def PartSent( number ) :
+            start = (number-1) * partSize
+            start -= start % mmap.PAGESIZE
+            mapped.madvise( mmap.MADV_DONTNEED, start, min( number*partSize, size ) - start )
+
+        try :
+            uploadId = self.s3Client.create_multipart_upload( Bucket=self.cloudStorageLocation,
+                                                              Key=remotePath, **s3ObjArgs )['UploadId']
+            parts = ( ( number, BufferReader( view[offset:offset+partSize] ) )
+                      for (number,offset) in enumerate( range(0,size,partSize), 1 ) )
+            try :
+                self.UploadParts( remotePath, uploadId, parts, {}, s3ObjArgs,
+                                  partSent=PartSent if canAdvise else None )
+            except BaseException :
+                self.AbortUpload( remotePath, uploadId )
+                raise
+        finally :
+            view.release()
+            try :
+                mapped.close()
+            except BufferError :
+                # the traceback of a failed part still holds its slice;
+                # the mapping is closed when that is collected
+                pass
+
+
+    @S3ExceptionWrapper
+    def AuxPutBytesInCloud( self, view, remotePath, extraArgs ) :
+        """Uploads a buffer to an S3 bucket.
+
+        Request bodies are read-only files over slices of the buffer
+        (see BufferReader), so the content is not copied before being
+        sent.  Content shorter than multipart_threshold is sent with a
+        single PutObject request, and longer content as a multipart
+        upload with the part size put would use.  If the upload fails,
+        it is aborted.
+
+        Arguments:
+            view (memoryview) : byte view of the content
+            remotePath (str)  : where to put it
+            extraArgs (dict)  : for S3 client operations
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_UPLOAD_ARGS ) or {}
+        size = len(view)
+        if size < self.s3TransferConfig['multipart_threshold'] :
+            self.s3Client.put_object( Bucket=self.cloudStorageLocation, Key=remotePath,
+                                      Body=BufferReader(view), **s3ObjArgs )
+        else :
+            partSize = self.TransferConfigFor(size).multipart_chunksize
+            uploadId = self.s3Client.create_multipart_upload( Bucket=self.cloudStorageLocation,
+                                                              Key=remotePath, **s3ObjArgs )['UploadId']
+            parts = ( ( number, BufferReader( view[offset:offset+partSize] ) )
+                      for (number,offset) in enumerate( range(0,size,partSize), 1 ) )
+            try :
+                self.UploadParts( remotePath, uploadId, parts, {}, s3ObjArgs )
+            except BaseException :
+                self.AbortUpload( remotePath, uploadId )
+                raise
+        self.metaCache.Created( remotePath, { 'key':remotePath, 'type':OBJ_FILE, 'size':size,
+                                              'etag':None, 'mtime':None } )
+        return size
+
+
+    @S3ExceptionWrapper
+    def AuxPutStreamInCloud( self, stream, remotePath, extraArgs ) :
+        """Uploads the content of a binary stream to an S3 bucket.
+
+        Content shorter than multipart_threshold is sent with a single
+        PutObject request.  Longer content is sent as a multipart
+        upload, reading one part at a time from the stream and sending
+        up to max_concurrency parts at once, so that memory use is
+        bounded and nothing is staged on disk.  As the length is not
+        known in advance, parts start at multipart_chunksize and double
+        in size every STREAM_PART_DOUBLING parts.  If the upload fails,
+        it is aborted.
+
+        Arguments:
+            stream (file)    : where to read the content
+            remotePath (str) : where to put it
+            extraArgs (dict) : for S3 client operations
+
+        Returns the number of bytes uploaded.
+
+        """
+
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_UPLOAD_ARGS ) or {}
+        config = self.s3TransferConfig
+        first = ReadFully( stream, max(config['multipart_threshold'],MIN_PART_SIZE) )
+        if len(first) < config['multipart_threshold'] :
+            self.s3Client.put_object( Bucket=self.cloudStorageLocation, Key=remotePath, Body=first, **s3ObjArgs )
+            nbytes = len(first)
+        else :
+            uploadId = self.s3Client.create_multipart_upload( Bucket=self.cloudStorageLocation,
+                                                              Key=remotePath, **s3ObjArgs )['UploadId']
+            sent = [0]
+            def Parts() :
+                (pending,number) = (first,1)
+                while True :
+                    partSize = min( MAX_PART_SIZE, max(config['multipart_chunksize'],MIN_PART_SIZE) *
+                                                   2 ** ((number-1)//STREAM_PART_DOUBLING) )
+                    if len(pending) < partSize :
+                        pending += ReadFully( stream, partSize-len(pending) )
+                    (body,pending) = (pending[:partSize],pending[partSize:])
+                    if not body and number > 1 :
+                        return
+                    sent[0] += len(body)
+                    yield ( number, body )
+                    number += 1
+            try :
+                self.UploadParts( remotePath, uploadId, Parts(), {}, s3ObjArgs )
+            except BaseException :
+                self.AbortUpload( remotePath, uploadId )
+                raise
+            nbytes = sent[0]
+        self.metaCache.Created( remotePath, { 'key':remotePath, 'type':OBJ_FILE, 'size':nbytes,
+                                              'etag':None, 'mtime':None } )
+        return nbytes
+
+
+    @S3ExceptionWrapper
+    def AuxRmDirFromCloud( self,remotePath ) :
+        """ Remove S3 folder.
+
+        Arguments:
+            remotePath (str) : directory to be removed
+        
+        No return value.
+
+        """
+
+        self.s3Client.delete_object( Bucket=self.cloudStorageLocation, Key=remotePath + '/' )
+        self.metaCache.Removed( remotePath, OBJ_DIR )
+
+
+    @S3ExceptionWrapper
+    def AuxRmTreeFromCloud( self, remotePath, maxWorkers, report ) :
+        """ Remove S3 folder and everything beneath it.
+
+        Every key under the folder, including directory markers and the
+        folder's own marker if it has one, is found with one paginated
+        listing and deleted in DeleteObjects batches, so no
+        per-directory requests are needed.
+
+        Arguments:
+            remotePath (str)       : directory to be removed
+            maxWorkers (int)       : number of concurrent requests
+            report (TransferReport): records successes and failures
+
+        Returns the report.
+
+        """
+
+        def Keys() :
+            for entry in self.IterTree( remotePath, withMarker=True ) :
+                yield entry['key'] + '/' if entry['type'] == OBJ_DIR else entry['key']
+        try :
+            return Unwrapped( self.AuxDeleteManyFromCloud )( Keys(), maxWorkers, report )
+        finally :
+            self.metaCache.RemovedTree( remotePath )
+
+
+    def AuxSameContent( self, localPath, entry ) :
+        """ Check whether a local file has the same content as an S3 object.
+
+        The ETag of an object uploaded in one piece is the MD5 digest
+        of its content.  That of an object uploaded in N parts is the
+        MD5 digest of the parts' binary digests followed by -N, which
+        depends on the part size used.  The part sizes tried are the
+        one the current transfer settings would use, the default one,
+        and the smallest whole number of MiB giving N parts.  Objects
+        whose ETag is not an MD5 digest (for example, those encrypted
+        with SSE-KMS) never match.  Compressed objects are compared by
+        the digest of their content stored in their metadata (see
+        OriginalContent).  Digests are remembered in the sync manifest,
+        if there is one.
+
+        Arguments:
+            localPath (str) : local file
+            entry (dict)    : S3 object, as generated by IterTree
+
+        Returns a boolean.
+
+        """
+
+        etag = entry['etag']
+        LocalMD5 = lambda : self.LocalDigest( localPath, 'md5', lambda : self.CpuCall(FileMD5,localPath) )
+        if not etag :
+            return False
+        elif self.SameETag( localPath, entry, LocalMD5 ) :
+            return True
+        original = self.OriginalContent( entry )
+        return original is not None and original[1] == LocalMD5()
+
+
+    def SameETag( self, localPath, entry, LocalMD5 ) :
+        """ Auxiliary method:  check a local file against the ETag of an S3 object.
+
+        See AuxSameContent.  LocalMD5 returns the MD5 digest of the file.
+
+        Returns a boolean.
+
+        """
+
+        etag = entry['etag']
+        if '-' not in etag :
+            return LocalMD5() == etag
+        try :
+            parts = int( etag.split('-')[1] )
+        except ValueError :
+            return False
+        size = entry['size']
+        candidates = [ self.TransferConfigFor(size).multipart_chunksize,
+                       DEFAULT_TRANSFER_CONFIG['multipart_chunksize'],
+                       MIB * math.ceil( size / parts / MIB ) ]
+        for partSize in dict.fromkeys(candidates) :
+            if partSize <= 0 or math.ceil(size/partSize) != parts :
+                continue
+            Compute = lambda : self.CpuCall( MultipartETag, localPath, size, partSize )
+            if self.LocalDigest( localPath, 'etag-%d' % partSize, Compute ) == etag :
+                return True
+        return False
+
+
+    def ContentSize( self, entry ) :
+        """ Auxiliary method:  size of the content of an S3 object.
+
+        For compressed objects, this is the size of the original file
+        (see OriginalContent); otherwise it is the size in the entry.
+
+        Returns the size in bytes.
+
+        """
+
+        original = self.OriginalContent( entry )
+        return entry['size'] if original is None else original[0]
+
+
+    def OriginalContent( self, entry ) :
+        """ Auxiliary method:  size and digest of the file a compressed object holds.
+
+        Listings do not tell whether an object is compressed, so this
+        takes a HeadObject request, whose result is remembered in the
+        entry (under 'original').
+
+        Arguments:
+            entry (dict) :  S3 object, as generated by IterTree
+
+        Returns a (size, MD5 digest) tuple, or None if the object is
+        not compressed (or was compressed without recording them).
+
+        """
+
+        if 'original' not in entry :
+            head = self.HeadObject( entry['key'] ) or {}
+            metadata = head.get('Metadata') or {}
+            entry['original'] = None
+            if head.get('ContentEncoding') in CODECS and META_SIZE in metadata :
+                entry['original'] = ( int(metadata[META_SIZE]), metadata.get(META_MD5) )
+        return entry['original']
+
+
+    @S3ExceptionWrapper
+    def ObjectType(self,loc) :
+        """ Auxiliary method:  classify an S3 location as file or directory.
+
+        A file is an object whose key is exactly loc.  A directory is
+        any location with at least one key beneath loc/, either a
+        directory marker created by mkdir or an implied directory.
+        This costs at most two requests (a HeadObject and a one-key
+        listing), no matter how many objects live below loc.
+        This method assumes loc is a valid S3 location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns OBJ_FILE, OBJ_DIR or OBJ_NONE.
+
+        """
+
+        if loc=='' :  # bucket root dir
+            return OBJ_DIR
+        objType = self.metaCache.GetType( loc )
+        if objType is MISS :
+            if self.HeadObject(loc) != None :
+                objType = OBJ_FILE
+            elif self.ListPrefix(loc + '/', 1) :
+                objType = OBJ_DIR
+            else :
+                objType = OBJ_NONE
+            self.metaCache.PutType( loc, objType )
+        return objType
+
+
+    @S3ExceptionWrapper
+    def IsDir(self,loc) :
+        """ Auxiliary method:  check of specified S3 object is a directory.
+
+        An S3 directory is a location with at least one key beneath
+        loc/, so a single one-key listing answers the question.
+        This method assumes loc is a valid S3 location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function below.
+
+        Returns a boolean.
+
+        """
+
+        if loc=='' :  # bucket root dir
+            return True
+        objType = self.metaCache.GetType( loc )
+        if objType is not MISS :
+            return objType == OBJ_DIR
+        elif self.ListPrefix(loc + '/', 1) :
+            self.metaCache.PutType( loc, OBJ_DIR )
+            return True
+        else :
+            return False
+
+
+    @S3ExceptionWrapper
+    def IsFile(self,loc) :
+        """ Auxiliary method:  check if specified S3 file object is valid.
+
+        Is a file if an S3 object with exactly this key exists.  Costs
+        a single HeadObject request.
+        This method assumes loc is a valid S3 location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns a boolean.
+
+        """
+
+        if loc=='' :  # bucket root dir
+            return False
+        objType = self.metaCache.GetType( loc )
+        if objType is not MISS :
+            return objType == OBJ_FILE
+        elif self.HeadObject(loc) != None :
+            self.metaCache.PutType( loc, OBJ_FILE )
+            return True
+        else :
+            return False
+
+
+    @S3ExceptionWrapper
+    def DirEmpty(self,loc) :
+        """ Auxiliary method:  check if specified directory is empty.
+
+        Lists at most two keys beneath loc/.  The directory is empty
+        if the only key found is its own directory marker.
+        This method assumes loc is a valid S3 location identifier.
+        Assumes loc is an absolute path, as returned by the
+        AbsolutePath auxiliary function.
+
+        Returns a boolean.
+
+        Raises:
+            FTPNoSuchDirError
+
+        """
+
+        listing = self.metaCache.GetListing( loc )
+        if listing is not MISS :
+            return len(listing) == 0
+        prefix = loc + '/' if loc else ''
+        keys = self.ListPrefix(prefix, 2)
+        if not keys and loc!='' :
+            raise bftp_ex.FTPNoSuchDirError
+        return all( key==prefix for key in keys )
+
+
+    @S3ExceptionWrapper
+    def HeadObject(self,key) :
+        """ Auxiliary method:  fetch metadata for the object with exactly this key.
+
+        Returns the HeadObject response (a dictionary), or None if
+        there is no such object.
+
+        """
+
+        try :
+            return self.s3Client.head_object( Bucket=self.cloudStorageLocation, Key=key )
+        except ClientError as e :
+            if e.response['Error']['Code'] in ('404','NoSuchKey','NotFound') :
+                return None
+            raise
+
+
+    @S3ExceptionWrapper
+    def ListPrefix(self,prefix,maxKeys) :
+        """ Auxiliary method:  list at most maxKeys entries directly below prefix.
+
+        Issues a single ListObjectsV2 request with a / delimiter, so
+        that subdirectories are returned as one entry each.
+
+        Returns a list of keys and common prefixes.
+
+        """
+
+        rsp = self.s3Client.list_objects_v2( Bucket=self.cloudStorageLocation, Prefix=prefix,
+                                             Delimiter='/', MaxKeys=maxKeys )
+        return [ obj['Key'] for obj in rsp.get('Contents',[]) ] + \
+               [ p['Prefix'] for p in rsp.get('CommonPrefixes',[]) ]
+
+
+    @S3ExceptionWrapper
+    def AbsolutePath(self,f) :
+        """ Auxiliary method:  transform relative path to absolute path.
+
+        This function normalizes paramter f to an absolute path
+        specified relative to the root of a bucket location.  Note that
+        result of this function has no trailing forward slash character.  
+        Also, the root directory of a bucket is represented by setting
+        the return parameter to the empty string.
+
+        Parameter f is considered an absolute path if it begins with a /
+        character.  Otherwise it is relative to the remote working directory.
+
+        As distinguished from an absolute path, the absolute
+        location of an S3 object is obtained by appending the bucket
+        name to the absolute path.  
+
+        Returns a string.
+
+        """
+
+        if f[0]!='/' and self.remoteWorkingDir :
+            remotePath = self.remoteWorkingDir + '/' + f.rstrip('/')
+        else :
+            remotePath = f.lstrip('/').rstrip('/')
+        remotePath = os.path.normpath(remotePath).replace('\\','/')  # posix
+        if remotePath=='.' : # root folder in bucket
+            remotePath = ''
+        return remotePath
+
+
+
+    ###################################################################
+    # Resumable transfers
+    ###################################################################
+
+    def PutResumable( self, localPath, remotePath, extraArgs, size ) :
+        """ Auxiliary method:  upload a file in parts, recording them in the journal.
+
+        If the journal records an unfinished upload of the same local
+        file (unchanged since) to remotePath, the parts S3 already has,
+        according to ListParts, are not sent again.  An upload whose
+        local file has changed is aborted and started afresh.  The
+        journal records the upload until it completes, so that it can
+        be resumed after an interruption.
+
+        Arguments:
+            localPath (str)  : file to be transferred to cloud
+            remotePath (str) : where to put it
+            extraArgs (dict) : per-command S3 object parameters
+            size (int)       : file size
+
+        No return value.
+
+        """
+
+        journal = self.transferJournal
+        location = self.cloudStorageLocation
+        s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_UPLOAD_ARGS ) or {}
+        st = os.stat( localPath )
+        (uploadId,partSize,done) = (None,self.TransferConfigFor(size).multipart_chunksize,{})
+        found = journal.FindUpload( location, remotePath )
+        if found :
+            if found['path'] == os.path.abspath(localPath) and found['identity'] == Identity(st) :
+                done = self.ListParts( remotePath, found['uploadId'], found['partSize'], size )
+                if done is not None :
+                    (uploadId,partSize) = (found['uploadId'],found['partSize'])
+            if uploadId is None :
+                self.AbortUpload( remotePath, found['uploadId'] )
+                journal.EndUpload( location, remotePath )
+                done = {}
+        if uploadId is None :
+            uploadId = self.s3Client.create_multipart_upload( Bucket=location, Key=remotePath,
+                                                              **s3ObjArgs )['UploadId']
+            journal.StartUpload( location, remotePath, uploadId, localPath, st, partSize, extraArgs )
+
+        def ReadPart( offset, length ) :
+            with open( localPath, 'rb' ) as fp :
+                fp.seek( offset )
+                return fp.read( length )
+
+        parts = ( ( number, functools.partial( ReadPart, offset, min(partSize,size-offset) ) )
+                  for (number,offset) in enumerate( range(0,size,partSize), 1 ) if number not in done )
+        self.UploadParts( remotePath, uploadId, parts, done, s3ObjArgs )
+        journal.EndUpload( location, remotePath )
+
+
+    def UploadParts( self, remotePath, uploadId, parts, done, s3ObjArgs, partSent=None ) :
+        """ Auxiliary method:  send the parts of a multipart upload and complete it.
+
+        The parts are (part number, body) pairs, drawn lazily from the
+        iterable and sent by up to max_concurrency threads.  A body is
+        any object UploadPart accepts (bytes, or a file-like object),
+        or a callable returning one, which is called by the sending
+        thread so that only the parts in flight are read into memory.
+        Each part sent is recorded in the journal, if there is one, and
+        passed to partSent, if given.  If a part fails, the upload is
+        left unfinished (so it can be resumed or aborted) and the error
+        is raised.
+
+        Arguments:
+            remotePath (str)  : key being uploaded
+            uploadId (str)    : multipart upload ID
+            parts (iterable)  : (part number, body) pairs to send
+            done (dict)       : part number to ETag for parts already sent
+            s3ObjArgs (dict)  : S3 object parameters
+            partSent (callable) : called with the number of each part sent
+
+        No return value.
+
+        """
+
+        journal = self.transferJournal
+        partArgs = { key:value for key,value in s3ObjArgs.items() if key in UPLOAD_PART_ARGS }
+        etags = dict( done )
+
+        def UploadOne( part ) :
+            (number,body) = part
+            if callable( body ) :
+                body = body()
+            rsp = self.s3Client.upload_part( Bucket=self.cloudStorageLocation, Key=remotePath,
+                                             UploadId=uploadId, PartNumber=number, Body=body, **partArgs )
+            etags[number] = rsp['ETag']
+            if journal :
+                journal.PartDone( uploadId, number, rsp['ETag'] )
+            if partSent :
+                partSent( number )
+
+        report = RunParallel( UploadOne, parts, self.s3TransferConfig['max_concurrency'],
+                              report=TransferReport(), nameOf=lambda part : part[0] )
+        if report.failures :
+            raise report.failures[0][1]
+        self.s3Client.complete_multipart_upload(
+            Bucket=self.cloudStorageLocation, Key=remotePath, UploadId=uploadId,
+            MultipartUpload={ 'Parts':[ {'PartNumber':n,'ETag':etags[n]} for n in sorted(etags) ] },
+            **partArgs )
+
+
+    def ListParts( self, remotePath, uploadId, partSize, size ) :
+        """ Auxiliary method:  find the parts S3 has for an unfinished upload.
+
+        Parts whose size is not the expected one are ignored.
+
+        Returns a dictionary mapping part numbers to ETags, or None if
+        S3 no longer knows the upload.
+
+        """
+
+        parts = {}
+        paginator = self.s3Client.get_paginator('list_parts')
+        try :
+            for page in paginator.paginate( Bucket=self.cloudStorageLocation, Key=remotePath,
+                                            UploadId=uploadId ) :
+                for part in page.get('Parts',[]) :
+                    number = part['PartNumber']
+                    if part['Size'] == min( partSize, size - (number-1)*partSize ) :
+                        parts[number] = part['ETag']
+        except ClientError as e :
+            if e.response['Error']['Code'] in ('404','NoSuchUpload') :
+                return None
+            raise
+        return parts
+
+
+    def AbortUpload( self, remotePath, uploadId ) :
+        """ Auxiliary method:  abort a multipart upload, ignoring failures."""
+
+        try :
+            self.s3Client.abort_multipart_upload( Bucket=self.cloudStorageLocation, Key=remotePath,
+                                                  UploadId=uploadId )
+        except ClientError :
+            pass
+
+
+    def GetResumable( self, remotePath, localPath, etag, size, extraArgs, encoding=None, restarts=0 ) :
+        """ Auxiliary method:  download an object, continuing an interrupted download.
+
+        The object is streamed into localPath + PARTIAL_SUFFIX, which is
+        renamed to localPath when complete.  If the journal records an
+        earlier download of the same object (with the same ETag) to
+        localPath and the partial file exists, only the rest of the
+        object is requested, with a ranged GetObject.  Every request is
+        conditional on the ETag, and if the object has changed the
+        download starts over, up to MAX_RESTARTS times.  Compressed
+        objects are decompressed (see WriteBody), so the partial file
+        holds decompressed bytes that cannot be matched to an offset
+        in the object:  an interrupted download of one always starts
+        over.  If the caller does not know the object's encoding, it is
+        looked up with HeadObject before a partial file is trusted.
+
+        Arguments:
+            remotePath (str) : file to be gotten
+            localPath (str)  : where to put it
+            etag (str)       : expected ETag of the object
+            size (int)       : its size
+            extraArgs (dict) : per-command S3 object parameters
+            encoding (str)   : its ContentEncoding, or None if unknown
+            restarts (int)   : number of times the download started over
+
+        No return value.
+
+        Raises:
+            FTPNoSuchFileError
+            FTPError:  the object kept changing
+
+        """
+
+        journal = self.transferJournal
+        location = self.cloudStorageLocation
+        partPath = localPath + PARTIAL_SUFFIX
+        offset = 0
+        if journal.FindDownload( location, remotePath, localPath ) == etag and os.path.exists( partPath ) :
+            offset = os.path.getsize( partPath )
+        else :
+            journal.StartDownload( location, remotePath, localPath, etag, extraArgs )
+        if offset and encoding is None :
+            head = self.HeadObject( remotePath )
+            encoding = head.get('ContentEncoding','') if head else ''
+        if offset > size or encoding in CODECS :
+            offset = 0
+
+        if offset < size :
+            s3ObjArgs = self.MergeObjArgs( extraArgs, S3Transfer.ALLOWED_DOWNLOAD_ARGS ) or {}
+            if offset :
+                s3ObjArgs['Range'] = 'bytes=%d-' % offset
+            try :
+                rsp = self.s3Client.get_object( Bucket=location, Key=remotePath,
+                                                IfMatch='"' + etag + '"', **s3ObjArgs )
+            except ClientError as e :
+                if e.response['Error']['Code'] not in ('412','PreconditionFailed') :
+                    raise
+                self.metaCache.Forget( remotePath )
+                journal.EndDownload( location, remotePath, localPath )
+                if restarts >= MAX_RESTARTS :
+                    raise bftp_ex.FTPError
+                head = self.HeadObject( remotePath )
+                if head is None :
+                    raise bftp_ex.FTPNoSuchFileError
+                return self.GetResumable( remotePath, localPath, head['ETag'].strip('"'), head['ContentLength'],
+                                          extraArgs, head.get('ContentEncoding',''), restarts+1 )
+            if offset and rsp.get('ContentEncoding') in CODECS :
+                rsp['Body'].close()
+                os.remove( partPath )
+                return self.GetResumable( remotePath, localPath, etag, size, extraArgs, rsp['ContentEncoding'] )
+            with open( partPath, 'ab' if offset else 'wb' ) as fp :
+                self.WriteBody( rsp, fp )
+        elif not os.path.exists( partPath ) :
+            open( partPath, 'wb' ).close()
+        os.replace( partPath, localPath )
+        journal.EndDownload( location, remotePath, localPath )
+
+
+
+    ###################################################################
+    # Methods for specifying/managing S3 object-related parameters
+    ###################################################################
+
+
+    @S3ExceptionWrapper
+    def LoadS3DefaultObjParams( self, fileName, isRelative=True ) :
+        """Loads default S3 object parameters from a JSON file.
+
+        Loads default S3 object parameters from the specified
+        file.  The file can contain a partial or complete set of
+        S3 object-related parameters.  If it's a partial set, then
+        only overwrite the corresponding object defaults, leaving
+        the others unchanged.  A TransferConfig entry, if present,
+        holds transfer settings (see SetS3TransferConfig), and a
+        Compression entry the codec for uploads (see compress).  The file
+        is read from the local working directory, unless isRelative
+        is set to False.
+
+        Arguments:
+            fileName (str)       :  file name to read S3 parameters
+            isRelative (boolean) :  file is relative to local working dir
+
+        Raises:
+            OSError
+            FTPInvalidObjectParameter
+            S3FTPInvalidCompression
+
+        No return value.
+
+        """
+
+        if isRelative==True :
+            localFile = os.path.basename(fileName)
+            fileName = self.localWorkingDir + '/' + localFile
+        fp = open( fileName, 'r' )
+        s3Params = json.load( fp )
+        fp.close()
+        s3TransferConfig = s3Params.pop( 'TransferConfig', None )
+        compression = s3Params.pop( 'Compression', None )
+        if self.S3ParamsAreValid( s3Params ) :
+            self.s3DefaultObjParams = s3Params
+        else :
+            raise s3e.S3FTPInvalidObjectParameter
+        if s3TransferConfig!=None :
+            self.ApplyS3TransferConfig( s3TransferConfig )
+        if compression!=None :
+            self.ApplyCompression( compression )
+
+
+    @S3ExceptionWrapper
+    def SaveS3DefaultObjParams( self, fileName, isRelative=True ) :
+        """Stores default S3 object parameters to a JSON file.
+
+        Save the default S3 object parameters to the specified
+        file in JSON format, along with the transfer settings under
+        a TransferConfig entry and the codec for uploads, if any, under
+        a Compression entry.  The file is saved to the current
+        local working directory, unless isRelative is set to False.
+
+        Arguments:
+            fileName (str) :        file name to store S3 parameters
+            isRelative (boolean) :  file is relative to local working dir
+
+        Raises:
+            OSError
+
+        No return value.
+
+        """
+
+        if isRelative==True :
+            localFile = os.path.basename(fileName)
+            fileName = self.localWorkingDir + '/' + localFile
+        s3Params = dict( self.s3DefaultObjParams or {} )
+        s3Params['TransferConfig'] = self.s3TransferConfig
+        if self.compression :
+            s3Params['Compression'] = self.compression
+        fp = open( fileName, 'w' )
+        json.dump( s3Params,fp,indent=4 )
+        fp.close()
+
+
+    @S3ExceptionWrapper
+    def GetS3DefaultObjParams(self) :
+        """Returns current default S3 parameters (a dictionary)."""
+        
+        return self.s3DefaultObjParams
+
+
+    @S3ExceptionWrapper
+    def SetS3DefaultObjParams( self, s3Params ) :
+        """Sets current default S3 parameters to user-specified values.
 
         The s3Params argument is a dictionary that contains either a
         partial or complete set of S3 object-related parameters.  If it's
@@ -516,12 +1934,40 @@ class S3FtpClient(BaseFtpClient) :
         """
 
         if self.S3ParamsAreValid( s3Params ) :
+            if self.s3DefaultObjParams==None :
+                self.s3DefaultObjParams = {}
             for key,value in s3Params.items() :
                 self.s3DefaultObjParams[key] = value
         else :
             raise s3e.S3FTPInvalidObjectParameter
 
 
+    @S3ExceptionWrapper
+    def MergeObjArgs( self, extraArgs, allowedArgs ) :
+        """Auxiliary method:  merge default S3 object parameters with extraArgs.
+
+        Keeps only the parameters named in allowedArgs (for example
+        S3Transfer.ALLOWED_DOWNLOAD_ARGS).  Values in extraArgs take
+        precedence over the defaults.
+
+        Arguments:
+            extraArgs (dict)   :  per-command parameters, or None
+            allowedArgs (list) :  parameter names accepted by the operation
+
+        Returns a dictionary, or None if there are no parameters.
+
+        """
+
+        s3ObjArgs = None
+        if self.s3DefaultObjParams :
+            s3ObjArgs = { key:value for key,value in self.s3DefaultObjParams.items() if key in allowedArgs }
+            if extraArgs :
+                s3ObjArgs.update( { key:value for key,value in extraArgs.items() if key in allowedArgs } )
+        elif extraArgs :
+            s3ObjArgs = { key:value for key,value in extraArgs.items() if key in allowedArgs }
+        return s3ObjArgs
+
+
     @S3ExceptionWrapper
     def S3ParamsAreValid( self, s3Params ) :
         """Auxiliary method:  Check extraArgs for S3Transfer functions.
@@ -536,7 +1982,9 @@ class S3FtpClient(BaseFtpClient) :
         to do that.  This is probably not the best answer for the
         long term.  Note that Amazon does not seem to expose a simple
         API to check the values.  If a key is invalid, we alert
-        the user and indicate that it will be ignored.
+        the user and indicate that it will be ignored.  Keys are
+        checked against AllowedObjectArgs, so that boto3 need not be
+        imported.
 
         Arguments:
             s3Params (dict):  parameters for S3 objects
@@ -547,14 +1995,355 @@ class S3FtpClient(BaseFtpClient) :
 
         valid = True
         if s3Params!= None :
+            allowedArgs = AllowedObjectArgs()
             for key in s3Params.keys():
-                if key not in S3Transfer.ALLOWED_UPLOAD_ARGS and \
-                   key not in S3Transfer.ALLOWED_DOWNLOAD_ARGS :
+                if key not in allowedArgs :
                     valid = False
         return valid
 
 
 
+    ###################################################################
+    # Methods for specifying/managing S3 transfer settings
+    ###################################################################
+
+
+    @S3ExceptionWrapper
+    def tconfig( self, args ) :
+        """Shows or changes transfer settings (the tconfig command).
+
+        With no arguments, returns the current settings.  With two
+        arguments, sets the named setting to the given value, for
+        example tconfig multipart_chunksize 64MB.
+
+        Arguments:
+            args (list):  empty, or a setting name and value
+
+        Raises:
+            S3FTPInvalidTransferConfig
+
+        """
+
+        if not args :
+            return '\n'.join( '%-20s %s' % (key, FormatSize(value) if key in ('multipart_threshold','multipart_chunksize') else value)
+                              for key,value in sorted(self.s3TransferConfig.items()) )
+        elif len(args)==2 :
+            self.SetS3TransferConfig( { args[0]:args[1] } )
+        else :
+            raise s3e.S3FTPInvalidTransferConfig
+
+
+    @S3ExceptionWrapper
+    def cache( self, args ) :
+        """Shows or controls the metadata cache (the cache command).
+
+        With no arguments, returns cache statistics.  cache clear
+        empties the cache, so that changes made by other clients are
+        seen at once.  cache ttl N sets the lifetime of cached items
+        to N seconds (0 disables the cache).
+
+        Arguments:
+            args (list):  empty, ['clear'] or ['ttl', seconds]
+
+        Raises:
+            FTPInvalidCommand
+
+        """
+
+        if not args :
+            return str( self.metaCache )
+        elif args==['clear'] :
+            self.metaCache.Clear()
+        elif len(args)==2 and args[0]=='ttl' :
+            try :
+                self.metaCache.ttl = float( args[1] )
+            except ValueError :
+                raise bftp_ex.FTPInvalidCommand
+            self.metaCache.Clear()
+        else :
+            raise bftp_ex.FTPInvalidCommand
+
+
+    @S3ExceptionWrapper
+    def compress( self, args ) :
+        """Shows or sets the compression of uploaded files (the compress command).
+
+        With no arguments, returns the current setting.  compress gzip
+        or compress zstd compresses files as they are uploaded from then
+        on, and compress off stops compressing them.  Downloads always
+        decompress compressed objects.
+
+        Arguments:
+            args (list):  empty, or one of gzip, zstd and off
+
+        Raises:
+            S3FTPInvalidCompression
+
+        """
+
+        if not args :
+            return 'compress ' + ( self.compression or 'off' )
+        elif len(args)==1 :
+            self.ApplyCompression( args[0] )
+        else :
+            raise s3e.S3FTPInvalidCompression
+
+
+    def ApplyCompression( self, compression ) :
+        """Auxiliary method:  set the codec for uploads, without exception handling.
+
+        Arguments:
+            compression (str):  gzip, zstd, or off (or None) for none
+
+        Raises:
+            S3FTPInvalidCompression
+
+        """
+
+        self.compression = CheckedCodec( compression )
+
+
+    def CompressionFor( self, extraArgs ) :
+        """Auxiliary method:  codec for an upload with the given extraArgs.
+
+        A Compression entry in extraArgs (gzip, zstd, or off or None)
+        overrides the compression attribute.
+
+        Returns gzip, zstd, or None for no compression.
+
+        Raises:
+            S3FTPInvalidCompression
+
+        """
+
+        if extraArgs and 'Compression' in extraArgs :
+            return CheckedCodec( extraArgs['Compression'] )
+        return self.compression
+
+
+    def CloudCommands(self) :
+        """ Auxiliary method:  S3-specific commands for CommandLine."""
+
+        return { 'tconfig' : self.tconfig,
+                 'cache'   : self.cache,
+                 'compress': self.compress }
+
+
+    @S3ExceptionWrapper
+    def GetS3TransferConfig(self) :
+        """Returns current transfer settings (a dictionary)."""
+
+        return self.s3TransferConfig
+
+
+    @S3ExceptionWrapper
+    def SetS3TransferConfig( self, s3TransferConfig ) :
+        """Sets transfer settings to user-specified values.
+
+        The argument is a dictionary holding some or all of
+        multipart_threshold, multipart_chunksize (sizes such as
+        64MB or a number of bytes), max_concurrency, max_io_queue
+        (integers), auto_tune and mmap_upload (booleans, or one of
+        on/off, true/false).  Settings not mentioned are unchanged.  If any
+        setting is invalid, nothing is changed.
+
+        Arguments:
+            s3TransferConfig (dict):  transfer settings
+
+        Raises:
+            S3FTPInvalidTransferConfig
+
+        No return value.
+
+        """
+
+        self.ApplyS3TransferConfig( s3TransferConfig )
+
+
+    def ApplyS3TransferConfig( self, s3TransferConfig ) :
+        """Auxiliary method:  SetS3TransferConfig without exception handling."""
+
+        newConfig = dict( self.s3TransferConfig )
+        try :
+            for key,value in s3TransferConfig.items() :
+                if key in ( 'multipart_threshold', 'multipart_chunksize' ) :
+                    newConfig[key] = ParseSize( value )
+                elif key in ( 'max_concurrency', 'max_io_queue' ) :
+                    newConfig[key] = int( value )
+                elif key in ( 'auto_tune', 'mmap_upload' ) and str(value).lower() in ( 'true', 'on', '1' ) :
+                    newConfig[key] = True
+                elif key in ( 'auto_tune', 'mmap_upload' ) and str(value).lower() in ( 'false', 'off', '0' ) :
+                    newConfig[key] = False
+                else :
+                    raise ValueError( key )
+        except ValueError :
+            raise s3e.S3FTPInvalidTransferConfig
+        if newConfig['multipart_chunksize'] < MIN_PART_SIZE or \
+           newConfig['multipart_chunksize'] > MAX_PART_SIZE or \
+           newConfig['max_concurrency'] < 1 or newConfig['max_io_queue'] < 1 :
+            raise s3e.S3FTPInvalidTransferConfig
+        self.s3TransferConfig = newConfig
+        self.RetireTransfers()
+        if self.s3Client :
+            self.s3Transfer = S3Transfer( self.s3Client, config=self.TransferConfigFor(None) )
+
+
+    def TransferConfigFor( self, size ) :
+        """Auxiliary method:  transfer settings suited to a file of the given size.
+
+        Starts from the current settings.  If size is known and
+        auto_tune is on, the part size is raised so the file takes
+        at most MAX_PARTS parts (S3's limit) and, up to
+        AUTO_TUNE_MAX_PART_SIZE, so that each thread has about
+        AUTO_TUNE_PARTS_PER_THREAD parts to send.  Larger parts mean
+        fewer requests for multi-gigabyte files.
+
+        Arguments:
+            size (int):  file size in bytes, or None if unknown
+
+        Returns a boto3 TransferConfig.
+
+        """
+
+        config = self.s3TransferConfig
+        chunkSize = config['multipart_chunksize']
+        if size and config['auto_tune'] :
+            perThread = size // ( config['max_concurrency'] * AUTO_TUNE_PARTS_PER_THREAD )
+            chunkSize = max( chunkSize, min(perThread,AUTO_TUNE_MAX_PART_SIZE) )
+            chunkSize = max( chunkSize, math.ceil(size/MAX_PARTS) )
+            chunkSize = MIB * math.ceil( chunkSize/MIB )
+        ImportBoto3()
+        return TransferConfig( multipart_threshold=config['multipart_threshold'],
+                               multipart_chunksize=min(chunkSize,MAX_PART_SIZE),
+                               max_concurrency=config['max_concurrency'],
+                               max_io_queue=config['max_io_queue'] )
+
+
+    @contextlib.contextmanager
+    def TransferFor( self, size ) :
+        """Auxiliary method:  S3Transfer object suited to a file of the given size.
+
+        S3Transfer objects own thread pools, so rather than being
+        created per file, one is kept for each part size chosen by
+        TransferConfigFor:  the configured part size, and up to
+        MAX_TRANSFERS others, the least recently used of which is
+        retired when another is needed (see RetireTransfers).  Used
+        as a context manager, so that a transfer is not shut down
+        while a file is using it.
+
+        Arguments:
+            size (int):  file size in bytes, or None if unknown
+
+        Yields a boto3 S3Transfer.
+
+        """
+
+        config = self.TransferConfigFor(size)
+        retired = []
+        with self.transferLock :
+            if size==None or size < config.multipart_threshold or \
+               config.multipart_chunksize == self.s3TransferConfig['multipart_chunksize'] :
+                s3Transfer = self.s3Transfer
+            else :
+                if config.multipart_chunksize not in self.s3Transfers :
+                    self.s3Transfers[ config.multipart_chunksize ] = S3Transfer( self.s3Client, config=config )
+                    while len(self.s3Transfers) > MAX_TRANSFERS :
+                        retired.append( self.s3Transfers.popitem( last=False )[1] )
+                self.s3Transfers.move_to_end( config.multipart_chunksize )
+                s3Transfer = self.s3Transfers[ config.multipart_chunksize ]
+            self.transferUsers[ s3Transfer ] = self.transferUsers.get( s3Transfer, 0 ) + 1
+        try :
+            yield s3Transfer
+        finally :
+            with self.transferLock :
+                self.transferUsers[ s3Transfer ] -= 1
+                if not self.transferUsers[ s3Transfer ] :
+                    del self.transferUsers[ s3Transfer ]
+            self.RetireTransfers( retired )
+
+
+    def RetireTransfers( self, transfers=None ) :
+        """Auxiliary method:  shut down S3Transfer objects no longer wanted.
+
+        Each transfer's thread pools are shut down once no file is using
+        it (see TransferFor); until then it is kept in retiredTransfers.
+        By default every transfer of the client is retired, as the
+        bucket or the transfer settings change.
+
+        Arguments:
+            transfers (list):  S3Transfer objects to retire, or None for all
+
+        No return value.
+
+        """
+
+        with self.transferLock :
+            if transfers is None :
+                transfers = list( self.s3Transfers.values() ) + [ self.s3Transfer ]
+                self.s3Transfers = OrderedDict()
+                self.s3Transfer = None
+            self.retiredTransfers.extend( t for t in transfers if t is not None )
+            idle = [ t for t in self.retiredTransfers if t not in self.transferUsers ]
+            self.retiredTransfers = [ t for t in self.retiredTransfers if t in self.transferUsers ]
+        for s3Transfer in idle :
+            with s3Transfer :
+                pass        # leaving the block shuts its thread pools down
+
+
+    def SegmentPlan( self, length ) :
+        """Auxiliary method:  segment size and thread count for GetSegments.
+
+        Segments are the parts TransferConfigFor chooses for uploads of
+        the same size, fetched by max_concurrency threads, so the
+        tconfig command tunes segmented downloads as well.
+
+        Arguments:
+            length (int):  number of bytes to be downloaded
+
+        Returns a (segmentSize, maxWorkers) tuple.
+
+        """
+
+        config = self.TransferConfigFor( length )
+        return ( config.multipart_chunksize, config.max_concurrency )
+
+
+
+
+###################################################################
+# Helpers
+###################################################################
+
+def MultipartETag( path, size, partSize ) :
+    """ Returns the ETag S3 gives a file of size bytes uploaded in parts of partSize.
+
+    This is a module-level function so that it can run in a CpuPool.
+
+    """
+
+    digests = b''.join( bytes.fromhex( FileMD5(path,start,partSize) )
+                        for start in range(0,size,partSize) )
+    return hashlib.md5(digests).hexdigest() + '-' + str( math.ceil(size/partSize) )
+
+
+def CheckedCodec( compression ) :
+    """ Returns the codec named by a compression setting, or None for off.
+
+    Raises:
+        S3FTPInvalidCompression
+
+    """
+
+    if compression in ( None, 'off' ) :
+        return None
+    try :
+        CheckCodec( compression )
+    except ValueError :
+        raise s3e.S3FTPInvalidCompression
+    return compression
+
+
+
 
 
 
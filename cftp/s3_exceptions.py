@@ -33,3 +33,48 @@ class S3FTPInvalidObjectParameter(Exception) :
         sys.stderr.write( 'In interactive mode, they are ignored.\n' )
         sys.stderr.write( 'Otherwise, no parameters are changed until all are correct.\n' )
 
+class S3FTPInvalidTransferConfig(Exception) :
+    """Attempt to specify an invalid transfer setting.
+
+    Transfer settings control multipart uploads and downloads
+    (threshold, part size, concurrency).  They are set through
+    the TransferConfig entry of .s3ftp.json or the tconfig command.
+
+    """
+
+    def errorLog(self):
+        sys.stderr.write( 'Invalid transfer setting; settings are unchanged.\n' )
+
+class S3FTPDeleteError(Exception) :
+    """S3 refused to delete an object named in a DeleteObjects request.
+
+    The exception argument holds the error code and message
+    returned by S3 for that object.
+
+    """
+
+    def errorLog(self):
+        sys.stderr.write( 'Could not delete object: ' + str(self) + '\n' )
+
+class S3FTPInvalidCompression(Exception) :
+    """Attempt to use an unknown or unavailable compression codec.
+
+    The codecs are gzip and, if the zstandard package is installed,
+    zstd.  This is also raised when downloading an object compressed
+    with zstd without the zstandard package.
+
+    """
+
+    def errorLog(self):
+        sys.stderr.write( 'Invalid compression; use gzip, zstd (needs the zstandard package) or off.\n' )
+
+class S3FTPCompressedRangeError(Exception) :
+    """Attempt to download part of a compressed object to a file.
+
+    A part of the stored content of an object uploaded with compress
+    is not a part of the original file, so get --range refuses it.
+
+    """
+
+    def errorLog(self):
+        sys.stderr.write( 'Cannot get part of a compressed object; get the whole file.\n' )
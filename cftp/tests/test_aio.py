@@ -0,0 +1,69 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+import cftp.aio
+import cftp.local
+import cftp.base_exceptions as bftp_ex
+
+
+
+
+class TestAsyncClient( unittest.TestCase ) :
+    """Tests AsyncBaseFtpClient wrapping a LocalFtpClient.
+
+    The setUp method creates a temporary directory serving as the
+    "cloud" root, which tearDown removes.
+
+    """
+
+
+    def setUp( self ) :
+        """Create the directory and an open client."""
+
+        self.root = tempfile.mkdtemp()
+        self.ftp = cftp.local.LocalFtpClient()
+        self.ftp.open( self.root )
+
+
+    def tearDown( self ) :
+        """Remove the directory."""
+
+        shutil.rmtree( self.root )
+
+
+    def testConcurrentCommands( self ) :
+
+        async def Run() :
+            async with cftp.aio.AsyncBaseFtpClient( self.ftp, maxConcurrency=8 ) as ftp :
+                await ftp.mkdir( 'a' )
+                await ftp.cd( 'a' )
+                sizes = await asyncio.gather( *[ ftp.put_bytes( 'f%04d' % i, b'x' * i ) for i in range(300) ] )
+                names = [ name async for name in ftp.iter_ls() ]
+                data = await ftp.get_bytes( 'f0123' )
+                return ( sum(sizes), len(names), len(data) )
+
+        self.assertEqual( asyncio.run( Run() ), ( sum(range(300)), 300, 123 ) )
+
+
+    def testErrorsAreRaised( self ) :
+
+        async def Run() :
+            async with cftp.aio.AsyncBaseFtpClient( self.ftp ) as ftp :
+                await ftp.get( 'nope' )
+
+        with self.assertRaises( bftp_ex.FTPNoSuchFileError ) :
+            asyncio.run( Run() )
+
+
+    def testDefaultConcurrencyFollowsPool( self ) :
+        self.assertEqual( cftp.aio.AsyncBaseFtpClient( self.ftp ).maxConcurrency, cftp.aio.DEFAULT_CONCURRENCY )
+        self.ftp.maxPoolConnections = 10
+        ftp = cftp.aio.AsyncBaseFtpClient( self.ftp )
+        self.assertEqual( (ftp.maxConcurrency,ftp.executor._max_workers), (10,10) )
+        ftp.shutdown()
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import time
+import unittest
+from cftp.base import OBJ_NONE, OBJ_FILE, OBJ_DIR
+from cftp.cache import MetadataCache, MISS
+
+
+
+
+def Entry( key, objType=OBJ_FILE ) :
+    """Builds an IterDir-style entry for key."""
+
+    return { 'name':key.split('/')[-1], 'key':key, 'type':objType,
+             'size':0, 'etag':None, 'mtime':None }
+
+
+
+
+class TestMetadataCache( unittest.TestCase ) :
+    """Tests MetadataCache lookups, expiry and invalidation."""
+
+
+    def setUp( self ) :
+        """Cache a listing of folder a, which holds b.txt and c/."""
+
+        self.cache = MetadataCache( ttl=60 )
+        self.cache.PutListing( 'a', [ Entry('a/b.txt'), Entry('a/c',OBJ_DIR) ] )
+
+
+    def testTypesFromListing( self ) :
+        self.assertEqual( self.cache.GetType('a'), OBJ_DIR )
+        self.assertEqual( self.cache.GetType('a/b.txt'), OBJ_FILE )
+        self.assertEqual( self.cache.GetType('a/c'), OBJ_DIR )
+        self.assertEqual( self.cache.GetType('a/nope'), OBJ_NONE )
+        self.assertIs( self.cache.GetType('elsewhere'), MISS )
+
+
+    def testCreatedUpdatesListings( self ) :
+        self.cache.PutType( 'a/new', OBJ_NONE )
+        self.cache.Created( 'a/new/x.txt', Entry('a/new/x.txt') )
+        self.assertEqual( self.cache.GetType('a/new'), OBJ_DIR )
+        self.assertEqual( self.cache.GetType('a/new/x.txt'), OBJ_FILE )
+        names = [ entry['name'] for entry in self.cache.GetListing('a') ]
+        self.assertEqual( names, ['b.txt','c','new'] )
+
+
+    def testRemovedLastEntryForgetsParent( self ) :
+        self.cache.Removed( 'a/b.txt' )
+        self.assertEqual( self.cache.GetType('a/b.txt'), OBJ_NONE )
+        self.assertEqual( self.cache.GetType('a'), OBJ_DIR )
+        self.cache.Removed( 'a/c' )
+        self.assertIs( self.cache.GetListing('a'), MISS )
+        self.assertIs( self.cache.GetType('a'), MISS )
+
+
+    def testRemovedRefreshesAncestorListings( self ) :
+        self.cache.PutListing( '', [ Entry('a',OBJ_DIR), Entry('z.txt') ] )
+        self.cache.Removed( 'a/c/d.txt' )
+        self.assertIs( self.cache.GetListing('a'), MISS )
+        self.assertEqual( self.cache.GetType('a'), OBJ_DIR )
+        self.cache.PutListing( 'a', [ Entry('a/c',OBJ_DIR) ] )
+        self.cache.Removed( 'a/c/d.txt' )
+        self.assertIs( self.cache.GetListing(''), MISS )
+        self.assertIs( self.cache.GetType('a'), MISS )
+
+
+    def testFileAndFolderOfTheSameName( self ) :
+        self.cache.PutListing( 'a', [ Entry('a/x'), Entry('a/x',OBJ_DIR) ] )
+        self.assertEqual( [ (e['name'],e['type']) for e in self.cache.GetListing('a') ],
+                          [ ('x',OBJ_FILE), ('x',OBJ_DIR) ] )
+        self.assertEqual( self.cache.GetType('a/x'), OBJ_FILE )
+        self.cache.Removed( 'a/x', OBJ_FILE )
+        self.assertEqual( [ (e['name'],e['type']) for e in self.cache.GetListing('a') ], [ ('x',OBJ_DIR) ] )
+        self.assertEqual( self.cache.GetType('a/x'), OBJ_DIR )
+
+
+    def testRemovedTree( self ) :
+        self.cache.PutListing( 'a/c', [ Entry('a/c/d.txt') ] )
+        self.cache.RemovedTree( 'a/c' )
+        self.assertIs( self.cache.GetListing('a/c'), MISS )
+        self.assertEqual( self.cache.GetType('a/c'), OBJ_NONE )
+
+
+    def testListingChangedWhileReadIsNotStored( self ) :
+        generation = self.cache.Generation( 'x' )
+        self.cache.Removed( 'x/y.txt', OBJ_FILE )
+        self.cache.PutListing( 'x', [ Entry('x/y.txt') ], generation )
+        self.assertIs( self.cache.GetListing('x'), MISS )
+        generation = self.cache.Generation( 'x/z' )
+        self.cache.Created( 'elsewhere.txt', Entry('elsewhere.txt') )
+        self.cache.RemovedTree( 'x' )
+        self.cache.PutListing( 'x/z', [], generation )
+        self.assertIs( self.cache.GetListing('x/z'), MISS )
+        generation = self.cache.Generation( 'x' )
+        self.cache.Created( 'elsewhere.txt', Entry('elsewhere.txt') )
+        self.cache.PutListing( 'x', [ Entry('x/y.txt') ], generation )
+        self.assertEqual( len(self.cache.GetListing('x')), 1 )
+
+
+    def testExpiryAndEviction( self ) :
+        cache = MetadataCache( ttl=0.01, maxEntries=2 )
+        for path in ( 'x', 'y', 'z' ) :
+            cache.PutType( path, OBJ_FILE )
+        self.assertIs( cache.GetType('x'), MISS )
+        self.assertEqual( cache.GetType('z'), OBJ_FILE )
+        time.sleep( 0.02 )
+        self.assertIs( cache.GetType('z'), MISS )
+
+
+    def testDisabled( self ) :
+        cache = MetadataCache( ttl=0 )
+        cache.PutType( 'x', OBJ_FILE )
+        self.assertIs( cache.GetType('x'), MISS )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
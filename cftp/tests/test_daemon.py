@@ -0,0 +1,94 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import cftp.daemon
+import cftp.local
+
+
+
+
+class TestDaemon( unittest.TestCase ) :
+    """Tests running scripts through a Daemon of LocalFtpClient sessions.
+
+    The setUp method creates two temporary directories, one serving
+    as the "cloud" root and the other as the local working directory
+    (which also holds the socket), and starts the daemon.  tearDown
+    stops it and removes the directories.
+
+    """
+
+
+    def setUp( self ) :
+        """Create the directories and start the daemon."""
+
+        self.savedDir = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        os.chdir( self.local )
+        self.path = os.path.join( self.local, 's.sock' )
+        self.server = cftp.daemon.Daemon( self.path, cftp.local.LocalFtpClient )
+        threading.Thread( target=self.server.serve_forever, daemon=True ).start()
+        (self.out,self.err) = ( io.StringIO(), io.StringIO() )
+
+
+    def tearDown( self ) :
+        """Stop the daemon and remove the directories."""
+
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir( self.savedDir )
+        shutil.rmtree( self.root )
+        shutil.rmtree( self.local )
+
+
+    def Forward( self, script ) :
+        """Run script in the daemon, in the cloud root."""
+
+        return cftp.daemon.Forward( script, self.root, path=self.path, out=self.out, err=self.err )
+
+
+    def testScriptsShareASession( self ) :
+        with open( 'f000.txt', 'wb' ) as fp :
+            fp.write( b'x' * 100 )
+        self.assertEqual( self.Forward( 'put f000.txt; ls' ), 0 )
+        self.assertEqual( self.Forward( 'get nope' ), 1 )
+        self.assertEqual( self.out.getvalue(), 'f000.txt\n' )
+        self.assertIn( 'No such file', self.err.getvalue() )
+        self.assertEqual( len(self.server.sessions), 1 )
+
+
+    def testStandardStreamsAreRefused( self ) :
+        self.assertEqual( self.Forward( 'ls; get f000.txt -' ), 2 )
+        self.assertEqual( self.Forward( 'put - f000.txt' ), 2 )
+        self.assertEqual( self.out.getvalue(), '' )
+        self.assertIn( 'line 1: get f000.txt -', self.err.getvalue() )
+
+
+    def testLocationCannotBeChanged( self ) :
+        root2 = tempfile.mkdtemp()
+        try :
+            with open( os.path.join(root2,'other.txt'), 'w' ) as fp :
+                fp.write( 'other' )
+            self.assertEqual( self.Forward( 'open %s' % root2 ), 2 )
+            self.assertEqual( self.Forward( 'ls; close' ), 2 )
+            self.assertEqual( self.Forward( 'mkdir d; ls' ), 0 )
+        finally :
+            shutil.rmtree( root2 )
+        self.assertEqual( self.out.getvalue(), 'd\n' )
+        self.assertIn( 'line 1: open', self.err.getvalue() )
+
+
+    def testWithoutDaemon( self ) :
+        self.assertIsNone( cftp.daemon.Forward( 'ls', path=self.path + 'x' ) )
+        with unittest.mock.patch( 'os.getuid', return_value=os.getuid()+1 ) :
+            self.assertIsNone( self.Forward( 'ls' ) )
+        self.assertIn( 'belongs to another user', self.err.getvalue() )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,474 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import cftp.local
+import cftp.base
+import cftp.base_exceptions as bftp_ex
+
+
+
+
+class TestLocalFtpClient( unittest.TestCase ) :
+    """Tests BaseFtpClient command paths using LocalFtpClient.
+
+    The setUp method creates two temporary directories:  one serves
+    as the "cloud" root and the other as the local working directory.
+    Both are removed by tearDown.
+
+    """
+
+
+    def setUp( self ) :
+        """Create the directories and an open client."""
+
+        self.savedDir = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.ftp = cftp.local.LocalFtpClient()
+        self.ftp.open( self.root )
+        self.ftp.lcd( self.local )
+
+
+    def tearDown( self ) :
+        """Remove the directories."""
+
+        os.chdir( self.savedDir )
+        shutil.rmtree( self.root )
+        shutil.rmtree( self.local )
+
+
+    def MakeLocalFiles( self, count, size=100 ) :
+        """Create count files named f000.txt, ... in the local directory."""
+
+        for i in range(count) :
+            with open( os.path.join(self.local,'f%03d.txt' % i), 'wb' ) as fp :
+                fp.write( b'x' * size )
+
+
+    def testPutGetRoundTrip( self ) :
+        self.MakeLocalFiles( 1 )
+        self.ftp.mkdir( 'd' )
+        self.ftp.cd( 'd' )
+        self.ftp.put( 'f000.txt' )
+        self.assertEqual( self.ftp.ls(), ['f000.txt'] )
+        os.remove( os.path.join(self.local,'f000.txt') )
+        self.ftp.get( 'f000.txt' )
+        self.assertEqual( os.path.getsize(os.path.join(self.local,'f000.txt')), 100 )
+
+
+    def testNavigation( self ) :
+        self.ftp.mkdir( 'a' )
+        self.ftp.mkdir( 'a/b' )
+        self.ftp.cd( 'a/b' )
+        self.assertEqual( self.ftp.remoteWorkingDir, 'a/b' )
+        self.ftp.cd( '..' )
+        self.assertEqual( self.ftp.remoteWorkingDir, 'a' )
+        self.ftp.cd( 'nope' )
+        self.assertEqual( self.ftp.remoteWorkingDir, 'a' )
+        self.ftp.cd( '/' )
+        self.assertEqual( self.ftp.remoteWorkingDir, '' )
+
+
+    def testRmdirRequiresEmptyDir( self ) :
+        self.MakeLocalFiles( 1 )
+        self.ftp.mkdir( 'd' )
+        self.ftp.cd( 'd' )
+        self.ftp.put( 'f000.txt' )
+        self.ftp.cd( '/' )
+        self.ftp.rmdir( 'd' )
+        self.assertEqual( self.ftp.ls(), ['d'] )
+        self.ftp.rmtree( 'd' )
+        self.assertEqual( self.ftp.ls(), [] )
+
+
+    def testBatchCommands( self ) :
+        self.MakeLocalFiles( 30 )
+        report = self.ftp.mput( ['f0*.txt'], maxWorkers=4 )
+        self.assertEqual( (report.files,report.nbytes,report.failures), (30,3000,[]) )
+        self.assertEqual( len(self.ftp.ls()), 30 )
+        shutil.rmtree( self.local )
+        os.mkdir( self.local )
+        report = self.ftp.mget( ['f01*'], maxWorkers=4 )
+        self.assertEqual( report.files, 10 )
+        self.assertEqual( sorted(os.listdir(self.local)), [ 'f%03d.txt' % i for i in range(10,20) ] )
+        report = self.ftp.mdelete( ['*'], maxWorkers=4 )
+        self.assertEqual( report.files, 30 )
+        self.assertEqual( self.ftp.ls(), [] )
+
+
+    def testBatchFailuresGetPastWrappers( self ) :
+        class FailingClient( cftp.local.LocalFtpClient ) :
+            @cftp.base.ExceptionWrapper
+            def AuxGetEntryFromCloud( self, entry, localPath, extraArgs ) :
+                raise bftp_ex.FTPError
+        self.MakeLocalFiles( 3 )
+        self.ftp.mput( ['f*.txt'] )
+        ftp = FailingClient()
+        ftp.open( self.root )
+        report = ftp.mget( ['f*'], maxWorkers=2 )
+        self.assertEqual( (report.files,report.nbytes,len(report.failures)), (0,0,3) )
+
+
+    def testBatchErrorsAreCollected( self ) :
+        self.MakeLocalFiles( 5 )
+        self.ftp.mput( ['*.txt'] )
+        for name in ( 'f001.txt', 'f003.txt' ) :
+            os.remove( os.path.join(self.local,name) )
+            os.mkdir( os.path.join(self.local,name) )
+        report = self.ftp.mget( ['*'], maxWorkers=2 )
+        self.assertEqual( report.files, 3 )
+        self.assertEqual( sorted( name for (name,error) in report.failures ), ['f001.txt','f003.txt'] )
+
+
+    def testListingReusedByMget( self ) :
+        self.MakeLocalFiles( 20 )
+        self.ftp.mput( ['*.txt'] )
+        self.ftp.requests = 0
+        self.ftp.mget( ['*'] )
+        self.assertEqual( self.ftp.requests, 21 )
+
+
+    def testRecursiveRoundTrip( self ) :
+        tree = os.path.join( self.local, 'tree' )
+        for sub in ( 'a/b', 'a/c', 'empty' ) :
+            os.makedirs( os.path.join(tree,sub) )
+        for (i,sub) in enumerate( ( '', 'a', 'a/b', 'a/b', 'a/c' ) ) :
+            with open( os.path.join(tree,sub,'g%d.txt' % i), 'wb' ) as fp :
+                fp.write( b'y' * 10 )
+        self.ftp.mkdir( 'dst' )
+        self.ftp.cd( 'dst' )
+        report = self.ftp.putTree( 'tree', maxWorkers=3 )
+        self.assertEqual( (report.files,report.nbytes,report.failures), (5,50,[]) )
+        self.assertEqual( self.ftp.ls(), ['tree'] )
+        shutil.rmtree( tree )
+        report = self.ftp.getTree( 'tree', maxWorkers=3 )
+        self.assertEqual( (report.files,report.failures), (5,[]) )
+        found = sorted( os.path.relpath(os.path.join(d,f),tree) for (d,dirs,files) in os.walk(tree) for f in files )
+        self.assertEqual( found, [ 'a/b/g2.txt', 'a/b/g3.txt', 'a/c/g4.txt', 'a/g1.txt', 'g0.txt' ] )
+        self.assertTrue( os.path.isdir(os.path.join(tree,'empty')) )
+
+
+    def testRemoteNamesStayInsideLocalRoot( self ) :
+        self.ftp.put_bytes( 'd/ok.txt', b'ok' )
+        evil = { 'name':'../../evil.txt', 'key':'d/ok.txt', 'type':'file', 'size':2, 'etag':None, 'mtime':None }
+        IterTree = self.ftp.IterTree
+        self.ftp.IterTree = lambda loc : iter( list( IterTree(loc) ) + [ dict(evil) ] )
+        report = self.ftp.getTree( 'd' )
+        self.assertEqual( (report.files,[ name for (name,e) in report.failures ]), (1,['../../evil.txt']) )
+        self.assertFalse( os.path.exists( os.path.join( self.local, '..', 'evil.txt' ) ) )
+        report = self.ftp.syncGet( 'd' )
+        self.assertEqual( (report.files,[ name for (name,e) in report.failures ]), (0,['../../evil.txt']) )
+        self.assertFalse( os.path.exists( os.path.join( self.local, '..', 'evil.txt' ) ) )
+
+
+    def testSyncTransfersOnlyChanges( self ) :
+        src = os.path.join( self.local, 'src' )
+        os.mkdir( src )
+        for name in ( 'a.txt', 'b.txt', 'c.txt' ) :
+            with open( os.path.join(src,name), 'w' ) as fp :
+                fp.write( name )
+        report = self.ftp.syncPut( 'src', maxWorkers=2 )
+        self.assertEqual( (report.files,report.skipped), (3,0) )
+        report = self.ftp.syncPut( 'src', maxWorkers=2 )
+        self.assertEqual( (report.files,report.skipped), (0,3) )
+        with open( os.path.join(src,'a.txt'), 'w' ) as fp :
+            fp.write( 'longer' )
+        os.remove( os.path.join(src,'c.txt') )
+        report = self.ftp.sync( ['put','--delete','src'] )
+        self.assertEqual( (report.files,report.skipped,report.deleted), (1,1,1) )
+        self.assertEqual( sorted(os.listdir(os.path.join(self.root,'src'))), ['a.txt','b.txt'] )
+
+        report = self.ftp.syncGet( 'src', 'copy' )
+        self.assertEqual( (report.files,report.skipped), (2,0) )
+        report = self.ftp.syncGet( 'src', 'copy' )
+        self.assertEqual( (report.files,report.skipped), (0,2) )
+        report = self.ftp.sync( ['get','--checksum','src','copy'] )
+        self.assertEqual( (report.files,report.skipped), (0,2) )
+
+
+    def testSyncComparesWholeSeconds( self ) :
+        src = os.path.join( self.local, 'src' )
+        os.mkdir( src )
+        with open( os.path.join(src,'a.txt'), 'w' ) as fp :
+            fp.write( 'a' )
+        os.utime( os.path.join(src,'a.txt'), (1000.9,1000.9) )
+        self.ftp.syncPut( 'src' )
+        os.utime( os.path.join(self.root,'src','a.txt'), (1000.0,1000.0) )
+        report = self.ftp.syncPut( 'src' )
+        self.assertEqual( (report.files,report.skipped), (0,1) )
+
+
+    def testSyncGetOfRootNeedsLocalFolder( self ) :
+        self.ftp.put_bytes( 'd/a.txt', b'a' )
+        self.MakeLocalFiles( 1 )
+        self.assertEqual( self.ftp.RunScript( 'sync get --delete /' ), 1 )
+        self.assertEqual( os.listdir(self.local), ['f000.txt'] )
+        report = self.ftp.sync( ['get','--delete','/','copy'] )
+        self.assertEqual( (report.files,report.deleted), (1,0) )
+        self.assertTrue( os.path.exists( os.path.join(self.local,'copy','d','a.txt') ) )
+
+
+    def testSyncWithManifest( self ) :
+        src = os.path.join( self.local, 'src' )
+        os.mkdir( src )
+        for name in ( 'a.txt', 'b.txt' ) :
+            with open( os.path.join(src,name), 'w' ) as fp :
+                fp.write( name )
+        self.ftp.manifest( ['on', os.path.join(self.local,'m.sqlite')] )
+        self.ftp.syncPut( 'src' )
+        self.ftp.requests = 0
+        report = self.ftp.sync( ['put','--cached','src'] )
+        self.assertEqual( (report.files,report.skipped,self.ftp.requests), (0,2,1) )
+        os.remove( os.path.join(src,'b.txt') )
+        with open( os.path.join(src,'c.txt'), 'w' ) as fp :
+            fp.write( 'c.txt' )
+        report = self.ftp.sync( ['put','--cached','--delete','src'] )
+        self.assertEqual( (report.files,report.skipped,report.deleted), (1,1,1) )
+        self.assertEqual( sorted(os.listdir(os.path.join(self.root,'src'))), ['a.txt','c.txt'] )
+        self.ftp.lcd( src )
+        report = self.ftp.mput( ['*.txt'] )
+        self.assertEqual( (report.files,report.skipped), (2,0) )
+        with open( os.path.join(src,'c.txt'), 'w' ) as fp :
+            fp.write( 'changed' )
+        self.ftp.requests = 0
+        report = self.ftp.mput( ['*.txt'] )
+        self.assertEqual( (report.files,report.skipped,self.ftp.requests), (1,1,1) )
+        self.ftp.manifest( ['off'] )
+
+
+    def testCpuPool( self ) :
+        import hashlib, cftp.base
+        self.MakeLocalFiles( 3, size=3000 )
+        self.ftp.cpu( ['2'] )
+        self.assertEqual( self.ftp.cpu( [] ), 'cpu 2' )
+        entry = { 'etag':hashlib.md5( b'x' * 3000 ).hexdigest() }
+        SameContent = cftp.base.BaseFtpClient.AuxSameContent    # local.py compares bytes instead
+        self.assertTrue( all( SameContent( self.ftp, os.path.join(self.local,'f%03d.txt' % i), entry ) for i in range(3) ) )
+        with self.assertRaises( FileNotFoundError ) :
+            self.ftp.CpuCall( cftp.base.FileMD5, 'missing' )
+        self.ftp.cpu( ['off'] )
+        self.assertEqual( self.ftp.cpu( [] ), 'cpu off' )
+
+
+    def testCompressionBlocks( self ) :
+        import cftp.base, cftp.compression
+        path = os.path.join( self.local, 'f.log' )
+        data = b''.join( b'line %d\n' % i for i in range(50000) )
+        with open( path, 'wb' ) as fp :
+            fp.write( data )
+        blocks = [ cftp.compression.CompressBlock( path, offset, 100000, 'gzip' )
+                   for offset in range( 0, len(data), 100000 ) ]
+        compressed = cftp.base.ChunkReader( blocks ).read()
+        self.assertLess( len(compressed), len(data) // 3 )
+        decompressor = cftp.compression.Decompressor( 'gzip' )
+        out = b''.join( decompressor.decompress( compressed[i:i+1000] ) for i in range(0,len(compressed),1000) )
+        decompressor.finish()
+        self.assertEqual( out, data )
+        decompressor.decompress( compressed[:500] )
+        with self.assertRaises( bftp_ex.FTPTruncatedContentError ) :
+            decompressor.finish()
+        with self.assertRaises( ValueError ) :
+            cftp.compression.CheckCodec( 'bzip2' )
+
+
+    def testPackUnpack( self ) :
+        tree = os.path.join( self.local, 'tree' )
+        for i in range(50) :
+            path = os.path.join( tree, 'd%d' % (i%3), 'g%02d.txt' % i )
+            os.makedirs( os.path.dirname(path), exist_ok=True )
+            with open( path, 'wb' ) as fp :
+                fp.write( os.urandom( 100*i ) )
+            os.utime( path, (1000000+i,1000000+i) )
+        self.ftp.requests = 0
+        report = self.ftp.packTree( 'tree', packSize=30000, maxWorkers=2 )
+        self.assertEqual( (report.files,report.nbytes,report.failures), (50,sum(range(50))*100,[]) )
+        archives = sorted( os.listdir(os.path.join(self.root,'tree')) )
+        self.assertEqual( archives[-1], 'pack-index.json.gz' )
+        self.assertLess( self.ftp.requests, len(archives) + 5 )
+        self.assertIsNone( self.ftp.pack( ['tree'] ) )
+
+        shutil.rmtree( tree )
+        self.ftp.requests = 0
+        report = self.ftp.unpack( ['tree', 'd1/g1*'] )
+        self.assertEqual( (report.files,report.failures), (4,[]) )
+        self.assertLessEqual( self.ftp.requests, 4 )
+        report = self.ftp.unpackTree( 'tree', maxWorkers=2 )
+        self.assertEqual( (report.files,report.failures), (50,[]) )
+        path = os.path.join( tree, 'd2', 'g47.txt' )
+        self.assertEqual( (os.path.getsize(path),os.path.getmtime(path)), (4700,1000047) )
+
+        members = [ ('a',12,5,0), ('b',17,0,0), ('c',20,6,0) ]
+        chunks = [ b'0123', b'456789abcde', b'fghijklm' ]
+        pieces = {}
+        for (member,piece) in cftp.pack.MemberPieces( chunks, 10, members ) :
+            pieces[member[0]] = pieces.get( member[0], b'' ) + bytes(piece)
+        self.assertEqual( pieces, {'a':b'23456', 'b':b'', 'c':b'abcdef'} )
+        with self.assertRaises( OSError ) :
+            list( cftp.pack.MemberPieces( chunks[:2], 10, members ) )
+
+
+    def testFailedPackLeavesNothing( self ) :
+        class FailingClient( cftp.local.LocalFtpClient ) :
+            def AuxPutStreamInCloud( self, stream, remotePath, extraArgs ) :
+                if remotePath.endswith( '00001.tar' ) :
+                    raise bftp_ex.FTPError
+                return super().AuxPutStreamInCloud( stream, remotePath, extraArgs )
+        tree = os.path.join( self.local, 'tree' )
+        os.mkdir( tree )
+        for i in range(10) :
+            with open( os.path.join(tree,'g%d.txt' % i), 'wb' ) as fp :
+                fp.write( os.urandom( 5000 ) )
+        ftp = FailingClient()
+        ftp.open( self.root )
+        ftp.lcd( self.local )
+        report = ftp.packTree( 'tree', packSize=20000, maxWorkers=2 )
+        self.assertEqual( (report.files,len(report.failures)), (0,1) )
+        self.assertEqual( os.listdir( os.path.join(self.root,'tree') ), [] )
+        report = self.ftp.packTree( 'tree', packSize=20000 )
+        self.assertEqual( (report.files,report.failures), (10,[]) )
+
+
+    def testRangedDownloads( self ) :
+        data = os.urandom( 100000 )
+        self.ftp.put_bytes( 'big.log', data )
+        self.assertEqual( self.ftp.get_range( 'big.log', -300 ), data[-300:] )
+        self.assertEqual( self.ftp.get_range( 'big.log', 1000, 24 ), data[1000:1024] )
+        self.assertEqual( self.ftp.get_range( 'big.log', 99990, 50 ), data[99990:] )
+        path = os.path.join( self.local, 'big.log' )
+        self.ftp.requests = 0
+        self.assertEqual( self.ftp.GetSegments( 'big.log', path, 5, 99990, None, segmentSize=7000, maxWorkers=4 ), 99990 )
+        self.assertEqual( self.ftp.requests, 15 )
+        with open( path, 'rb' ) as fp :
+            self.assertEqual( fp.read(), data[5:99995] )
+        self.ftp.requests = 0
+        with self.assertRaises( bftp_ex.FTPError ) :
+            self.ftp.GetSegments( 'big.log', path, 0, 200000, None, segmentSize=7000, maxWorkers=1 )
+        self.assertEqual( (self.ftp.requests,os.path.getsize(path)), (15,99990) )
+        self.assertFalse( os.path.exists( path + cftp.base.SEGMENTS_SUFFIX ) )
+        for (byteRange,expected) in ( ('10-19',data[10:20]), ('-1k',data[-1024:]), ('99k-',data[99*1024:]), ('200k-',b'') ) :
+            self.ftp.RunScript( 'get --range %s big.log' % byteRange )
+            with open( path, 'rb' ) as fp :
+                self.assertEqual( fp.read(), expected )
+        self.assertEqual( self.ftp.RunScript( 'get --range 9-1 big.log' ), 1 )
+
+
+    def testResumeFinishesBatch( self ) :
+        self.MakeLocalFiles( 4 )
+        os.mkdir( os.path.join(self.root,'f002.txt') )
+        self.ftp.journal( ['on', os.path.join(self.local,'j.sqlite')] )
+        report = self.ftp.mput( ['f*.txt'], maxWorkers=2 )
+        self.assertEqual( (report.files,len(report.failures)), (3,1) )
+        os.rmdir( os.path.join(self.root,'f002.txt') )
+        self.ftp.lcd( self.root )
+        self.ftp.requests = 0
+        report = self.ftp.resume()
+        self.assertEqual( (report.files,report.skipped,report.failures), (1,3,[]) )
+        self.assertEqual( self.ftp.requests, 1 )
+        self.assertEqual( self.ftp.localWorkingDir, self.root )
+        self.assertEqual( str(self.ftp.transferJournal).split(': ')[1],
+                          '0 upload(s), 0 download(s), 0 batch(es) unfinished' )
+        self.ftp.journal( ['off'] )
+
+
+    def testResumeKeepsFailedBatch( self ) :
+        class FailingClient( cftp.local.LocalFtpClient ) :
+            def mput( self, *args, **kwargs ) :
+                raise bftp_ex.FTPError
+        self.MakeLocalFiles( 2 )
+        os.mkdir( os.path.join(self.root,'f001.txt') )
+        journalPath = os.path.join( self.local, 'j.sqlite' )
+        self.ftp.journal( ['on', journalPath] )
+        report = self.ftp.mput( ['f*.txt'] )
+        self.assertEqual( (report.files,len(report.failures)), (1,1) )
+        self.ftp.journal( ['off'] )
+        os.rmdir( os.path.join(self.root,'f001.txt') )
+        ftp = FailingClient()
+        ftp.open( self.root )
+        ftp.journal( ['on', journalPath] )
+        report = ftp.resume()
+        self.assertEqual( (report.files,[ name for (name,error) in report.failures ]), (0,['mput']) )
+        ftp.journal( ['off'] )
+        self.ftp.journal( ['on', journalPath] )
+        report = self.ftp.resume()
+        self.assertEqual( (report.files,report.skipped,report.failures), (1,1,[]) )
+        self.ftp.journal( ['off'] )
+
+
+    def testStreams( self ) :
+        data = os.urandom( 100000 )
+        self.assertEqual( self.ftp.put_stream( io.BytesIO(data), 'd/s.bin' ), len(data) )
+        self.assertEqual( self.ftp.ls(), ['d'] )
+        out = io.BytesIO()
+        self.assertEqual( self.ftp.get_stream( 'd/s.bin', out ), len(data) )
+        self.assertEqual( out.getvalue(), data )
+
+
+    def testFailedStreamLeavesNothing( self ) :
+        class FailingStream( io.RawIOBase ) :
+            def readable( self ) :
+                return True
+            def readinto( self, view ) :
+                raise OSError
+        self.ftp.put_bytes( 's.bin', b'old' )
+        with self.assertRaises( OSError ) :
+            self.ftp.AuxPutStreamInCloud( FailingStream(), 's.bin', None )
+        self.assertEqual( os.listdir( self.root ), ['s.bin'] )
+        self.assertEqual( self.ftp.get_bytes( 's.bin' ), b'old' )
+
+
+    def testBandwidthLimitsEveryTransfer( self ) :
+        data = os.urandom( 50000 )
+        self.ftp.put_bytes( 's.bin', data )
+        self.ftp.bandwidth = 500000
+        view = memoryview( bytearray(len(data)) )
+        for transfer in ( lambda : self.ftp.put_stream( io.BytesIO(data), 's.bin' ),
+                          lambda : self.ftp.put_bytes( 's.bin', data ),
+                          lambda : self.ftp.get_stream( 's.bin', io.BytesIO() ),
+                          lambda : self.ftp.get_bytes( 's.bin' ),
+                          lambda : self.ftp.get_range( 's.bin', 0 ),
+                          lambda : self.ftp.get_into( 's.bin', view ) ) :
+            start = time.time()
+            transfer()
+            self.assertGreaterEqual( time.time() - start, 0.09 )
+
+
+    def testBytes( self ) :
+        data = os.urandom( 1000 )
+        self.assertEqual( self.ftp.put_bytes( 'd/b.bin', memoryview(data)[10:] ), 990 )
+        self.assertEqual( self.ftp.get_bytes( 'd/b.bin' ), data[10:] )
+        buffer = bytearray( 2000 )
+        self.assertEqual( self.ftp.get_into( 'd/b.bin', buffer ), 990 )
+        self.assertEqual( buffer[:990], data[10:] )
+        self.assertIsNone( self.ftp.get_into( 'd/b.bin', bytearray(100) ) )
+
+
+    def testRunScript( self ) :
+        self.MakeLocalFiles( 3 )
+        script = 'mkdir d; cd d  # upload\nput f000.txt\nmput f001.txt f002.txt\n-get nope\npwd'
+        self.assertEqual( self.ftp.RunScript( script, maxWorkers=2 ), 0 )
+        self.assertEqual( self.ftp.ls(), ['f000.txt','f001.txt','f002.txt'] )
+        self.assertEqual( self.ftp.RunScript( 'delete f000.txt\nbogus' ), 2 )
+        self.assertEqual( self.ftp.RunScript( 'get nope\ndelete f000.txt' ), 1 )
+        self.assertEqual( len(self.ftp.ls()), 3 )
+
+
+    def testPathsStayInsideRoot( self ) :
+        self.ftp.cd( '../..' )
+        self.assertEqual( self.ftp.remoteWorkingDir, '' )
+
+
+    def testBenchmarkScenario( self ) :
+        import cftp.bench
+        result = cftp.bench.RunScenario( 'mget-small', 'local', 0.005, 2, 0.0 )
+        self.assertEqual( (result['items'],result['errors'],result['requests']), (10,0,11) )
+        self.assertEqual( result['bytes'], 10*4096 )
+        result = cftp.bench.RunStartup( 'start-local', 0.1 )
+        self.assertEqual( (result['items'],result['errors']), (1,0) )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from cftp.manifest import Manifest
+
+
+
+
+class TestManifest( unittest.TestCase ) :
+    """Tests Manifest digest and sync records."""
+
+
+    def setUp( self ) :
+        """Create a manifest and a local file in a temporary directory."""
+
+        self.dir = tempfile.mkdtemp()
+        self.manifest = Manifest( os.path.join(self.dir,'m.sqlite') )
+        self.file = os.path.join( self.dir, 'f.txt' )
+        with open( self.file, 'w' ) as fp :
+            fp.write( 'hello' )
+        self.calls = 0
+
+
+    def tearDown( self ) :
+        self.manifest.Close()
+        shutil.rmtree( self.dir )
+
+
+    def Compute( self ) :
+        self.calls += 1
+        return 'digest%d' % self.calls
+
+
+    def testDigestRecomputedOnlyAfterChange( self ) :
+        self.assertEqual( self.manifest.Digest(self.file,'md5',self.Compute), 'digest1' )
+        self.assertEqual( self.manifest.Digest(self.file,'md5',self.Compute), 'digest1' )
+        self.assertEqual( self.manifest.Digest(self.file,'etag-8',self.Compute), 'digest2' )
+        with open( self.file, 'w' ) as fp :
+            fp.write( 'hello, world' )
+        self.assertEqual( self.manifest.Digest(self.file,'md5',self.Compute), 'digest3' )
+
+
+    def testSyncRecords( self ) :
+        st = os.stat( self.file )
+        self.assertIsNone( self.manifest.Lookup('bk','a/f.txt',self.file,st) )
+        self.manifest.Synced( 'bk', 'a/f.txt', None, self.file, st )
+        self.assertEqual( self.manifest.Lookup('bk','a/f.txt',self.file,st), '' )
+        self.manifest.Synced( 'bk', 'a/f.txt', 'abc', self.file, st )
+        self.manifest.Flush()
+        reopened = Manifest( self.manifest.path )
+        self.assertEqual( reopened.Lookup('bk','a/f.txt',self.file,st), 'abc' )
+        self.assertEqual( reopened.Keys('bk','a/'), ['a/f.txt'] )
+        self.assertEqual( reopened.Keys('bk','b/'), [] )
+        reopened.Close()
+        os.utime( self.file, (0,0) )
+        self.assertIsNone( self.manifest.Lookup('bk','a/f.txt',self.file,os.stat(self.file)) )
+        self.manifest.Forget( 'bk', 'a/f.txt' )
+        self.assertEqual( self.manifest.Keys('bk',''), [] )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import importlib.util
+import cftp.s3
+from cftp.base import OBJ_NONE
+
+
+
+
+class StubS3Client :
+    """Stands in for a boto3 S3 client, holding objects in a dictionary.
+
+    Listings are paged lazily, PageSize keys at a time, so that the
+    caller may change the bucket between pages, as it may with S3.
+
+    """
+
+    def __init__( self, keys ) :
+        self.objects = dict.fromkeys( keys, 16 )
+        self.listings = 0
+
+    def get_paginator( self, operation ) :
+        return self
+
+    def paginate( self, Bucket, Prefix, Delimiter, PaginationConfig ) :
+        self.listings += 1
+        (pageSize,after) = ( PaginationConfig['PageSize'], '' )
+        while True :
+            keys = sorted( key for key in self.objects if key.startswith(Prefix) and key > after )
+            page = keys[:pageSize]
+            yield { 'Contents':[ { 'Key':key, 'Size':self.objects[key], 'ETag':'"e"', 'LastModified':None }
+                                 for key in page ] }
+            if len(keys) <= pageSize :
+                return
+            after = page[-1]
+
+    def delete_objects( self, Bucket, Delete ) :
+        for obj in Delete['Objects'] :
+            self.objects.pop( obj['Key'], None )
+        return {}
+
+
+
+
+@unittest.skipUnless( importlib.util.find_spec('boto3'), 'boto3 is not installed' )
+class TestListingCache( unittest.TestCase ) :
+    """Tests the metadata cache of S3FtpClient against a stub S3 client."""
+
+
+    def setUp( self ) :
+        """Create a client bound to a stub holding folder d and 1500 files in it."""
+
+        cftp.s3.ImportBoto3()
+        self.ftp = cftp.s3.S3FtpClient( cacheTtl=60 )
+        self.ftp.cloudStorageLocation = 'bucket'
+        self.ftp.s3Client = StubS3Client( ['d/'] + [ 'd/f%04d' % i for i in range(1500) ] )
+        self.ftp.remoteWorkingDir = 'd'
+
+
+    def testListingChangedWhileReadIsNotCached( self ) :
+        report = self.ftp.mdelete( ['*'], maxWorkers=1 )
+        self.assertEqual( (report.files,report.failures), (1500,[]) )
+        self.assertEqual( list(self.ftp.s3Client.objects), ['d/'] )
+        self.assertEqual( self.ftp.ls(), [] )
+        self.assertEqual( self.ftp.metaCache.GetType('d/f0000'), OBJ_NONE )
+
+
+    def testUnchangedListingIsCached( self ) :
+        self.assertEqual( len(self.ftp.ls()), 1500 )
+        self.assertEqual( len(self.ftp.ls()), 1500 )
+        self.assertEqual( self.ftp.s3Client.listings, 1 )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
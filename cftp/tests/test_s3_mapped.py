@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import importlib.util
+import cftp.s3
+
+
+
+
+class StubS3Client :
+    """Stands in for a boto3 S3 client, recording multipart upload requests.
+
+    Keeps the body of each part sent, and fails the part numbered
+    failPart, if given.
+
+    """
+
+    def __init__( self, failPart=None ) :
+        self.failPart = failPart
+        self.parts = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create_multipart_upload( self, Bucket, Key, **kwargs ) :
+        self.calls.append( 'create' )
+        return { 'UploadId':'u1' }
+
+    def upload_part( self, Bucket, Key, UploadId, PartNumber, Body, **kwargs ) :
+        if PartNumber == self.failPart :
+            raise RuntimeError( 'part %d failed' % PartNumber )
+        with self.lock :
+            self.parts[ PartNumber ] = Body.read()
+        return { 'ETag':'"e%d"' % PartNumber }
+
+    def complete_multipart_upload( self, Bucket, Key, UploadId, MultipartUpload, **kwargs ) :
+        self.calls.append( ( 'complete', [ part['PartNumber'] for part in MultipartUpload['Parts'] ] ) )
+
+    def abort_multipart_upload( self, Bucket, Key, UploadId ) :
+        self.calls.append( ( 'abort', UploadId ) )
+
+
+
+
+@unittest.skipUnless( importlib.util.find_spec('boto3'), 'boto3 is not installed' )
+class TestMappedUpload( unittest.TestCase ) :
+    """Tests S3FtpClient.PutMapped against a stub S3 client.
+
+    The file uploaded is 12 MiB and 5 bytes, sent in 5 MiB parts.
+
+    """
+
+
+    def setUp( self ) :
+        """Create the file and a client bound to the stub."""
+
+        cftp.s3.ImportBoto3()
+        self.local = tempfile.mkdtemp()
+        self.path = os.path.join( self.local, 'big.dat' )
+        self.data = os.urandom( 12*1024*1024 + 5 )
+        with open( self.path, 'wb' ) as fp :
+            fp.write( self.data )
+        self.ftp = cftp.s3.S3FtpClient( s3TransferConfig={ 'multipart_chunksize':5*1024*1024,
+                                                           'auto_tune':False, 'max_concurrency':2 } )
+        self.ftp.cloudStorageLocation = 'bucket'
+
+
+    def tearDown( self ) :
+        """Remove the file."""
+
+        shutil.rmtree( self.local )
+
+
+    def testPartsAreSlicesOfTheFile( self ) :
+        self.ftp.s3Client = StubS3Client()
+        self.ftp.PutMapped( self.path, 'big.dat', None, len(self.data) )
+        partSize = 5*1024*1024
+        self.assertEqual( self.ftp.s3Client.calls, [ 'create', ('complete',[1,2,3]) ] )
+        for (number,body) in self.ftp.s3Client.parts.items() :
+            self.assertEqual( body, self.data[ (number-1)*partSize : number*partSize ] )
+
+
+    def testFailedUploadIsAborted( self ) :
+        self.ftp.s3Client = StubS3Client( failPart=2 )
+        with self.assertRaises( RuntimeError ) :
+            self.ftp.PutMapped( self.path, 'big.dat', None, len(self.data) )
+        self.assertEqual( self.ftp.s3Client.calls, [ 'create', ('abort','u1') ] )
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import cftp.s3
+from cftp.journal import TransferJournal
+
+
+
+
+class StubBody :
+    """Stands in for a botocore streaming body."""
+
+    def __init__( self, data ) :
+        self.data = data
+
+    def iter_chunks( self, chunkSize ) :
+        for start in range( 0, len(self.data), chunkSize ) :
+            yield self.data[ start:start+chunkSize ]
+
+    def close( self ) :
+        pass
+
+
+
+
+class StubS3Client :
+    """Stands in for a boto3 S3 client, serving one object, gzipped or not.
+
+    Records the Range of every GetObject request.
+
+    """
+
+    def __init__( self, data, encoding='' ) :
+        self.data = data
+        self.encoding = encoding
+        self.ranges = []
+
+    def head_object( self, Bucket, Key ) :
+        return { 'ETag':'"e"', 'ContentLength':len(self.data), 'ContentEncoding':self.encoding }
+
+    def get_object( self, Bucket, Key, IfMatch, Range=None ) :
+        self.ranges.append( Range )
+        start = int( Range[6:-1] ) if Range else 0
+        return { 'Body':StubBody( self.data[start:] ), 'ContentEncoding':self.encoding }
+
+
+
+
+@unittest.skipUnless( importlib.util.find_spec('boto3'), 'boto3 is not installed' )
+class TestResumableDownload( unittest.TestCase ) :
+    """Tests S3FtpClient.GetResumable against a stub S3 client.
+
+    Each test leaves a partial download of the object behind, as an
+    interrupted transfer would, before fetching it again.
+
+    """
+
+
+    def setUp( self ) :
+        """Create a journal and a client using it."""
+
+        cftp.s3.ImportBoto3()
+        self.local = tempfile.mkdtemp()
+        self.path = os.path.join( self.local, 'obj' )
+        self.ftp = cftp.s3.S3FtpClient()
+        self.ftp.cloudStorageLocation = 'bucket'
+        self.ftp.transferJournal = TransferJournal( os.path.join(self.local,'j.sqlite') )
+        self.data = os.urandom( 1000 ) * 100
+
+
+    def tearDown( self ) :
+        """Remove the journal and the downloads."""
+
+        self.ftp.transferJournal.Close()
+        shutil.rmtree( self.local )
+
+
+    def Interrupt( self, partial ) :
+        """Record a download of obj stopped after writing partial."""
+
+        self.ftp.transferJournal.StartDownload( 'bucket', 'obj', self.path, 'e', None )
+        with open( self.path + cftp.s3.PARTIAL_SUFFIX, 'wb' ) as fp :
+            fp.write( partial )
+
+
+    def testPlainDownloadContinues( self ) :
+        self.ftp.s3Client = StubS3Client( self.data )
+        self.Interrupt( self.data[:30000] )
+        self.ftp.GetResumable( 'obj', self.path, 'e', len(self.data), None )
+        self.assertEqual( self.ftp.s3Client.ranges, ['bytes=30000-'] )
+        with open( self.path, 'rb' ) as fp :
+            self.assertEqual( fp.read(), self.data )
+
+
+    def testCompressedDownloadStartsOver( self ) :
+        compressed = gzip.compress( self.data )
+        for encoding in ( None, 'gzip' ) :
+            self.ftp.s3Client = StubS3Client( compressed, 'gzip' )
+            # as many decompressed bytes as the object has compressed ones
+            self.Interrupt( self.data[:len(compressed)] )
+            self.ftp.GetResumable( 'obj', self.path, 'e', len(compressed), None, encoding )
+            self.assertEqual( self.ftp.s3Client.ranges, [None] )
+            with open( self.path, 'rb' ) as fp :
+                self.assertEqual( fp.read(), self.data )
+            self.assertFalse( os.path.exists( self.path + cftp.s3.PARTIAL_SUFFIX ) )
+
+
+
+if __name__ == '__main__':
+    unittest.main()